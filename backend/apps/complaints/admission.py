@@ -0,0 +1,119 @@
+"""
+Admission control for synchronous complaint analysis.
+
+At most ANALYSIS_MAX_CONCURRENT analyses run at once in a process. Further
+requests wait in a priority queue, where complaints pre-classified as more
+urgent are admitted first (first come, first served within an urgency).
+When ANALYSIS_MAX_WAITING requests are already waiting, or a request has
+waited ANALYSIS_QUEUE_TIMEOUT seconds, it is turned away so the view can
+answer 503 with a Retry-After estimate.
+"""
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from apps.mlengine.instrumentation import record_stage, register_collector
+
+# Lower is admitted first; unknown labels wait with the medium ones.
+URGENCY_PRIORITY = {'High': 0, 'Medium': 1, 'Low': 2}
+DEFAULT_PRIORITY = 1
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted; retry_after is in seconds."""
+    def __init__(self, retry_after):
+        super().__init__(f"Analysis queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent, max_waiting, timeout):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._waiting = []  # heap of [priority, sequence, event, granted]
+        self._sequence = itertools.count()
+        self._running = 0
+        self._service_time = 1.0  # moving average of seconds per analysis, for Retry-After
+        self.counts = {'admitted': 0, 'queued': 0, 'rejected': 0, 'timed_out': 0}
+
+    def _retry_after(self):
+        backlog = len(self._waiting) + 1
+        return max(1, math.ceil(self._service_time * backlog / self.max_concurrent))
+
+    def _acquire(self, priority):
+        with self._lock:
+            if self._running < self.max_concurrent and not self._waiting:
+                self._running += 1
+                self.counts['admitted'] += 1
+                return
+            if len(self._waiting) >= self.max_waiting:
+                self.counts['rejected'] += 1
+                raise Overloaded(self._retry_after())
+            ticket = [priority, next(self._sequence), threading.Event(), False]
+            heapq.heappush(self._waiting, ticket)
+            self.counts['queued'] += 1
+
+        ticket[2].wait(self.timeout)
+        with self._lock:
+            # The slot may have been handed over just as the wait timed out
+            if ticket[3]:
+                self.counts['admitted'] += 1
+                return
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            self.counts['timed_out'] += 1
+            raise Overloaded(self._retry_after())
+
+    def _release(self, elapsed):
+        with self._lock:
+            self._service_time = 0.9 * self._service_time + 0.1 * elapsed
+            if self._waiting:
+                # Hand the slot straight to the most urgent waiter
+                ticket = heapq.heappop(self._waiting)
+                ticket[3] = True
+                ticket[2].set()
+            else:
+                self._running -= 1
+
+    @contextmanager
+    def admit(self, urgency):
+        """Holds an analysis slot for the block; raises Overloaded if none can be had."""
+        queued_at = time.monotonic()
+        self._acquire(URGENCY_PRIORITY.get(urgency, DEFAULT_PRIORITY))
+        start = time.monotonic()
+        record_stage("admission_wait", start - queued_at)
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - start)
+
+    def stats(self):
+        with self._lock:
+            return {'running': self._running, 'waiting': len(self._waiting), **self.counts}
+
+
+admission = AdmissionController(
+    max_concurrent=settings.ANALYSIS_MAX_CONCURRENT,
+    max_waiting=settings.ANALYSIS_MAX_WAITING,
+    timeout=settings.ANALYSIS_QUEUE_TIMEOUT,
+)
+
+
+@register_collector
+def _admission_metrics():
+    stats = admission.stats()
+    lines = []
+    for gauge in ('running', 'waiting'):
+        name = f"legalsift_analysis_{gauge}"
+        lines += [f"# HELP {name} Synchronous complaint analyses {gauge}.", f"# TYPE {name} gauge", f"{name} {stats[gauge]}"]
+    name = "legalsift_analysis_admissions_total"
+    lines += [f"# HELP {name} Synchronous complaint analysis admission decisions.", f"# TYPE {name} counter"]
+    lines += [f'{name}{{outcome="{outcome}"}} {stats[outcome]}' for outcome in ('admitted', 'queued', 'rejected', 'timed_out')]
+    return lines
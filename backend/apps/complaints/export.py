@@ -0,0 +1,152 @@
+"""
+Streaming bulk export of complaints as NDJSON, CSV or Parquet.
+
+Rows are read with a server-side cursor (`.iterator(chunk_size=...)`) and
+written out COMPLAINT_EXPORT_CHUNK_SIZE rows at a time, so memory use stays
+the same however many complaints match. Used by ComplaintExportView and
+`manage.py export_complaints`.
+"""
+import csv
+import io
+from itertools import islice
+
+from django.conf import settings
+
+from apps.mlengine.renderers import dumps
+
+from .models import Complaint
+
+EXPORT_FIELDS = [
+    'id',
+    'user_id',
+    'state',
+    'city',
+    'date_of_incident',
+    'complaint_text',
+    'predicted_urgency',
+    'predicted_category',
+    'recommended_sections',
+    'created_at',
+]
+
+
+def filter_complaints(start=None, end=None, state=None, city=None, category=None):
+    """
+    Complaints created between the `start` and `end` dates (inclusive) in the
+    given state, city and predicted category; None leaves a filter out.
+    """
+    complaints = Complaint.objects.all()
+    if start is not None:
+        complaints = complaints.filter(created_at__date__gte=start)
+    if end is not None:
+        complaints = complaints.filter(created_at__date__lte=end)
+    if state:
+        complaints = complaints.filter(state__iexact=state)
+    if city:
+        complaints = complaints.filter(city__iexact=city)
+    if category:
+        complaints = complaints.filter(predicted_category__iexact=category)
+    return complaints
+
+
+def _batches(complaints, chunk_size):
+    """Yields lists of at most chunk_size row dicts, streamed from the database."""
+    rows = complaints.order_by('id').values(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _ndjson(batches):
+    for batch in batches:
+        yield b"".join(dumps(row) + b"\n" for row in batch)
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return dumps(value).decode()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for batch in batches:
+        writer.writerows([_csv_value(row[field]) for field in EXPORT_FIELDS] for row in batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Only the header is left when no complaint matched
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """A write-only file that hands back whatever was written since the last take()."""
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _parquet(batches):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('id', pa.int64()),
+        ('user_id', pa.int64()),
+        ('state', pa.string()),
+        ('city', pa.string()),
+        ('date_of_incident', pa.date32()),
+        ('complaint_text', pa.string()),
+        ('predicted_urgency', pa.string()),
+        ('predicted_category', pa.string()),
+        # Nested section dicts vary in shape, so they are kept as JSON text
+        ('recommended_sections', pa.string()),
+        ('created_at', pa.timestamp('us', tz='UTC')),
+    ])
+    sink = _ChunkSink()
+    # One row group per batch, each sent as soon as it is written
+    with pq.ParquetWriter(sink, schema, compression='zstd') as writer:
+        for batch in batches:
+            for row in batch:
+                row['recommended_sections'] = dumps(row['recommended_sections']).decode()
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            yield sink.take()
+    yield sink.take()
+
+
+# format: (content type, file extension, writer)
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson', _ndjson),
+    'csv': ('text/csv; charset=utf-8', 'csv', _csv),
+    'parquet': ('application/vnd.apache.parquet', 'parquet', _parquet),
+}
+
+
+def export_chunks(complaints, file_format, chunk_size=None):
+    """Yields the complaints encoded as file_format (a key of FORMATS), in byte chunks."""
+    _, _, write = FORMATS[file_format]
+    return write(_batches(complaints, chunk_size or settings.COMPLAINT_EXPORT_CHUNK_SIZE))
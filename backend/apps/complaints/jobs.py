@@ -0,0 +1,127 @@
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.mlengine.complaint_analysis import analyze_complaints
+
+from .models import AnalysisJob, Complaint
+
+# --- WORKER POOL SETUP ---
+# The AnalysisJob table is the queue. Workers run in `manage.py
+# run_analysis_workers` (or, with ANALYSIS_WORKERS_IN_WEB, in each web process
+# on first use) and claim pending jobs with SKIP LOCKED, so several processes
+# can share it.
+_wakeup = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+
+
+class _LeaseLost(Exception):
+    """The job was claimed again by another worker while this one ran it."""
+
+
+def enqueue_analysis(user_id, state, city, date_of_incident, complaint_text):
+    """Stores a pending AnalysisJob and wakes the workers."""
+    job = AnalysisJob.objects.create(
+        user_id=user_id,
+        state=state,
+        city=city,
+        date_of_incident=date_of_incident,
+        complaint_text=complaint_text,
+    )
+    if settings.ANALYSIS_WORKERS_IN_WEB:
+        start_workers()
+        transaction.on_commit(_wakeup.set)
+    return job
+
+
+def start_workers():
+    """Starts ANALYSIS_WORKERS daemon threads in this process (once)."""
+    with _workers_lock:
+        _workers[:] = [worker for worker in _workers if worker.is_alive()]
+        for i in range(len(_workers), settings.ANALYSIS_WORKERS):
+            worker = threading.Thread(target=_run, name=f'analysis-worker-{i}', daemon=True)
+            worker.start()
+            _workers.append(worker)
+    return list(_workers)
+
+
+def _claim_batch():
+    """
+    Marks up to ANALYSIS_JOB_BATCH_SIZE claimable jobs as running and returns
+    them. Claimable are pending jobs and running jobs whose lease expired;
+    those that already used up their attempts are marked failed instead.
+    """
+    now = timezone.now()
+    lease_expired = Q(status=AnalysisJob.STATUS_RUNNING, claimed_at__lt=now - timedelta(seconds=settings.ANALYSIS_JOB_LEASE_SECONDS))
+    with transaction.atomic():
+        AnalysisJob.objects.filter(lease_expired, attempts__gte=settings.ANALYSIS_JOB_MAX_ATTEMPTS).update(
+            status=AnalysisJob.STATUS_FAILED, error="The analysis did not finish.", updated_at=now,
+        )
+        job_ids = list(
+            AnalysisJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=AnalysisJob.STATUS_PENDING) | lease_expired)
+            .order_by('id')
+            .values_list('id', flat=True)[:settings.ANALYSIS_JOB_BATCH_SIZE]
+        )
+        AnalysisJob.objects.filter(id__in=job_ids).update(
+            status=AnalysisJob.STATUS_RUNNING, claimed_at=now, attempts=F('attempts') + 1,
+        )
+    return list(AnalysisJob.objects.filter(id__in=job_ids).order_by('id'))
+
+
+def _finish(job, **fields):
+    """
+    Stores the outcome of a job, but only while this worker still holds its
+    lease (the claim it was handed is still the latest one). Returns whether
+    it did.
+    """
+    return AnalysisJob.objects.filter(
+        pk=job.pk, status=AnalysisJob.STATUS_RUNNING, claimed_at=job.claimed_at, attempts=job.attempts,
+    ).update(updated_at=timezone.now(), **fields) == 1
+
+
+def process_batch(jobs):
+    """Runs one vectorized analysis over a micro-batch of jobs and stores the results."""
+    try:
+        results = analyze_complaints([job.complaint_text for job in jobs])
+    except Exception as e:
+        print(f"Error during batched complaint analysis: {e}")
+        results = [{"error": "An unexpected error occurred."}] * len(jobs)
+
+    for job, analysis_result in zip(jobs, results):
+        if "error" in analysis_result:
+            _finish(job, status=AnalysisJob.STATUS_FAILED, error=analysis_result["error"])
+            continue
+        try:
+            # The complaint only exists if the job is marked done by its owner,
+            # so a job claimed again after its lease ran out is never saved twice
+            with transaction.atomic():
+                complaint = Complaint.objects.create_from_analysis(
+                    job.user_id, job.state, job.city, job.date_of_incident,
+                    job.complaint_text, analysis_result,
+                )
+                if not _finish(job, status=AnalysisJob.STATUS_DONE, result=analysis_result, complaint=complaint):
+                    raise _LeaseLost
+        except _LeaseLost:
+            print(f"Job {job.pk} was claimed again by another worker; dropping this result.")
+        except Exception as e:
+            print(f"Error saving analyzed complaint for job {job.pk}: {e}")
+            _finish(job, status=AnalysisJob.STATUS_FAILED, error="An unexpected error occurred.")
+
+
+def _run():
+    while True:
+        _wakeup.wait(timeout=settings.ANALYSIS_JOB_POLL_INTERVAL)
+        _wakeup.clear()
+        try:
+            while jobs := _claim_batch():
+                process_batch(jobs)
+        except Exception as e:
+            print(f"Analysis worker error: {e}")
+        finally:
+            close_old_connections()
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from apps.complaints.similarity import complaint_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the similar-complaints HNSW index from the complaint table (run periodically, e.g. nightly).'
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write(self.style.SUCCESS('🧱 Compacting the complaint similarity index...'))
+        count = complaint_index.compact()
+        self.stdout.write(self.style.SUCCESS(f'✅ Indexed {count} complaints into {complaint_index.index_dir}'))
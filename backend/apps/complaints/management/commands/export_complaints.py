@@ -0,0 +1,39 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.complaints.export import FORMATS, export_chunks, filter_complaints
+
+
+class Command(BaseCommand):
+    help = 'Streams complaints as NDJSON, CSV or Parquet to a file or stdout, filtered by creation date, state, city and category.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='file_format', choices=list(FORMATS), default='ndjson')
+        parser.add_argument('--start', type=date.fromisoformat, help='First creation date (YYYY-MM-DD) to include.')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last creation date (YYYY-MM-DD) to include.')
+        parser.add_argument('--state')
+        parser.add_argument('--city')
+        parser.add_argument('--category', help='Predicted category.')
+        parser.add_argument('--chunk-size', type=int, help='Rows per database fetch (default COMPLAINT_EXPORT_CHUNK_SIZE).')
+        parser.add_argument('--output', help='File to write to (stdout if omitted).')
+
+    def handle(self, *args, **options):
+        complaints = filter_complaints(
+            start=options['start'], end=options['end'],
+            state=options['state'], city=options['city'], category=options['category'],
+        )
+        chunks = export_chunks(complaints, options['file_format'], options['chunk_size'])
+        try:
+            if options['output']:
+                with open(options['output'], 'wb') as f:
+                    for chunk in chunks:
+                        f.write(chunk)
+                self.stderr.write(self.style.SUCCESS(f"✅ Complaints exported to {options['output']}"))
+            else:
+                for chunk in chunks:
+                    sys.stdout.buffer.write(chunk)
+                sys.stdout.buffer.flush()
+        except ImportError as e:
+            raise CommandError(f"The {options['file_format']} format is unavailable: {e}")
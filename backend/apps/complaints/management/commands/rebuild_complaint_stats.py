@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from apps.complaints.models import ComplaintDailyStat
+
+
+class Command(BaseCommand):
+    help = 'Recounts the complaint statistics rollup from the complaint table (e.g. after complaints are deleted).'
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write(self.style.SUCCESS('📊 Rebuilding complaint statistics...'))
+        count = ComplaintDailyStat.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'✅ Wrote {count} daily statistics rows'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from apps.complaints.jobs import start_workers
+
+
+class Command(BaseCommand):
+    help = 'Runs a dedicated pool of complaint analysis workers that drains pending AnalysisJobs.'
+
+    def handle(self, *args, **kwargs):
+        workers = start_workers()
+        self.stdout.write(self.style.SUCCESS(f'Started {len(workers)} analysis workers. Press Ctrl+C to stop.'))
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('Stopping analysis workers.'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0002_analysisjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='complaint',
+            name='embedding',
+            field=models.BinaryField(null=True),
+        ),
+    ]
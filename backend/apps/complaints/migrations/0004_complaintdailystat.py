@@ -0,0 +1,44 @@
+# Generated by Django 5.2.3 on 2026-10-19 19:28
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_stats(apps, schema_editor):
+    Complaint = apps.get_model('complaints', 'Complaint')
+    ComplaintDailyStat = apps.get_model('complaints', 'ComplaintDailyStat')
+    totals = (
+        Complaint.objects.annotate(day=TruncDate('created_at'))
+        .values('day', 'state', 'city', 'predicted_category', 'predicted_urgency')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    ComplaintDailyStat.objects.bulk_create((ComplaintDailyStat(**row) for row in totals.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0003_complaint_embedding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplaintDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('state', models.CharField(max_length=100)),
+                ('city', models.CharField(max_length=100)),
+                ('predicted_category', models.CharField(max_length=100)),
+                ('predicted_urgency', models.CharField(max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'complaint_daily_stats',
+                'constraints': [models.UniqueConstraint(fields=('day', 'state', 'city', 'predicted_category', 'predicted_urgency'), name='complaint_daily_stats_unique_group')],
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
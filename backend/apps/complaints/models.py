@@ -1,6 +1,36 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
 from apps.users.models import CustomUser
 
+
+class ComplaintManager(models.Manager):
+    """
+    Manager that knows how to store a complaint together with its ML analysis.
+    """
+    def create_from_analysis(self, user_id, state, city, date_of_incident, complaint_text, analysis_result):
+        # The embedding is kept on the complaint for the similarity index,
+        # and taken out of the result so it is never sent to clients.
+        embedding = analysis_result.pop('embedding', None)
+        with transaction.atomic():
+            complaint = self.create(
+                user_id=user_id,
+                state=state,
+                city=city,
+                date_of_incident=date_of_incident,
+                complaint_text=complaint_text,
+                predicted_urgency=analysis_result.get('predicted_urgency'),
+                predicted_category=analysis_result.get('predicted_category'),
+                # The JSONField handles the dictionary list directly
+                recommended_sections=analysis_result.get('recommended_sections', []),
+                embedding=None if embedding is None else embedding.astype('float32').tobytes(),
+            )
+            ComplaintDailyStat.objects.record(complaint)
+        return complaint
+
+
 class Complaint(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='complaints')
     complaint_text = models.TextField()
@@ -10,10 +40,118 @@ class Complaint(models.Model):
     predicted_urgency = models.CharField(max_length=20)
     predicted_category = models.CharField(max_length=100)
     recommended_sections = models.JSONField()
+    # float32 sentence embedding of the complaint text, for finding similar complaints
+    embedding = models.BinaryField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ComplaintManager()
+
     class Meta:
         db_table = 'complaint_history'
 
     def __str__(self):
-        return f"Complaint {self.pk} by {self.user.email}"
\ No newline at end of file
+        return f"Complaint {self.pk} by {self.user.email}"
+
+
+class ComplaintDailyStatManager(models.Manager):
+    """
+    Keeps the rollup in step with the complaint table. Complaints stored with
+    create_from_analysis are counted as they are inserted; `manage.py
+    rebuild_complaint_stats` recounts everything, e.g. after deletions.
+    """
+    def record(self, complaint):
+        """Counts one newly inserted complaint."""
+        key = {
+            'day': timezone.localdate(complaint.created_at),
+            'state': complaint.state,
+            'city': complaint.city,
+            'predicted_category': complaint.predicted_category,
+            'predicted_urgency': complaint.predicted_urgency,
+        }
+        if self.filter(**key).update(count=F('count') + 1):
+            return
+        try:
+            with transaction.atomic():
+                self.create(**key, count=1)
+        except IntegrityError:
+            # Another request created the row first
+            self.filter(**key).update(count=F('count') + 1)
+
+    def rebuild(self):
+        """Recounts the whole rollup from the complaint table. Returns the number of rows."""
+        totals = (
+            Complaint.objects.annotate(day=TruncDate('created_at'))
+            .values('day', 'state', 'city', 'predicted_category', 'predicted_urgency')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        with transaction.atomic():
+            self.all().delete()
+            stats = self.bulk_create((ComplaintDailyStat(**row) for row in totals.iterator()), batch_size=1000)
+        return len(stats)
+
+
+class ComplaintDailyStat(models.Model):
+    """
+    Number of complaints filed per day, state, city, predicted category and
+    urgency, so dashboards never have to GROUP BY the complaint table.
+    """
+    day = models.DateField()
+    state = models.CharField(max_length=100)
+    city = models.CharField(max_length=100)
+    predicted_category = models.CharField(max_length=100)
+    predicted_urgency = models.CharField(max_length=20)
+    count = models.PositiveIntegerField(default=0)
+
+    objects = ComplaintDailyStatManager()
+
+    class Meta:
+        db_table = 'complaint_daily_stats'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'state', 'city', 'predicted_category', 'predicted_urgency'],
+                name='complaint_daily_stats_unique_group',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.state}/{self.city} {self.predicted_category} ({self.predicted_urgency}): {self.count}"
+
+
+class AnalysisJob(models.Model):
+    """
+    A complaint waiting to be analyzed in the background. The table doubles as
+    the job queue: workers claim pending rows in micro-batches. A claim is a
+    lease of ANALYSIS_JOB_LEASE_SECONDS; running jobs whose lease ran out
+    (their worker died) are claimed again, up to ANALYSIS_JOB_MAX_ATTEMPTS.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='analysis_jobs')
+    complaint_text = models.TextField()
+    state = models.CharField(max_length=100)
+    city = models.CharField(max_length=100)
+    date_of_incident = models.DateField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    complaint = models.ForeignKey(Complaint, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'complaint_analysis_jobs'
+
+    def __str__(self):
+        return f"AnalysisJob {self.pk} ({self.status})"
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Complaint
+from .models import AnalysisJob, Complaint
 
 class ComplaintSerializer(serializers.ModelSerializer):
     """
@@ -18,4 +18,23 @@ class ComplaintSerializer(serializers.ModelSerializer):
             'predicted_category',
             'recommended_sections',
             'created_at'
-        ]
\ No newline at end of file
+        ]
+
+class AnalysisJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for polling a background complaint analysis.
+    """
+    job_id = serializers.IntegerField(source='id', read_only=True)
+    complaint_id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = AnalysisJob
+        fields = [
+            'job_id',
+            'status',
+            'result',
+            'error',
+            'complaint_id',
+            'created_at',
+            'updated_at'
+        ]
@@ -0,0 +1,233 @@
+"""
+Nearest-neighbour search over stored complaint embeddings.
+
+Staff searches go through an HNSW graph over every complaint, keyed by
+complaint id. The graph is append-only: at most every
+COMPLAINT_INDEX_REFRESH_INTERVAL seconds a background thread adds the
+complaints newer than the last id it has seen, so every worker stays current
+without rebuilding. `manage.py compact_complaint_index` periodically rebuilds
+it from the table into COMPLAINT_INDEX_DIR, which drops deleted complaints
+and rebalances the graph. The same thread loads that file when it changes
+(or, before the first compaction, builds the graph from the table). Requests
+never touch the disk or the table; they only search the graph in memory.
+
+Non-staff users only ever see their own complaints, which are few enough to
+compare exactly.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Complaint
+
+INDEX_FILE = "complaints.index"
+META_FILE = "complaints.json"
+HNSW_NEIGHBOURS = 32
+CATCH_UP_BATCH_SIZE = 10000
+
+
+def _unit_rows(matrix):
+    import numpy as np
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (matrix / norms).astype("float32")
+
+
+def _decode(embeddings):
+    import numpy as np
+
+    return _unit_rows(np.vstack([np.frombuffer(bytes(blob), dtype="float32") for blob in embeddings]))
+
+
+def _new_index(dimension):
+    import faiss
+
+    # Inner product of unit vectors is cosine similarity
+    graph = faiss.IndexHNSWFlat(dimension, HNSW_NEIGHBOURS, faiss.METRIC_INNER_PRODUCT)
+    graph.hnsw.efSearch = settings.COMPLAINT_INDEX_EF_SEARCH
+    return faiss.IndexIDMap2(graph)
+
+
+def _embedded_complaints(after_id=0):
+    """Yields (ids, unit embeddings) batches of complaints with an id above after_id, in id order."""
+    import numpy as np
+
+    while True:
+        rows = list(
+            Complaint.objects.filter(id__gt=after_id, embedding__isnull=False)
+            .order_by('id')
+            .values_list('id', 'embedding')[:CATCH_UP_BATCH_SIZE]
+        )
+        if not rows:
+            return
+        ids, embeddings = zip(*rows)
+        yield np.array(ids, dtype="int64"), _decode(embeddings)
+        after_id = ids[-1]
+
+
+class IndexNotReady(Exception):
+    """Raised by ComplaintIndex.search until the index has been loaded or built in the background."""
+
+
+def _index_table():
+    """Builds an index of every embedded complaint. Returns (index or None, last indexed id)."""
+    index, last_id = None, 0
+    for ids, embeddings in _embedded_complaints():
+        if index is None:
+            index = _new_index(embeddings.shape[1])
+        index.add_with_ids(embeddings, ids)
+        last_id = int(ids[-1])
+    return index, last_id
+
+
+class ComplaintIndex:
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        # Guards the fields below; held for in-memory work only, never for I/O
+        self._lock = threading.Lock()
+        self._ready = False
+        self._refreshing = False
+        self._next_refresh = 0
+        self._index = None
+        self._last_id = 0
+        self._built_at = None
+
+    def _file_built_at(self):
+        try:
+            return json.loads((self.index_dir / META_FILE).read_text())["built_at"]
+        except FileNotFoundError:
+            return None
+
+    def _read(self):
+        """Reads the compacted index. Returns (index, last indexed id, built_at)."""
+        import faiss
+
+        meta = json.loads((self.index_dir / META_FILE).read_text())
+        index = faiss.read_index(str(self.index_dir / INDEX_FILE))
+        # read_index returns the IndexIDMap2 with a generic Index inside
+        faiss.downcast_index(index.index).hnsw.efSearch = settings.COMPLAINT_INDEX_EF_SEARCH
+        return index, meta["last_id"], meta["built_at"]
+
+    def warm(self):
+        """
+        Loads the compacted index, or builds one from the table if there is
+        none, and swaps it in. Runs in the background from search(), or
+        directly (e.g. at startup or in tests).
+        """
+        if self._file_built_at() is not None:
+            index, last_id, built_at = self._read()
+        else:
+            (index, last_id), built_at = _index_table(), None
+        with self._lock:
+            self._index, self._last_id, self._built_at = index, last_id, built_at
+            self._ready = True
+
+    def _catch_up(self):
+        """Appends complaints newer than the last indexed one."""
+        for ids, embeddings in _embedded_complaints(self._last_id):
+            with self._lock:
+                if self._index is None:
+                    self._index = _new_index(embeddings.shape[1])
+                self._index.add_with_ids(embeddings, ids)
+                self._last_id = int(ids[-1])
+
+    def refresh(self):
+        """Loads a new compacted file if there is one, then appends newer complaints."""
+        built_at = self._file_built_at()
+        if not self._ready or (built_at is not None and built_at != self._built_at):
+            self.warm()
+        self._catch_up()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"❌ Could not refresh the complaint similarity index: {e}")
+        finally:
+            connection.close()
+            with self._lock:
+                self._refreshing = False
+
+    def _start_refresh(self):
+        """Starts refresh() on a background thread unless one is running. Call with the lock held."""
+        self._next_refresh = time.monotonic() + settings.COMPLAINT_INDEX_REFRESH_INTERVAL
+        if not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._refresh_in_background, name="complaint-index", daemon=True).start()
+
+    def search(self, embedding, k):
+        """
+        Returns [(complaint id, cosine similarity)] of the k nearest complaints.
+        Raises IndexNotReady until the first load or build has finished.
+        Complaints saved since the last refresh are not found yet.
+        """
+        query = _unit_rows(embedding.reshape(1, -1))
+        with self._lock:
+            if not self._ready:
+                self._start_refresh()
+                raise IndexNotReady("The complaint similarity index is loading")
+            if time.monotonic() >= self._next_refresh:
+                self._start_refresh()
+            if self._index is None or self._index.ntotal == 0:
+                return []
+            scores, ids = self._index.search(query, k)
+        return [(int(i), float(score)) for i, score in zip(ids[0], scores[0]) if i != -1]
+
+    def compact(self):
+        """Rebuilds the index from the table and saves it atomically. Returns the number of complaints indexed."""
+        import faiss
+
+        index, last_id = _index_table()
+        if index is None:
+            return 0
+
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        tmp_index = self.index_dir / f".{INDEX_FILE}.tmp"
+        faiss.write_index(index, str(tmp_index))
+        os.replace(tmp_index, self.index_dir / INDEX_FILE)
+        # The metadata is replaced last; readers reload when its built_at changes
+        meta = {"last_id": last_id, "count": index.ntotal, "built_at": datetime.now(timezone.utc).isoformat()}
+        tmp_meta = self.index_dir / f".{META_FILE}.tmp"
+        tmp_meta.write_text(json.dumps(meta, indent=2))
+        os.replace(tmp_meta, self.index_dir / META_FILE)
+        return index.ntotal
+
+
+complaint_index = ComplaintIndex(settings.COMPLAINT_INDEX_DIR)
+
+
+def similar_complaints(complaint, k, user_id=None):
+    """
+    Returns [(complaint id, similarity)] of the k complaints most similar to
+    `complaint`, excluding itself. With user_id, only that user's complaints
+    are considered.
+    """
+    import numpy as np
+
+    query = np.frombuffer(bytes(complaint.embedding), dtype="float32")
+    if user_id is None:
+        matches = complaint_index.search(query, k + 1)
+    else:
+        rows = list(
+            Complaint.objects.filter(user_id=user_id, embedding__isnull=False)
+            .exclude(pk=complaint.pk)
+            .values_list('id', 'embedding')
+        )
+        if not rows:
+            return []
+        ids, embeddings = zip(*rows)
+        scores = _decode(embeddings) @ _unit_rows(query.reshape(1, -1))[0]
+        matches = [(ids[i], float(scores[i])) for i in np.argsort(-scores)[:k]]
+    seen = {complaint.pk}
+    results = []
+    for complaint_id, score in matches:
+        if complaint_id not in seen:
+            seen.add(complaint_id)
+            results.append((complaint_id, score))
+    return results[:k]
@@ -1,3 +1,324 @@
-from django.test import TestCase
+import csv
+import importlib.util
+import io
+import json
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.mlengine.complaint_analysis import AnalysisTimeout
+from apps.users.authentication import clear_user_status_cache, get_tokens_for_user
+from apps.users.models import CustomUser
+
+from .admission import AdmissionController, Overloaded
+from .export import EXPORT_FIELDS, export_chunks, filter_complaints
+from .jobs import _claim_batch, enqueue_analysis, process_batch
+from .models import AnalysisJob, Complaint, ComplaintDailyStat
+from .similarity import ComplaintIndex, IndexNotReady
+
+
+@unittest.skipUnless(importlib.util.find_spec("faiss") and importlib.util.find_spec("numpy"), "faiss is not installed")
+class ComplaintIndexTests(TestCase):
+    def setUp(self):
+        import numpy as np
+
+        user = CustomUser.objects.create_user(email='user@example.com', password='secret', phone_number='9000000003')
+        self.vectors = np.eye(8, dtype='float32')
+        self.complaints = [
+            Complaint.objects.create(
+                user=user, complaint_text=f'complaint {i}', state='Goa', city='Panaji',
+                date_of_incident='2025-01-01', predicted_urgency='Low', predicted_category='Theft',
+                recommended_sections=[], embedding=vector.tobytes(),
+            )
+            for i, vector in enumerate(self.vectors)
+        ]
+        self.index_dir = Path(tempfile.mkdtemp())
+
+    def test_search_after_compaction(self):
+        self.assertEqual(ComplaintIndex(self.index_dir).compact(), len(self.complaints))
+
+        index = ComplaintIndex(self.index_dir)
+        index.warm()
+        matches = index.search(self.vectors[3], 1)
+        self.assertEqual(matches[0][0], self.complaints[3].pk)
+        self.assertAlmostEqual(matches[0][1], 1.0, places=5)
+
+    def test_first_search_does_not_build_in_the_request(self):
+        index = ComplaintIndex(self.index_dir)
+        with mock.patch.object(ComplaintIndex, '_start_refresh') as start_refresh:
+            with self.assertRaises(IndexNotReady):
+                index.search(self.vectors[0], 1)
+        start_refresh.assert_called_once()
+
+    def test_search_leaves_new_complaints_to_the_refresh(self):
+        index = ComplaintIndex(self.index_dir)
+        index.warm()
+        new = Complaint.objects.create(
+            user=self.complaints[0].user, complaint_text='new complaint', state='Goa', city='Panaji',
+            date_of_incident='2025-01-01', predicted_urgency='Low', predicted_category='Theft',
+            recommended_sections=[], embedding=self.vectors[3].tobytes(),
+        )
+
+        with mock.patch.object(ComplaintIndex, '_start_refresh') as start_refresh, self.assertNumQueries(0):
+            matches = index.search(self.vectors[3], 1)
+        start_refresh.assert_called_once()
+        self.assertEqual(matches[0][0], self.complaints[3].pk)
+
+        index.refresh()
+        self.assertCountEqual([pk for pk, _ in index.search(self.vectors[3], 2)], [self.complaints[3].pk, new.pk])
+
+
+ANALYSIS_RESULT = {'predicted_urgency': 'High', 'predicted_category': 'Theft', 'recommended_sections': []}
+
+
+@override_settings(ANALYSIS_JOB_LEASE_SECONDS=600, ANALYSIS_JOB_MAX_ATTEMPTS=3, ANALYSIS_JOB_BATCH_SIZE=16)
+class AnalysisJobTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='jobs@example.com', password='secret', phone_number='9000000004')
+
+    def job(self, **fields):
+        return AnalysisJob.objects.create(
+            user=self.user, state='Goa', city='Panaji', date_of_incident='2025-01-01',
+            complaint_text='my phone was stolen', **fields,
+        )
+
+    def test_claim_takes_pending_jobs(self):
+        job = self.job()
+        self.assertEqual([claimed.pk for claimed in _claim_batch()], [job.pk])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (AnalysisJob.STATUS_RUNNING, 1))
+        self.assertEqual(_claim_batch(), [])
+
+    def test_claim_takes_running_jobs_whose_lease_expired(self):
+        expired = self.job(status=AnalysisJob.STATUS_RUNNING, attempts=1, claimed_at=timezone.now() - timedelta(seconds=601))
+        self.job(status=AnalysisJob.STATUS_RUNNING, attempts=1, claimed_at=timezone.now())
+        self.assertEqual([claimed.pk for claimed in _claim_batch()], [expired.pk])
+        expired.refresh_from_db()
+        self.assertEqual(expired.attempts, 2)
+
+    def test_jobs_out_of_attempts_fail(self):
+        job = self.job(status=AnalysisJob.STATUS_RUNNING, attempts=3, claimed_at=timezone.now() - timedelta(seconds=601))
+        self.assertEqual(_claim_batch(), [])
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnalysisJob.STATUS_FAILED)
+
+    @mock.patch('apps.complaints.jobs.analyze_complaints', return_value=[dict(ANALYSIS_RESULT)])
+    def test_process_batch_saves_the_complaint(self, analyze):
+        job = self.job()
+        process_batch(_claim_batch())
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnalysisJob.STATUS_DONE)
+        self.assertEqual(job.complaint.predicted_category, 'Theft')
+        self.assertEqual(ComplaintDailyStat.objects.get().count, 1)
+
+    @mock.patch('apps.complaints.jobs.analyze_complaints', return_value=[dict(ANALYSIS_RESULT)])
+    def test_result_is_dropped_when_the_lease_was_lost(self, analyze):
+        job = self.job()
+        claimed = _claim_batch()
+        # Another worker claims the job again after the lease ran out
+        AnalysisJob.objects.filter(pk=job.pk).update(claimed_at=timezone.now(), attempts=2)
+
+        process_batch(claimed)
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnalysisJob.STATUS_RUNNING)
+        self.assertFalse(Complaint.objects.exists())
+        self.assertFalse(ComplaintDailyStat.objects.exists())
+
+    @mock.patch('apps.complaints.jobs.analyze_complaints', return_value=[{'error': 'Model not loaded'}])
+    def test_analysis_errors_fail_the_job(self, analyze):
+        job = self.job()
+        process_batch(_claim_batch())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (AnalysisJob.STATUS_FAILED, 'Model not loaded'))
+
+    @mock.patch('apps.complaints.jobs.start_workers')
+    def test_web_processes_start_workers_only_when_enabled(self, start_workers):
+        with override_settings(ANALYSIS_WORKERS_IN_WEB=False):
+            enqueue_analysis(self.user.pk, 'Goa', 'Panaji', '2025-01-01', 'my phone was stolen')
+        start_workers.assert_not_called()
+        with override_settings(ANALYSIS_WORKERS_IN_WEB=True):
+            enqueue_analysis(self.user.pk, 'Goa', 'Panaji', '2025-01-01', 'my phone was stolen')
+        start_workers.assert_called_once()
+
+
+class ComplaintAnalysisViewTests(TestCase):
+    def setUp(self):
+        clear_user_status_cache()
+        user = CustomUser.objects.create_user(email='analyze@example.com', password='secret', phone_number='9000000005')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Bearer {get_tokens_for_user(user)['access']}"
+
+    def analyze(self, **data):
+        complaint = {'state': 'Goa', 'city': 'Panaji', 'dateOfIncident': '2025-01-01', 'complaint_text': 'my phone was stolen'}
+        return self.client.post(reverse('analyze-complaint'), {**complaint, **data}, content_type='application/json')
+
+    @mock.patch('apps.complaints.views.predict_urgency', return_value='Low')
+    @mock.patch('apps.complaints.views.analyze_complaint', side_effect=AnalysisTimeout('No analysis result within 30s'))
+    def test_batch_timeout_answers_503(self, analyze_complaint, predict_urgency):
+        response = self.analyze()
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(Complaint.objects.exists())
+
+    @mock.patch('apps.complaints.views.predict_urgency', return_value='Low')
+    @mock.patch('apps.complaints.views.admission')
+    def test_overload_answers_503_with_retry_after(self, admission, predict_urgency):
+        admission.admit.side_effect = Overloaded(7)
+        response = self.analyze()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
+        admission.admit.assert_called_once_with('Low')
+
+
+class AdmissionControllerTests(SimpleTestCase):
+    def wait_for_waiting(self, controller, count):
+        deadline = time.monotonic() + 5
+        while controller.stats()['waiting'] < count:
+            self.assertLess(time.monotonic(), deadline, "requests never queued")
+            time.sleep(0.001)
+
+    def test_more_urgent_requests_are_admitted_first(self):
+        controller = AdmissionController(max_concurrent=1, max_waiting=5, timeout=5)
+        admitted = []
+
+        def analyze(urgency):
+            with controller.admit(urgency):
+                admitted.append(urgency)
+
+        with controller.admit('Medium'):
+            threads = []
+            for count, urgency in enumerate(['Low', 'High', 'Medium'], start=1):
+                threads.append(threading.Thread(target=analyze, args=(urgency,)))
+                threads[-1].start()
+                self.wait_for_waiting(controller, count)
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(admitted, ['High', 'Medium', 'Low'])
+        self.assertEqual(controller.stats()['running'], 0)
+
+    def test_full_queue_is_rejected(self):
+        controller = AdmissionController(max_concurrent=1, max_waiting=0, timeout=5)
+        with controller.admit('High'):
+            with self.assertRaises(Overloaded) as raised:
+                with controller.admit('High'):
+                    pass
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+        self.assertEqual(controller.stats()['rejected'], 1)
+
+    def test_waiting_times_out(self):
+        controller = AdmissionController(max_concurrent=1, max_waiting=1, timeout=0.01)
+        with controller.admit('Low'):
+            with self.assertRaises(Overloaded):
+                with controller.admit('High'):
+                    pass
+        stats = controller.stats()
+        self.assertEqual((stats['timed_out'], stats['waiting'], stats['running']), (1, 0, 0))
+
+
+class ComplaintExportTests(TestCase):
+    def setUp(self):
+        clear_user_status_cache()
+        self.user = CustomUser.objects.create_user(email='export@example.com', password='secret', phone_number='9000000006')
+        self.complaints = [
+            Complaint.objects.create(
+                user=self.user, complaint_text=f'complaint {i}', state=state, city='City',
+                date_of_incident='2025-01-01', predicted_urgency='Low', predicted_category='Theft',
+                recommended_sections=[{'section_number': 379, 'title': 'Punishment for theft'}],
+            )
+            for i, state in enumerate(['Goa', 'Kerala', 'Goa'])
+        ]
+
+    def export(self, file_format, **filters):
+        return b''.join(export_chunks(filter_complaints(**filters), file_format, chunk_size=2))
+
+    def test_ndjson(self):
+        rows = [json.loads(line) for line in self.export('ndjson').splitlines()]
+        self.assertEqual([row['id'] for row in rows], [complaint.pk for complaint in self.complaints])
+        self.assertEqual(list(rows[0]), EXPORT_FIELDS)
+        self.assertEqual(rows[0]['recommended_sections'][0]['section_number'], 379)
+
+    def test_csv_is_filtered(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('csv', state='goa').decode())))
+        self.assertEqual([int(row['id']) for row in rows], [self.complaints[0].pk, self.complaints[2].pk])
+        self.assertEqual(json.loads(rows[0]['recommended_sections'])[0]['title'], 'Punishment for theft')
+        self.assertEqual(self.export('csv', state='Punjab').decode().strip(), ','.join(EXPORT_FIELDS))
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+    def test_parquet(self):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(io.BytesIO(self.export('parquet')))
+        self.assertEqual(parquet_file.schema_arrow.names, EXPORT_FIELDS)
+        # One row group per fetched batch
+        self.assertEqual(parquet_file.num_row_groups, 2)
+        table = parquet_file.read()
+        self.assertEqual(table.column('id').to_pylist(), [complaint.pk for complaint in self.complaints])
+
+    def test_view_is_staff_only_and_validates_parameters(self):
+        def get(user, **params):
+            token = get_tokens_for_user(user)['access']
+            return self.client.get(reverse('complaint-export'), params, HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        self.assertEqual(get(self.user).status_code, 403)
+        staff = CustomUser.objects.create_user(email='admin@example.com', password='secret', phone_number='9000000007', is_staff=True)
+        self.assertEqual(get(staff, file_format='xlsx').status_code, 400)
+        self.assertEqual(get(staff, start='01/01/2025').status_code, 400)
+
+        response = get(staff, state='Kerala')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertIn('attachment; filename="complaints-', response['Content-Disposition'])
+        rows = b''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(row)['id'] for row in rows], [self.complaints[1].pk])
+
+
+class ComplaintDailyStatTests(TestCase):
+    def setUp(self):
+        clear_user_status_cache()
+        self.user = CustomUser.objects.create_user(email='stats@example.com', password='secret', phone_number='9000000008')
+        for state, category, urgency in [('Goa', 'Theft', 'High'), ('Goa', 'Theft', 'High'), ('Goa', 'Fraud', 'Low'), ('Kerala', 'Theft', 'Low')]:
+            Complaint.objects.create_from_analysis(
+                self.user.pk, state, 'City', '2025-01-01', 'complaint',
+                {'predicted_urgency': urgency, 'predicted_category': category, 'recommended_sections': []},
+            )
+
+    def counts(self):
+        return {
+            (stat.state, stat.predicted_category, stat.predicted_urgency): stat.count
+            for stat in ComplaintDailyStat.objects.all()
+        }
+
+    def test_new_complaints_are_counted(self):
+        self.assertEqual(self.counts(), {
+            ('Goa', 'Theft', 'High'): 2, ('Goa', 'Fraud', 'Low'): 1, ('Kerala', 'Theft', 'Low'): 1,
+        })
+
+    def test_rebuild_recounts_from_the_complaints(self):
+        Complaint.objects.filter(state='Kerala').delete()
+        Complaint.objects.filter(predicted_category='Theft').first().delete()
+        self.assertEqual(ComplaintDailyStat.objects.rebuild(), 2)
+        self.assertEqual(self.counts(), {('Goa', 'Theft', 'High'): 1, ('Goa', 'Fraud', 'Low'): 1})
+
+    def test_view_groups_and_filters(self):
+        staff = CustomUser.objects.create_user(email='dashboard@example.com', password='secret', phone_number='9000000009', is_staff=True)
+        token = get_tokens_for_user(staff)['access']
+
+        def get(**params):
+            return self.client.get(reverse('complaint-stats'), params, HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        self.assertEqual(get(group_by='state,category').json(), [
+            {'state': 'Goa', 'category': 'Fraud', 'count': 1},
+            {'state': 'Goa', 'category': 'Theft', 'count': 2},
+            {'state': 'Kerala', 'category': 'Theft', 'count': 1},
+        ])
+        self.assertEqual(get(group_by='urgency', state='goa').json(), [
+            {'urgency': 'High', 'count': 2}, {'urgency': 'Low', 'count': 1},
+        ])
+        self.assertEqual(get(group_by='day').json()[0]['count'], 4)
+        self.assertEqual(get(group_by='weekday').status_code, 400)
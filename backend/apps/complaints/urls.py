@@ -1,7 +1,14 @@
 from django.urls import path
-from .views import ComplaintAnalysisView, ComplaintHistoryView
+from .views import (
+    AnalysisJobView, ComplaintAnalysisView, ComplaintExportView, ComplaintHistoryView, ComplaintStatsView,
+    SimilarComplaintsView,
+)
 
 urlpatterns = [
     path('analyze/', ComplaintAnalysisView.as_view(), name='analyze-complaint'),
     path('history/', ComplaintHistoryView.as_view(), name='complaint-history'),
+    path('export/', ComplaintExportView.as_view(), name='complaint-export'),
+    path('stats/', ComplaintStatsView.as_view(), name='complaint-stats'),
+    path('jobs/<int:job_id>/', AnalysisJobView.as_view(), name='analysis-job'),
+    path('<int:complaint_id>/similar/', SimilarComplaintsView.as_view(), name='similar-complaints'),
 ]
\ No newline at end of file
@@ -1,21 +1,51 @@
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db.models import F, Sum
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.dateparse import parse_date
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.generics import ListAPIView
 
+from apps.users.authentication import StatelessJWTAuthentication
+
 # Import the ML analysis function
-from apps.mlengine.complaint_analysis import analyze_complaint
+from apps.mlengine.complaint_analysis import AnalysisTimeout, analyze_complaint, predict_urgency
+from apps.mlengine.instrumentation import stage
 
 # Import your new model and serializer
-from .models import Complaint
-from .serializers import ComplaintSerializer
+from .admission import Overloaded, admission
+from .export import FORMATS, export_chunks, filter_complaints
+from .jobs import enqueue_analysis
+from .models import AnalysisJob, Complaint, ComplaintDailyStat
+from .serializers import AnalysisJobSerializer, ComplaintSerializer
+from .similarity import IndexNotReady, similar_complaints
+
+def _date_range(params):
+    """The `start` and `end` query parameters as dates (None if absent); ValueError if malformed."""
+    dates = {}
+    for name in ('start', 'end'):
+        value = params.get(name)
+        try:
+            dates[name] = parse_date(value) if value else None
+        except ValueError:
+            dates[name] = None
+        if value and dates[name] is None:
+            raise ValueError(f"{name} must be a YYYY-MM-DD date.")
+    return dates
 
 class ComplaintAnalysisView(APIView):
     """
     An API endpoint that accepts complaint details, analyzes them,
     and saves the complaint and its analysis to the database.
     """
+    # Only request.user.id is needed here, so skip loading the user row.
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
@@ -24,7 +54,7 @@ class ComplaintAnalysisView(APIView):
         """
         # 1. Get data from the request
         data = request.data
-        user = request.user
+        user_id = request.user.id
 
         # 2. Basic validation
         required_fields = ['state', 'city', 'dateOfIncident', 'complaint_text']
@@ -35,29 +65,64 @@ class ComplaintAnalysisView(APIView):
             )
 
         complaint_text = data['complaint_text']
-
+        date_of_incident = data['dateOfIncident']
         try:
-            # 3. Call the analysis function from the mlengine
-            analysis_result = analyze_complaint(complaint_text)
-            if "error" in analysis_result:
-                return Response(analysis_result, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-            # 4. Create and save the Complaint instance
-            Complaint.objects.create(
-                user=user,
-                state=data['state'],
-                city=data['city'],
-                date_of_incident=data['dateOfIncident'],
-                complaint_text=complaint_text,
-                predicted_urgency=analysis_result.get('predicted_urgency'),
-                predicted_category=analysis_result.get('predicted_category'),
-                # The JSONField handles the dictionary list directly
-                recommended_sections=analysis_result.get('recommended_sections', [])
+            valid_date = isinstance(date_of_incident, str) and parse_date(date_of_incident) is not None
+        except ValueError:
+            valid_date = False
+        if not valid_date:
+            return Response(
+                {"error": "dateOfIncident must be a YYYY-MM-DD date."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Optional async mode: queue the analysis and let the client poll the job
+        if self._wants_async(request):
+            job = enqueue_analysis(user_id, data['state'], data['city'], date_of_incident, complaint_text)
+            return Response(
+                {
+                    "job_id": job.id,
+                    "status": job.status,
+                    "status_url": reverse('analysis-job', args=[job.id]),
+                },
+                status=status.HTTP_202_ACCEPTED
             )
 
-            # 5. Return the analysis result to the frontend
+        try:
+            # 3. Pre-classify the urgency, so more urgent complaints are analyzed first under load
+            with stage("urgency_preclassify"):
+                urgency = predict_urgency(complaint_text)
+
+            with admission.admit(urgency):
+                # 4. Call the analysis function from the mlengine
+                analysis_result = analyze_complaint(complaint_text)
+                if "error" in analysis_result:
+                    return Response(analysis_result, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+                # 5. Create and save the Complaint instance
+                with stage("orm_insert"):
+                    Complaint.objects.create_from_analysis(
+                        user_id, data['state'], data['city'], date_of_incident,
+                        complaint_text, analysis_result,
+                    )
+
+            # 6. Return the analysis result to the frontend
             return Response(analysis_result, status=status.HTTP_200_OK)
 
+        except Overloaded as e:
+            return Response(
+                {"error": "The server is busy analyzing other complaints. Please try again shortly."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(e.retry_after)}
+            )
+
+        except AnalysisTimeout as e:
+            print(f"Complaint analysis timed out: {e}")
+            return Response(
+                {"error": "The analysis is taking too long. Please try again shortly."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
         except Exception as e:
             print(f"Error during complaint analysis or saving: {e}") # For logging
             return Response(
@@ -65,11 +130,158 @@ class ComplaintAnalysisView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def _wants_async(self, request):
+        flag = request.query_params.get('async', request.data.get('async'))
+        if flag is None:
+            return settings.COMPLAINT_ANALYSIS_ASYNC
+        return str(flag).lower() in ('1', 'true', 'yes')
+
+class AnalysisJobView(APIView):
+    """
+    An API endpoint to poll the status and result of a queued complaint analysis.
+    """
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id, *args, **kwargs):
+        job = get_object_or_404(AnalysisJob, pk=job_id, user_id=request.user.id)
+        return Response(AnalysisJobSerializer(job).data, status=status.HTTP_200_OK)
+
+class SimilarComplaintsView(APIView):
+    """
+    An API endpoint that returns the complaints most similar to a given one.
+    Staff search all complaints; other users only their own.
+    """
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, complaint_id, *args, **kwargs):
+        if request.user.is_staff:
+            complaint = get_object_or_404(Complaint, pk=complaint_id)
+            owner_id = None
+        else:
+            complaint = get_object_or_404(Complaint, pk=complaint_id, user_id=request.user.id)
+            owner_id = request.user.id
+
+        if complaint.embedding is None:
+            return Response(
+                {"error": "This complaint was analyzed before embeddings were stored."},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        try:
+            k = min(int(request.query_params.get('k', 10)), settings.COMPLAINT_SIMILAR_MAX_K)
+        except ValueError:
+            return Response({"error": "k must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with stage("similar_search"):
+                matches = similar_complaints(complaint, max(k, 1), user_id=owner_id)
+        except IndexNotReady:
+            return Response(
+                {"error": "The similarity index is loading. Please try again shortly."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "5"}
+            )
+        complaints = Complaint.objects.defer('embedding').in_bulk([complaint_id for complaint_id, _ in matches])
+        results = [
+            {**ComplaintSerializer(complaints[match_id]).data, "similarity": score}
+            for match_id, score in matches if match_id in complaints
+        ]
+        return Response(results, status=status.HTTP_200_OK)
+
+class ComplaintExportView(APIView):
+    """
+    A staff-only API endpoint that streams complaints as NDJSON, CSV or Parquet
+    (`file_format`), filtered by creation date (`start`, `end`), `state`,
+    `city` and predicted `category`.
+    """
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        # Not `format`, which DRF reserves for choosing a renderer
+        file_format = params.get('file_format', 'ndjson')
+        if file_format not in FORMATS:
+            return Response(
+                {"error": f"file_format must be one of: {', '.join(FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            dates = _date_range(params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        complaints = filter_complaints(
+            state=params.get('state'), city=params.get('city'), category=params.get('category'), **dates,
+        )
+        content_type, extension, _ = FORMATS[file_format]
+        response = StreamingHttpResponse(export_chunks(complaints, file_format), content_type=content_type)
+        file_name = f"complaints-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.{extension}"
+        response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+        return response
+
+class ComplaintStatsView(APIView):
+    """
+    A staff-only API endpoint for dashboards, serving complaint counts from
+    the daily rollup. Counts are grouped by the comma-separated `group_by`
+    dimensions (default `day`) and filtered by day (`start`, `end`), `state`,
+    `city`, `category` and `urgency`.
+    """
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAdminUser]
+
+    # query parameter / output key: ComplaintDailyStat field
+    DIMENSIONS = {
+        'day': 'day',
+        'state': 'state',
+        'city': 'city',
+        'category': 'predicted_category',
+        'urgency': 'predicted_urgency',
+    }
+
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        group_by = [name.strip() for name in params.get('group_by', 'day').split(',') if name.strip()]
+        unknown = [name for name in group_by if name not in self.DIMENSIONS]
+        if unknown:
+            return Response(
+                {"error": f"group_by must be a list of: {', '.join(self.DIMENSIONS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            dates = _date_range(params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        stats = ComplaintDailyStat.objects.all()
+        if dates['start'] is not None:
+            stats = stats.filter(day__gte=dates['start'])
+        if dates['end'] is not None:
+            stats = stats.filter(day__lte=dates['end'])
+        for name in ('state', 'city', 'category', 'urgency'):
+            if params.get(name):
+                stats = stats.filter(**{f"{self.DIMENSIONS[name]}__iexact": params[name]})
+
+        with stage("stats_query"):
+            rows = list(
+                stats.values(
+                    *[name for name in group_by if name == self.DIMENSIONS[name]],
+                    **{name: F(self.DIMENSIONS[name]) for name in group_by if name != self.DIMENSIONS[name]},
+                )
+                .annotate(count=Sum('count'))
+                .order_by(*group_by)
+            )
+        return Response(rows, status=status.HTTP_200_OK)
+
 class ComplaintHistoryView(ListAPIView):
     """
     An API endpoint that returns the complaint history for the authenticated user.
     """
     serializer_class = ComplaintSerializer
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -77,4 +289,4 @@ class ComplaintHistoryView(ListAPIView):
         This view returns a list of all complaints filed by the
         currently authenticated user, ordered by the newest first.
         """
-        return Complaint.objects.filter(user=self.request.user).order_by('-created_at')
\ No newline at end of file
+        return Complaint.objects.filter(user_id=self.request.user.id).defer('embedding').order_by('-created_at')
\ No newline at end of file
@@ -0,0 +1,296 @@
+"""
+Reproducible build of the complaint analysis artifacts.
+
+This replaces the training cells of ml_workspace/data_cleaning_and_training.ipynb.
+Each stage writes into build_cache/<stage>/<key>/, where the key hashes the
+stage's parameters, its input files and the keys of the stages it depends on.
+A stage whose key already exists is reused, so a rebuild only redoes the
+stages whose inputs changed. Independent stages run in parallel threads.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from .artifact_registry import complaint_registry, file_sha256
+from .paths import BACKEND_DIR, MODELS_DIR
+from .related_sections import RELATED_SECTIONS_FILE
+
+# --- CONFIGURATION ---
+TRAINING_CSV = BACKEND_DIR.parent / "ml_workspace" / "IPC_Sections_Final.csv"
+BUILD_CACHE_DIR = MODELS_DIR / "build_cache"
+
+ENCODER_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BATCH_SIZE = 64
+
+CLASSIFIER_PARAMS = {
+    "max_features": 5000,
+    "max_iter": 1000,
+    "random_state": 42,
+    "test_size": 0.2,
+}
+
+# Specialist terms appended to every section of a category before embedding,
+# to bridge the gap between complaint wording and legal wording.
+CATEGORY_KEYWORDS = {
+    "Theft": "theft stole stolen snatching robbery pickpocket chain",
+    "Public Nuisance": "public annoyance disturbance loud music noise party fighting argument",
+    "Fraud": "fraud cheat scam online bank account money",
+    "Criminal Intimidation": "harassment stalking threatening messages bother safety intimidate",
+}
+
+PARTITIONS_FILE = "category_partitions.json"
+RELATED_SECTIONS_K = 5
+
+
+# --- STAGES ---
+def _clean(inputs, out_dir):
+    import pandas as pd
+    from .text_normalization import clean_text_series
+
+    df = pd.read_csv(inputs["training_csv"]).dropna()
+    df["cleaned_text"] = clean_text_series(df["full_legal_text"])
+
+    # Filter out rare categories to keep the stratified split stable
+    category_counts = df["mapped_category"].value_counts()
+    rare_categories = category_counts[category_counts < 2].index
+    df = df[~df["mapped_category"].isin(rare_categories)].reset_index(drop=True)
+    df.to_pickle(out_dir / "cleaned.pkl")
+
+
+def _train_classifier(label_column, output_file):
+    def run(inputs, out_dir):
+        import joblib
+        import pandas as pd
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.metrics import accuracy_score
+        from sklearn.model_selection import train_test_split
+        from sklearn.pipeline import Pipeline
+
+        df = pd.read_pickle(inputs["clean"] / "cleaned.pkl")
+        # Both classifiers use the same category-stratified split
+        X_train, X_test, y_train, y_test = train_test_split(
+            df["cleaned_text"], df[label_column],
+            test_size=CLASSIFIER_PARAMS["test_size"],
+            random_state=CLASSIFIER_PARAMS["random_state"],
+            stratify=df["mapped_category"],
+        )
+        pipeline = Pipeline([
+            ("tfidf", TfidfVectorizer(max_features=CLASSIFIER_PARAMS["max_features"])),
+            ("clf", LogisticRegression(
+                random_state=CLASSIFIER_PARAMS["random_state"],
+                max_iter=CLASSIFIER_PARAMS["max_iter"],
+                class_weight="balanced",
+            )),
+        ])
+        pipeline.fit(X_train, y_train)
+        joblib.dump(pipeline, out_dir / output_file)
+
+        metrics = {"test_accuracy": accuracy_score(y_test, pipeline.predict(X_test))}
+        (out_dir / "metrics.json").write_text(json.dumps(metrics, indent=2))
+    return run
+
+
+def enrich_text(df):
+    """cleaned_text plus the specialist keywords of each row's category."""
+    keywords = df["mapped_category"].map(CATEGORY_KEYWORDS)
+    return df["cleaned_text"].where(keywords.isna(), df["cleaned_text"] + " " + keywords)
+
+
+def _embed(inputs, out_dir):
+    import numpy as np
+    import pandas as pd
+    from .encoders import SentenceTransformerEncoder
+
+    df = pd.read_pickle(inputs["clean"] / "cleaned.pkl")
+    texts = enrich_text(df).tolist()
+    encoder = SentenceTransformerEncoder(ENCODER_MODEL)
+    embeddings = np.vstack([
+        encoder.encode(texts[start:start + EMBEDDING_BATCH_SIZE])
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE)
+    ]).astype("float32")
+    np.save(out_dir / "embeddings.npy", embeddings)
+
+
+def _build_index(inputs, out_dir):
+    import faiss
+    import numpy as np
+    import pandas as pd
+
+    df = pd.read_pickle(inputs["clean"] / "cleaned.pkl")
+    embeddings = np.load(inputs["embeddings"] / "embeddings.npy")
+
+    index = faiss.IndexFlatL2(embeddings.shape[1])
+    index.add(embeddings)
+    faiss.write_index(index, str(out_dir / "faiss_index.index"))
+    # The lookup frame keeps every column of the source CSV, since the recommendations
+    # show punishment, bailability, jurisdiction and the full legal text
+    df.drop(columns=["cleaned_text"]).reset_index(drop=True).to_pickle(out_dir / "ipc_data_for_index.pkl")
+
+    # Index positions of each category, so the analyzer can search only the predicted ones
+    partitions = {category: rows.tolist() for category, rows in df.reset_index(drop=True).groupby("mapped_category").indices.items()}
+    (out_dir / PARTITIONS_FILE).write_text(json.dumps(partitions, indent=2))
+
+
+def _related_sections(inputs, out_dir):
+    """Top-k most similar other sections of every section, by cosine similarity of their embeddings."""
+    import numpy as np
+    import pandas as pd
+
+    df = pd.read_pickle(inputs["clean"] / "cleaned.pkl")
+    embeddings = np.load(inputs["embeddings"] / "embeddings.npy")
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    similarities = embeddings @ embeddings.T
+    np.fill_diagonal(similarities, -np.inf)
+    k = min(RELATED_SECTIONS_K, len(df) - 1)
+    neighbours = np.argsort(-similarities, axis=1)[:, :k]
+
+    sections = df["section_number"].astype(str).tolist()
+    titles = df["title"].tolist()
+    graph = {
+        sections[row]: [
+            {"section_number": sections[i], "title": titles[i], "similarity": round(float(similarities[row, i]), 4)}
+            for i in neighbours[row]
+        ]
+        for row in range(len(df))
+    }
+    (out_dir / RELATED_SECTIONS_FILE).write_text(json.dumps(graph, indent=1))
+
+
+# Each stage: the stages it depends on, the files it reads, the parameters
+# that affect its output, the function that builds it, and the files it
+# contributes to a release.
+STAGES = {
+    "clean": {
+        "deps": [],
+        "files": {"training_csv": TRAINING_CSV},
+        "params": {"version": 1},
+        "run": _clean,
+        "release_files": [],
+    },
+    "urgency_classifier": {
+        "deps": ["clean"],
+        "files": {},
+        "params": {"version": 1, **CLASSIFIER_PARAMS},
+        "run": _train_classifier("urgency_label", "urgency_classifier.joblib"),
+        "release_files": ["urgency_classifier.joblib"],
+    },
+    "category_classifier": {
+        "deps": ["clean"],
+        "files": {},
+        "params": {"version": 1, **CLASSIFIER_PARAMS},
+        "run": _train_classifier("mapped_category", "category_classifier.joblib"),
+        "release_files": ["category_classifier.joblib"],
+    },
+    "embeddings": {
+        "deps": ["clean"],
+        "files": {},
+        "params": {"version": 1, "model": ENCODER_MODEL, "keywords": CATEGORY_KEYWORDS},
+        "run": _embed,
+        "release_files": [],
+    },
+    "faiss_index": {
+        "deps": ["clean", "embeddings"],
+        "files": {},
+        "params": {"version": 3},
+        "run": _build_index,
+        "release_files": ["faiss_index.index", "ipc_data_for_index.pkl", PARTITIONS_FILE],
+    },
+    "related_sections": {
+        "deps": ["clean", "embeddings"],
+        "files": {},
+        "params": {"version": 1, "k": RELATED_SECTIONS_K},
+        "run": _related_sections,
+        "release_files": [RELATED_SECTIONS_FILE],
+    },
+}
+
+
+# --- BUILD RUNNER ---
+def _stage_key(name, dep_keys):
+    stage = STAGES[name]
+    payload = {
+        "stage": name,
+        "params": stage["params"],
+        "deps": {dep: dep_keys[dep] for dep in stage["deps"]},
+        "files": {label: file_sha256(path) for label, path in stage["files"].items()},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _run_stage(name, key, dep_dirs, log):
+    """Builds a stage into a temporary directory and moves it into the cache."""
+    stage = STAGES[name]
+    out_dir = BUILD_CACHE_DIR / name / key
+    if out_dir.exists():
+        log(f"  ♻️  {name}: cached ({key})")
+        return out_dir
+
+    log(f"  ⚙️  {name}: building ({key})...")
+    out_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f".{key}-", dir=out_dir.parent)
+    try:
+        inputs = {**stage["files"], **{dep: dep_dirs[dep] for dep in stage["deps"]}}
+        stage["run"](inputs, Path(tmp_dir))
+        os.replace(tmp_dir, out_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    log(f"  ✅ {name}: done")
+    return out_dir
+
+
+def build_stages(max_workers=3, force=False, log=print):
+    """
+    Runs every stage, in parallel where dependencies allow, and returns
+    {stage name: (cache key, output directory)}.
+    """
+    if force and BUILD_CACHE_DIR.exists():
+        shutil.rmtree(BUILD_CACHE_DIR)
+
+    done = {}
+    pending = dict.fromkeys(STAGES)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            for name in [n for n in pending if all(dep in done for dep in STAGES[n]["deps"])]:
+                del pending[name]
+                key = _stage_key(name, {dep: done[dep][0] for dep in done})
+                dep_dirs = {dep: done[dep][1] for dep in STAGES[name]["deps"]}
+                running[executor.submit(_run_stage, name, key, dep_dirs, log)] = (name, key)
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, key = running.pop(future)
+                done[name] = (key, future.result())
+    return done
+
+
+def create_release(stage_outputs):
+    """
+    Publishes the release files of a build as a new complaint_registry
+    release (manifest with sha256 checksums, stage keys and metrics).
+    Returns the new version.
+    """
+    release_dir = complaint_registry.new_release_dir()
+    metrics = {}
+    try:
+        for name, (key, out_dir) in stage_outputs.items():
+            for file_name in STAGES[name]["release_files"]:
+                shutil.copy2(out_dir / file_name, release_dir / file_name)
+            if (out_dir / "metrics.json").exists():
+                metrics[name] = json.loads((out_dir / "metrics.json").read_text())
+
+        return complaint_registry.publish(
+            release_dir,
+            stages={name: key for name, (key, _) in stage_outputs.items()},
+            metrics=metrics,
+        )
+    except BaseException:
+        shutil.rmtree(release_dir, ignore_errors=True)
+        raise
@@ -0,0 +1,209 @@
+"""
+Versioned, checksummed artifact releases with atomic activation.
+
+A registry keeps immutable releases in <releases_dir>/<version>/, each with a
+manifest.json listing every file's sha256. A CURRENT file names the active
+release; it is replaced atomically, so workers never see a half-written
+release. Without a CURRENT file the legacy flat directory is served.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+
+from .paths import EMBED_DIR, MODELS_DIR
+
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+HISTORY_FILE = "history.json"
+LEGACY_VERSION = "legacy"
+
+
+class ArtifactError(Exception):
+    """Raised for unknown, incomplete or corrupted releases."""
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_atomic(path, text):
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}-", dir=path.parent)
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class ArtifactRegistry:
+    def __init__(self, name, releases_dir, legacy_dir):
+        self.name = name
+        self.releases_dir = releases_dir
+        self.legacy_dir = legacy_dir
+
+    # --- Reading ---
+    def versions(self):
+        """All complete releases, oldest first."""
+        if not self.releases_dir.exists():
+            return []
+        return sorted(
+            entry.name for entry in self.releases_dir.iterdir()
+            if (entry / MANIFEST_FILE).exists()
+        )
+
+    def current_version(self):
+        try:
+            return (self.releases_dir / CURRENT_FILE).read_text().strip() or LEGACY_VERSION
+        except FileNotFoundError:
+            return LEGACY_VERSION
+
+    def path(self, version):
+        if version == LEGACY_VERSION:
+            return self.legacy_dir
+        return self.releases_dir / version
+
+    def manifest(self, version):
+        try:
+            return json.loads((self.path(version) / MANIFEST_FILE).read_text())
+        except FileNotFoundError:
+            raise ArtifactError(f"{self.name} release {version!r} does not exist")
+
+    def verify(self, version):
+        """Checks every file of a release against its manifest checksum."""
+        if version == LEGACY_VERSION:
+            return
+        release_dir = self.path(version)
+        for file_name, meta in self.manifest(version)["files"].items():
+            file_path = release_dir / file_name
+            if not file_path.exists() or file_sha256(file_path) != meta["sha256"]:
+                raise ArtifactError(f"{self.name} release {version}: {file_name} is missing or corrupted")
+
+    def history(self):
+        try:
+            return json.loads((self.releases_dir / HISTORY_FILE).read_text())
+        except FileNotFoundError:
+            return []
+
+    # --- Writing ---
+    def publish(self, source_dir, **metadata):
+        """
+        Turns a fully written directory into a new release: writes its
+        manifest and moves it into place. Returns the new version.
+        """
+        files = {
+            entry.name: {"sha256": file_sha256(entry), "size": entry.stat().st_size}
+            for entry in sorted(source_dir.iterdir())
+            if entry.is_file() and entry.name != MANIFEST_FILE
+        }
+        created_at = datetime.now(timezone.utc)
+        content_id = hashlib.sha256(
+            json.dumps({name: meta["sha256"] for name, meta in files.items()}, sort_keys=True).encode()
+        ).hexdigest()[:8]
+        version = f"{created_at:%Y%m%d-%H%M%S}-{content_id}"
+
+        manifest = {"version": version, "created_at": created_at.isoformat(), "files": files, **metadata}
+        (source_dir / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2))
+
+        self.releases_dir.mkdir(parents=True, exist_ok=True)
+        os.replace(source_dir, self.releases_dir / version)
+        return version
+
+    def new_release_dir(self):
+        """A scratch directory on the same filesystem, to build a release in."""
+        self.releases_dir.mkdir(parents=True, exist_ok=True)
+        return Path(tempfile.mkdtemp(prefix=".building-", dir=self.releases_dir))
+
+    def activate(self, version):
+        """Verifies a release and atomically makes it the one workers serve."""
+        self.verify(version)
+        self.releases_dir.mkdir(parents=True, exist_ok=True)
+        _write_atomic(self.releases_dir / CURRENT_FILE, version + "\n")
+        history = self.history() + [{"version": version, "activated_at": datetime.now(timezone.utc).isoformat()}]
+        _write_atomic(self.releases_dir / HISTORY_FILE, json.dumps(history, indent=2))
+
+    def rollback(self, to_version=None):
+        """Re-activates `to_version`, or the release that was active before the current one."""
+        if to_version is None:
+            current = self.current_version()
+            previous = [entry["version"] for entry in self.history() if entry["version"] != current]
+            if not previous:
+                raise ArtifactError(f"No earlier {self.name} release to roll back to")
+            to_version = previous[-1]
+        self.activate(to_version)
+        return to_version
+
+    def discard(self, version):
+        if version in (self.current_version(), LEGACY_VERSION):
+            raise ArtifactError("The active release cannot be removed")
+        shutil.rmtree(self.path(version))
+
+
+complaint_registry = ArtifactRegistry("complaint", MODELS_DIR / "releases", MODELS_DIR)
+rag_registry = ArtifactRegistry("rag", EMBED_DIR / "releases", EMBED_DIR)
+
+
+class HotReloader:
+    """
+    Holds the loaded artifacts of a registry's active release. Every
+    ML_ARTIFACT_CHECK_INTERVAL seconds get() looks at CURRENT; when it changed,
+    the new release is verified and loaded in a background thread and swapped
+    in atomically. Requests keep using the old release until then, and a
+    release that fails to load is never swapped in.
+    """
+    def __init__(self, registry, load):
+        self.registry = registry
+        self.load = load
+        self.loaded = None  # (version, artifacts)
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._next_check = 0
+
+    def get(self):
+        """Returns (version, artifacts), loading the active release on first use."""
+        loaded = self.loaded
+        if loaded is None:
+            with self._lock:
+                if self.loaded is None:
+                    version = self.registry.current_version()
+                    self.registry.verify(version)
+                    self.loaded = (version, self.load(self.registry.path(version)))
+                    self._next_check = time.monotonic() + settings.ML_ARTIFACT_CHECK_INTERVAL
+            return self.loaded
+
+        self._maybe_reload(loaded[0])
+        return loaded
+
+    def _maybe_reload(self, loaded_version):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if self._reloading or now < self._next_check:
+                return
+            self._next_check = now + settings.ML_ARTIFACT_CHECK_INTERVAL
+            version = self.registry.current_version()
+            if version == loaded_version:
+                return
+            self._reloading = True
+        threading.Thread(target=self._reload, args=(version,), name=f"{self.registry.name}-reload", daemon=True).start()
+
+    def _reload(self, version):
+        try:
+            print(f"🔄 Loading {self.registry.name} release {version} in the background...")
+            self.registry.verify(version)
+            self.loaded = (version, self.load(self.registry.path(version)))
+            print(f"✅ Now serving {self.registry.name} release {version}.")
+        except Exception as e:
+            print(f"❌ Could not load {self.registry.name} release {version}, keeping the current one: {e}")
+        finally:
+            self._reloading = False
@@ -0,0 +1,82 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Collects single items submitted from many threads and hands them to
+    `process_batch` in groups. A batch is dispatched once it has
+    `max_batch_size` items or the oldest item has waited `max_latency_ms`.
+    `process_batch` must return one result per item, in order.
+    """
+    def __init__(self, process_batch, max_batch_size=16, max_latency_ms=5, name='micro-batcher'):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+
+    def submit(self, item):
+        """Queues an item and returns a Future for its result."""
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def stats(self):
+        """Returns the number of batches and items and the batch size distribution."""
+        with self._stats_lock:
+            sizes = dict(sorted(self._batch_sizes.items()))
+        return {
+            "batches": sum(sizes.values()),
+            "items": sum(size * count for size, count in sizes.items()),
+            "batch_sizes": sizes,
+        }
+
+    def _ensure_thread(self):
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        """Blocks for the first item, then gathers more until the batch is full or the latency budget is spent."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Skip callers that gave up (cancelled) before we started.
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+
+            try:
+                results = self.process_batch([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
@@ -0,0 +1,229 @@
+"""
+Offline latency and quality benchmarks for the ML engine.
+
+Used by `manage.py benchmark_mlengine`; every function returns plain dicts so
+the results can be dumped as JSON and compared across commits.
+"""
+import resource
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .paths import BACKEND_DIR
+
+SYNTHETIC_COMPLAINTS_CSV = BACKEND_DIR.parent / "ml_workspace" / "synthetic_complaints.csv"
+
+# Questions with the IPC section a good retriever should return for them.
+RAG_QUESTIONS = [
+    ("What is the punishment for murder?", "302"),
+    ("What is the punishment for attempt to murder?", "307"),
+    ("What is the punishment for theft?", "379"),
+    ("Which section covers receiving stolen property?", "411"),
+    ("What is the law on cheating and dishonestly inducing delivery of property?", "420"),
+    ("What is the punishment for criminal intimidation?", "506"),
+    ("What does the IPC say about dowry death?", "304B"),
+    ("What is the punishment for defamation?", "500"),
+    ("What is the punishment for rape?", "376"),
+    ("What is the punishment for kidnapping?", "363"),
+    ("What is the punishment for rioting?", "147"),
+    ("What is the punishment for voluntarily causing hurt?", "323"),
+    ("Which section deals with outraging the modesty of a woman?", "354"),
+]
+
+
+def percentiles(latencies):
+    """p50/p95/p99/mean latency in milliseconds (nearest-rank)."""
+    if not latencies:
+        return {}
+    ordered = sorted(latencies)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))] * 1000
+
+    return {
+        "p50_ms": rank(50),
+        "p95_ms": rank(95),
+        "p99_ms": rank(99),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_load(fn, inputs, concurrency):
+    """Calls fn on every input from `concurrency` threads; returns (outputs, latencies, elapsed)."""
+    def timed(item):
+        start = time.perf_counter()
+        output = fn(item)
+        return output, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        timed_outputs = list(executor.map(timed, inputs))
+    elapsed = time.perf_counter() - start
+    return [output for output, _ in timed_outputs], [latency for _, latency in timed_outputs], elapsed
+
+
+def benchmark_analyzer(samples, concurrency_levels):
+    """Replays synthetic complaints through analyze_complaint at several concurrency levels."""
+    import pandas as pd
+    from .complaint_analysis import analyze_complaint, get_models
+    from .result_cache import result_cache
+
+    df = pd.read_csv(SYNTHETIC_COMPLAINTS_CSV).dropna(subset=["complaint_text"])
+    if samples:
+        df = df.sample(n=min(samples, len(df)), random_state=42)
+    texts = df["complaint_text"].tolist()
+
+    start = time.perf_counter()
+    model_version, models = get_models()
+    if models is None:
+        # Timing the error path would produce meaningless numbers
+        raise RuntimeError("The complaint analysis models could not be loaded")
+    report = {"model_version": model_version, "load_s": time.perf_counter() - start, "samples": len(texts), "runs": []}
+
+    for concurrency in concurrency_levels:
+        # Every run starts cold, so it measures the models and not the result cache
+        result_cache.clear()
+        results, latencies, elapsed = run_load(analyze_complaint, texts, concurrency)
+        report["runs"].append({
+            "concurrency": concurrency,
+            "throughput_rps": len(texts) / elapsed,
+            **percentiles(latencies),
+        })
+
+    # Quality is the same for every run; score the last one
+    report["category_accuracy"] = sum(
+        r.get("predicted_category") == label for r, label in zip(results, df["mapped_category"])
+    ) / len(texts)
+    report["urgency_accuracy"] = sum(
+        r.get("predicted_urgency") == label for r, label in zip(results, df["urgency_label"])
+    ) / len(texts)
+    return report
+
+
+def benchmark_rag(concurrency_levels, k=5):
+    """
+    Measures retrieval latency and recall@k over RAG_QUESTIONS, and end-to-end
+    ask_with_memory latency with a fake LLM (no network calls).
+    """
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from . import rag_engine
+
+    start = time.perf_counter()
+    rag_engine.rag_components["embedding_model"] = rag_engine._load_embedding_model()
+    rag_engine.rag_components["llm"] = FakeListChatModel(responses=["This is a benchmark answer."])
+    index_version, retriever = rag_engine.get_retriever()
+    report = {"model_version": index_version, "load_s": time.perf_counter() - start, "k": k, "runs": []}
+
+    questions = [question for question, _ in RAG_QUESTIONS]
+    # Every measurement starts cold, so repeated questions are not served from the cache
+    rag_engine.retrieval_cache.clear()
+    docs_per_question, latencies, _ = run_load(retriever.invoke, questions, 1)
+    hits = sum(
+        any(str(doc.metadata.get("section_number")) == expected for doc in docs[:k])
+        for docs, (_, expected) in zip(docs_per_question, RAG_QUESTIONS)
+    )
+    report["retrieval"] = {f"recall_at_{k}": hits / len(RAG_QUESTIONS), **percentiles(latencies)}
+
+    for concurrency in concurrency_levels:
+        rag_engine.retrieval_cache.clear()
+        _, latencies, elapsed = run_load(rag_engine.ask_with_memory, questions, concurrency)
+        report["runs"].append({
+            "concurrency": concurrency,
+            "throughput_rps": len(questions) / elapsed,
+            **percentiles(latencies),
+        })
+    return report
+
+
+def _median_seconds(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2]
+
+
+def serialization_payloads(history_size):
+    """
+    API payloads shaped like the real ones, built from the training CSV and
+    the synthetic complaints: one analysis result, a complaint history of
+    history_size complaints, and the IPC explorer list.
+    """
+    from datetime import datetime, timedelta, timezone
+
+    import pandas as pd
+    from .artifact_build import TRAINING_CSV
+
+    sections = pd.read_csv(TRAINING_CSV)
+    # A release's lookup frame keeps every column of the CSV
+    lookup = sections
+    complaints = pd.read_csv(SYNTHETIC_COMPLAINTS_CSV).dropna(subset=["complaint_text"])
+    complaints = complaints.sample(n=min(history_size, len(complaints)), random_state=42)
+
+    def analysis(row, offset):
+        # to_dict keeps numpy scalars, as in _run_models
+        recommended = lookup.iloc[[(offset + i * 37) % len(lookup) for i in range(10)]].to_dict(orient="records")
+        return {
+            "predicted_urgency": row["urgency_label"],
+            "predicted_category": row["mapped_category"],
+            "recommended_sections": recommended,
+            "related_sections": [
+                {"section_number": str(section["section_number"]), "title": section["title"], "similarity": 0.8}
+                for section in lookup.iloc[[(offset + i * 53) % len(lookup) for i in range(5)]].to_dict(orient="records")
+            ],
+            "model_version": "benchmark",
+        }
+
+    now = datetime.now(timezone.utc)
+    history = [
+        {
+            "id": i,
+            "state": "Maharashtra",
+            "city": "Mumbai",
+            "date_of_incident": (now - timedelta(days=i)).date(),
+            "complaint_text": row["complaint_text"],
+            **analysis(row, i),
+            "created_at": now - timedelta(hours=i),
+        }
+        for i, (_, row) in enumerate(complaints.iterrows())
+    ]
+    return {
+        "analysis": analysis(complaints.iloc[0], 0),
+        "history": history,
+        "ipc_sections": sections.drop(columns=["urgency_label"]).to_dict(orient="records"),
+    }
+
+
+def benchmark_serialization(history_size=200, repeats=20):
+    """
+    Compares DRF's JSONRenderer with ORJSONRenderer on serialization_payloads,
+    and the bytes on the wire uncompressed, gzipped and brotli-compressed.
+    """
+    from rest_framework.renderers import JSONRenderer
+
+    from .compression import brotli, compress
+    from .renderers import ORJSONRenderer
+
+    report = {"history_size": history_size, "repeats": repeats, "payloads": {}}
+    for name, payload in serialization_payloads(history_size).items():
+        body = ORJSONRenderer().render(payload)
+        wire = {"identity": len(body), "gzip": len(compress(body, "gzip"))}
+        if brotli is not None:
+            wire["br"] = len(compress(body, "br"))
+        report["payloads"][name] = {
+            "render_ms": {
+                renderer.__name__: _median_seconds(lambda: renderer().render(payload), repeats) * 1000
+                for renderer in (JSONRenderer, ORJSONRenderer)
+            },
+            "compress_ms": {
+                encoding: _median_seconds(lambda: compress(body, encoding), repeats) * 1000
+                for encoding in wire if encoding != "identity"
+            },
+            "bytes": wire,
+        }
+    return report
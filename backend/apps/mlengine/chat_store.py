@@ -0,0 +1,51 @@
+import secrets
+
+from django.conf import settings
+from django.core.cache import caches
+
+# --- CHAT HISTORY STORE ---
+# Chat history is kept in the cache instead of the session, and anonymous
+# conversations are identified by a signed cookie instead of a session, so a
+# chat turn never writes to the database.
+_COOKIE_SALT = 'chat_store.conversation'
+
+
+def _cache():
+    return caches[settings.CHAT_CACHE_ALIAS]
+
+
+def conversation_key(request):
+    """
+    Identifies a conversation by user id, or by the CHAT_COOKIE_NAME cookie
+    for anonymous users. Returns (key, new cookie value or None); a new value
+    must be handed to set_conversation_cookie.
+    """
+    if request.user and request.user.is_authenticated:
+        return f"chat:user:{request.user.id}", None
+    conversation_id = request.get_signed_cookie(settings.CHAT_COOKIE_NAME, default=None, salt=_COOKIE_SALT)
+    if conversation_id is not None:
+        return f"chat:anonymous:{conversation_id}", None
+    conversation_id = secrets.token_urlsafe(16)
+    return f"chat:anonymous:{conversation_id}", conversation_id
+
+
+def set_conversation_cookie(response, conversation_id):
+    response.set_signed_cookie(
+        settings.CHAT_COOKIE_NAME, conversation_id, salt=_COOKIE_SALT,
+        max_age=settings.CHAT_HISTORY_TTL, httponly=True, samesite='Lax',
+        secure=settings.SESSION_COOKIE_SECURE,
+    )
+
+
+def get_history(key):
+    """Returns the stored (question, answer) pairs for a conversation."""
+    return _cache().get(key, [])
+
+
+def append_turn(key, query, answer):
+    """Appends a turn, keeping only the last CHAT_HISTORY_MAX_TURNS turns."""
+    history = get_history(key)
+    history.append((query, answer))
+    history = history[-settings.CHAT_HISTORY_MAX_TURNS:]
+    _cache().set(key, history, timeout=settings.CHAT_HISTORY_TTL)
+    return history
@@ -0,0 +1,99 @@
+"""
+RAG index releases that keep chunk text on disk.
+
+LangChain's FAISS.save_local pickles the whole InMemoryDocstore (every chunk's
+text and metadata) next to the index, and load_local unpickles it into each
+worker. A chunk-store release instead holds the FAISS index (INDEX_FILE) and
+a SQLite file (CHUNKS_FILE) with one row per chunk, keyed by its position in
+the index. Only the index is loaded; the text and metadata of the top-k hits
+are read on demand, so worker memory and load time no longer grow with the
+size of the corpus text.
+
+Releases built before this format are converted with
+`manage.py convert_rag_index`.
+"""
+import json
+import sqlite3
+import threading
+
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.sqlite3"
+
+
+def is_chunk_store(index_dir):
+    return (index_dir / CHUNKS_FILE).exists()
+
+
+def write_chunk_store(index_dir, index, documents, normalize_L2=False):
+    """
+    Writes a chunk-store release into index_dir: the FAISS index, and the
+    LangChain documents in index order (documents[i] is vector i).
+    """
+    import faiss
+
+    if len(documents) != index.ntotal:
+        raise ValueError(f"{len(documents)} documents for {index.ntotal} vectors")
+    faiss.write_index(index, str(index_dir / INDEX_FILE))
+
+    connection = sqlite3.connect(index_dir / CHUNKS_FILE)
+    try:
+        with connection:
+            connection.execute("CREATE TABLE chunks (position INTEGER PRIMARY KEY, page_content TEXT NOT NULL, metadata TEXT NOT NULL)")
+            connection.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            connection.executemany(
+                "INSERT INTO chunks VALUES (?, ?, ?)",
+                ((position, doc.page_content, json.dumps(doc.metadata, default=str)) for position, doc in enumerate(documents)),
+            )
+            connection.execute("INSERT INTO meta VALUES ('normalize_L2', ?)", (json.dumps(normalize_L2),))
+    finally:
+        connection.close()
+
+
+def write_from_langchain(index_dir, vectordb):
+    """Writes a LangChain FAISS store as a chunk-store release into index_dir."""
+    documents = [vectordb.docstore.search(vectordb.index_to_docstore_id[i]) for i in range(vectordb.index.ntotal)]
+    write_chunk_store(index_dir, vectordb.index, documents, normalize_L2=vectordb._normalize_L2)
+    return len(documents)
+
+
+class ChunkStore:
+    """Read-only access to CHUNKS_FILE, with one SQLite connection per thread."""
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.connection = connection
+        return connection
+
+    def meta(self, key):
+        row = self._connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def get(self, positions):
+        """Returns (page_content, metadata) of the chunks at these index positions, in the same order."""
+        if not positions:
+            return []
+        placeholders = ",".join("?" * len(positions))
+        rows = self._connection().execute(
+            f"SELECT position, page_content, metadata FROM chunks WHERE position IN ({placeholders})", positions,
+        ).fetchall()
+        chunks = {position: (page_content, json.loads(metadata)) for position, page_content, metadata in rows}
+        return [chunks[position] for position in positions if position in chunks]
+
+
+class ChunkIndex:
+    """A loaded chunk-store release: the FAISS index in memory and the chunks on disk."""
+    def __init__(self, index, chunks):
+        self.index = index
+        self.chunks = chunks
+        self.normalize_L2 = bool(chunks.meta("normalize_L2"))
+
+    @classmethod
+    def load(cls, index_dir):
+        import faiss
+
+        return cls(faiss.read_index(str(index_dir / INDEX_FILE)), ChunkStore(index_dir / CHUNKS_FILE))
@@ -1,86 +1,277 @@
-import joblib
-import faiss
-import pandas as pd
-from sentence_transformers import SentenceTransformer
-import os
-import re
+import json
 import threading
-
-# --- CONFIGURATION ---
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODELS_DIR = os.path.join(BASE_DIR, 'saved_models')
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from django.conf import settings
+from .artifact_registry import HotReloader, complaint_registry
+from .batching import MicroBatcher
+from .encoders import get_encoder
+from .instrumentation import register_collector, stage
+from .related_sections import load_related_sections
+from .result_cache import result_cache, result_key
+from .text_normalization import clean_text
 
 # --- LAZY LOADING SETUP ---
-ml_models = {
-    "urgency_pipeline": None,
-    "category_pipeline": None,
-    "faiss_index": None,
-    "df_lookup": None,
-    "semantic_model": None
-}
-model_lock = threading.Lock()
-
-def load_models():
-    """Loads all ML models into memory once, on the first request."""
-    global ml_models
-    print("🧠 Loading the definitive, high-accuracy model set...")
+def load_models(model_dir):
+    """Loads the model set of one artifact release into memory."""
+    print(f"🧠 Loading the definitive, high-accuracy model set from {model_dir}...")
+    # Heavy ML libraries are imported here, not at module import, so that
+    # URL loading, migrations and management commands stay fast.
+    import joblib
+    import faiss
+    import numpy as np
+    import pandas as pd
+
+    models = {
+        "urgency_pipeline": joblib.load(model_dir / 'urgency_classifier.joblib'),
+        "category_pipeline": joblib.load(model_dir / 'category_classifier.joblib'),
+        "faiss_index": faiss.read_index(str(model_dir / 'faiss_index.index')),
+        "df_lookup": pd.read_pickle(model_dir / 'ipc_data_for_index.pkl'),
+        "semantic_model": get_encoder(),
+        # Releases built before category partitioning always search the whole index
+        "partitions": None,
+        "selectors": {},
+        "related_sections": load_related_sections(model_dir),
+    }
+    partitions_file = model_dir / 'category_partitions.json'
+    if partitions_file.exists():
+        models["partitions"] = {
+            category: np.array(rows, dtype='int64')
+            for category, rows in json.loads(partitions_file.read_text()).items()
+        }
+    print("✅ Definitive model set loaded and ready.")
+    return models
+
+# The active release is loaded on the first request and hot-swapped when
+# `manage.py ml_artifacts activate/rollback` changes it.
+model_reloader = HotReloader(complaint_registry, load_models)
+
+def get_models():
+    """Returns (version, models) for the active release, or (None, None) if it could not be loaded."""
     try:
-        ml_models["urgency_pipeline"] = joblib.load(os.path.join(MODELS_DIR, 'urgency_classifier.joblib'))
-        ml_models["category_pipeline"] = joblib.load(os.path.join(MODELS_DIR, 'category_classifier.joblib'))
-        ml_models["faiss_index"] = faiss.read_index(os.path.join(MODELS_DIR, 'faiss_index.index'))
-        ml_models["df_lookup"] = pd.read_pickle(os.path.join(MODELS_DIR, 'ipc_data_for_index.pkl'))
-        ml_models["semantic_model"] = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
-        print("✅ Definitive model set loaded and ready.")
+        return model_reloader.get()
     except Exception as e:
         print(f"❌ Error loading models: {e}")
-        ml_models = {key: None for key in ml_models}
+        return None, None
+
+# --- CATEGORY-PARTITIONED SEARCH ---
+def _category_sets(category_pipeline, complaint_texts):
+    """
+    Predicts each complaint's category and the categories to search: the
+    predicted one, plus the runner-up when the classifier is not confident.
+    """
+    import numpy as np
+
+    probabilities = category_pipeline.predict_proba(complaint_texts)
+    classes = category_pipeline.classes_
+    ranked = np.argsort(-probabilities, axis=1)
+    predicted_categories = classes[ranked[:, 0]]
+    category_sets = []
+    for row, order in enumerate(ranked):
+        categories = [classes[order[0]]]
+        if len(order) > 1 and probabilities[row, order[0]] < settings.ML_CATEGORY_CONFIDENCE_THRESHOLD:
+            categories.append(classes[order[1]])
+        category_sets.append(tuple(sorted(categories)))
+    return predicted_categories, category_sets
+
+def _selector(ml_models, categories):
+    """A FAISS ID selector over the given categories, or None to search everything."""
+    import faiss
+    import numpy as np
+
+    selector = ml_models["selectors"].get(categories)
+    if selector is None:
+        rows = [ml_models["partitions"][category] for category in categories if category in ml_models["partitions"]]
+        if not rows:
+            return None
+        ids = np.concatenate(rows)
+        selector = ml_models["selectors"][categories] = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+    return selector
 
-def clean_text(text):
-    """A robust function to clean raw text for semantic analysis."""
-    if not isinstance(text, str):
-        return ""
-    text = text.replace('\\n', ' ').replace('\r', ' ')
-    text = re.sub(r'[^a-zA-Z0-9\s]', '', text)
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text.lower()
+def _search(ml_models, embeddings, category_sets, k):
+    """Searches each complaint's categories only; complaints with the same categories share one search."""
+    import faiss
+    import numpy as np
+
+    index = ml_models["faiss_index"]
+    if ml_models["partitions"] is None or not settings.ML_CATEGORY_PARTITIONED_SEARCH:
+        return index.search(embeddings, k=k)
+
+    distances = np.full((len(embeddings), k), np.inf, dtype='float32')
+    indices = np.full((len(embeddings), k), -1, dtype='int64')
+    rows_by_categories = {}
+    for row, categories in enumerate(category_sets):
+        rows_by_categories.setdefault(categories, []).append(row)
+    for categories, rows in rows_by_categories.items():
+        selector = _selector(ml_models, categories)
+        params = None if selector is None else faiss.SearchParameters(sel=selector)
+        distances[rows], indices[rows] = index.search(embeddings[rows], k=k, params=params)
+    return distances, indices
+
+def _related_to(graph, recommended_sections, limit=5):
+    """The most similar sections of the recommended ones, excluding those already recommended."""
+    recommended = {str(section["section_number"]) for section in recommended_sections}
+    related = []
+    for section in recommended_sections:
+        for neighbour in graph.get(str(section["section_number"]), []):
+            if neighbour["section_number"] not in recommended:
+                recommended.add(neighbour["section_number"])
+                related.append(neighbour)
+    related.sort(key=lambda neighbour: -neighbour["similarity"])
+    return related[:limit]
 
 # --- THE MASTER ANALYSIS FUNCTION ---
-def analyze_complaint(complaint_text: str):
+def _run_models(complaint_texts: list):
     """
-    Orchestrates the entire ML pipeline to analyze a user's complaint.
+    Runs each model once over the whole batch and returns one analysis
+    result per complaint (without consulting the result cache).
     """
-    with model_lock:
-        if ml_models["urgency_pipeline"] is None:
-            load_models()
-    
-    if ml_models["urgency_pipeline"] is None:
-        return {"error": "ML models could not be loaded. Please check server logs."}
+    if not complaint_texts:
+        return []
+
+    # One release serves the whole batch, even if a newer one is swapped in meanwhile
+    with stage("model_load"):
+        model_version, ml_models = get_models()
+    if ml_models is None:
+        return [{"error": "ML models could not be loaded. Please check server logs."} for _ in complaint_texts]
 
-    predicted_urgency = ml_models["urgency_pipeline"].predict([complaint_text])[0]
-    predicted_category = ml_models["category_pipeline"].predict([complaint_text])[0]
+    with stage("urgency_predict"):
+        predicted_urgencies = ml_models["urgency_pipeline"].predict(complaint_texts)
+    with stage("category_predict"):
+        predicted_categories, category_sets = _category_sets(ml_models["category_pipeline"], complaint_texts)
 
-    cleaned_complaint = clean_text(complaint_text)
-    complaint_embedding = ml_models["semantic_model"].encode(cleaned_complaint).reshape(1, -1)
+    with stage("clean_text"):
+        cleaned_complaints = [clean_text(text) for text in complaint_texts]
+    with stage("encode"):
+        complaint_embeddings = ml_models["semantic_model"].encode(cleaned_complaints)
     
-    distances, indices = ml_models["faiss_index"].search(complaint_embedding.astype('float32'), k=10)
+    with stage("faiss_search"):
+        distances, indices = _search(ml_models, complaint_embeddings.astype('float32'), category_sets, k=10)
     
-    similarity_scores = 1 / (1 + distances[0])
+    similarity_scores = 1 / (1 + distances)
     
     CONFIDENCE_THRESHOLD = 0.6
     
-    high_confidence_indices = [idx for i, idx in enumerate(indices[0]) if similarity_scores[i] >= CONFIDENCE_THRESHOLD]
+    results = []
+    with stage("format_results"):
+        for row, (predicted_urgency, predicted_category) in enumerate(zip(predicted_urgencies, predicted_categories)):
+            high_confidence_indices = [idx for i, idx in enumerate(indices[row]) if similarity_scores[row][i] >= CONFIDENCE_THRESHOLD]
 
-    if not high_confidence_indices:
-        high_confidence_indices = indices[0][:5]
-        
-    recommendations = ml_models["df_lookup"].iloc[high_confidence_indices]
+            if not high_confidence_indices:
+                # A small category partition can leave empty (-1) slots
+                high_confidence_indices = [idx for idx in indices[row][:5] if idx != -1]
+                
+            recommendations = ml_models["df_lookup"].iloc[high_confidence_indices]
+            recommended_sections = recommendations.to_dict(orient='records')
+            
+            # The entire recommendations DataFrame is converted to a list of dictionaries.
+            results.append({
+                "predicted_urgency": predicted_urgency,
+                "predicted_category": predicted_category,
+                "recommended_sections": recommended_sections,
+                "related_sections": _related_to(ml_models["related_sections"], recommended_sections),
+                "model_version": model_version,
+                # Stored with the complaint (see ComplaintManager.create_from_analysis)
+                "embedding": complaint_embeddings[row]
+            })
     
-    # ** THE CHANGE IS HERE **
-    # Instead of selecting specific columns, we now convert the entire DataFrame to a dictionary.
-    analysis_result = {
-        "predicted_urgency": predicted_urgency,
-        "predicted_category": predicted_category,
-        "recommended_sections": recommendations.to_dict(orient='records')
-    }
-    
-    return analysis_result
\ No newline at end of file
+    return results
+
+# --- RESULT CACHE ---
+def _with_result_cache(complaint_texts, compute):
+    """
+    Serves the complaints it can from the result cache, runs `compute` on the
+    others and caches their successful results.
+    """
+    if not settings.ML_RESULT_CACHE_SIZE:
+        return compute(complaint_texts)
+    model_version, _ = get_models()
+    if model_version is None:
+        return compute(complaint_texts)
+
+    with stage("result_cache"):
+        results = [result_cache.get(result_key(text, model_version)) for text in complaint_texts]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        for i, result in zip(missing, compute([complaint_texts[i] for i in missing])):
+            results[i] = result
+            if "error" not in result:
+                # Keyed by the release that actually produced the result
+                result_cache.put(result_key(complaint_texts[i], result["model_version"]), result)
+    return results
+
+def analyze_complaints(complaint_texts: list):
+    """
+    Vectorized version of analyze_complaint: returns one analysis result per
+    complaint, running the models only for complaints not in the result cache.
+    """
+    return _with_result_cache(complaint_texts, _run_models)
+
+def predict_urgency(complaint_text: str):
+    """
+    Cheap pre-classification with the urgency pipeline alone, used to
+    prioritise the full analysis. None if the models cannot be loaded.
+    """
+    _, ml_models = get_models()
+    if ml_models is None:
+        return None
+    return ml_models["urgency_pipeline"].predict([complaint_text])[0]
+
+class AnalysisTimeout(Exception):
+    """Raised when a micro-batched analysis does not finish within ML_BATCH_RESULT_TIMEOUT."""
+
+
+# --- MICRO-BATCHING SETUP ---
+# Concurrent single-complaint calls are merged into one analyze_complaints()
+# batch, so the encoder and FAISS search run once per batch instead of once per request.
+complaint_batcher = None
+batcher_lock = threading.Lock()
+
+def get_complaint_batcher():
+    global complaint_batcher
+    with batcher_lock:
+        if complaint_batcher is None:
+            complaint_batcher = MicroBatcher(
+                _run_models,
+                max_batch_size=settings.ML_BATCH_MAX_SIZE,
+                max_latency_ms=settings.ML_BATCH_MAX_LATENCY_MS,
+                name='complaint-batcher',
+            )
+    return complaint_batcher
+
+def analyze_complaint(complaint_text: str):
+    """
+    Orchestrates the entire ML pipeline to analyze a user's complaint.
+    With micro-batching on, raises AnalysisTimeout if the batch does not
+    finish in time.
+    """
+    def compute(complaint_texts):
+        if settings.ML_BATCHING_ENABLED:
+            # The pipeline stages run on the batcher thread; this request only sees the wait.
+            future = get_complaint_batcher().submit(complaint_texts[0])
+            with stage("batch_wait"):
+                try:
+                    return [future.result(timeout=settings.ML_BATCH_RESULT_TIMEOUT)]
+                except FutureTimeoutError:
+                    # Drop it from the queue if the batcher has not started it yet
+                    future.cancel()
+                    raise AnalysisTimeout(f"No analysis result within {settings.ML_BATCH_RESULT_TIMEOUT}s")
+        return _run_models(complaint_texts)
+
+    return _with_result_cache([complaint_text], compute)[0]
+
+@register_collector
+def _batcher_metrics():
+    """Exports the micro-batcher's batch size distribution as a Prometheus histogram."""
+    if complaint_batcher is None:
+        return []
+    stats = complaint_batcher.stats()
+    name = "legalsift_complaint_batch_size"
+    lines = [f"# HELP {name} Complaints per model micro-batch.", f"# TYPE {name} histogram"]
+    cumulative = 0
+    for size in range(1, complaint_batcher.max_batch_size + 1):
+        cumulative += stats["batch_sizes"].get(size, 0)
+        lines.append(f'{name}_bucket{{le="{size}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{le="+Inf"}} {stats["batches"]}')
+    lines.append(f'{name}_sum {stats["items"]}')
+    lines.append(f'{name}_count {stats["batches"]}')
+    return lines
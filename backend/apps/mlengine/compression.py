@@ -0,0 +1,105 @@
+"""
+Response compression for the large API payloads.
+
+Compresses responses under API_COMPRESSION_PATHS with brotli when the client
+accepts it and the `brotli` package is installed, and with gzip otherwise.
+Other paths (notably the login and token endpoints, whose bodies carry
+secrets) are never compressed, which keeps them out of reach of BREACH-style
+attacks. Responses smaller than API_COMPRESSION_MIN_BYTES are sent as they
+are, since compressing them saves less than it costs.
+"""
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+
+from .instrumentation import stage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _accepted_encodings(accept_encoding):
+    """The codings an Accept-Encoding header allows, i.e. those without q=0."""
+    accepted = set()
+    for entry in accept_encoding.lower().split(","):
+        name, *params = [part.strip() for part in entry.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            accepted.add(name)
+    return accepted
+
+
+def choose_encoding(accept_encoding):
+    """The best encoding the client accepts, 'br' or 'gzip', or None."""
+    accepted = _accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(content, encoding):
+    if encoding == "br":
+        return brotli.compress(content, quality=settings.API_COMPRESSION_BROTLI_QUALITY)
+    return compress_string(content)
+
+
+def _compress_stream(chunks, encoding):
+    if encoding == "gzip":
+        yield from compress_sequence(chunks)
+        return
+    compressor = brotli.Compressor(quality=settings.API_COMPRESSION_BROTLI_QUALITY)
+    for chunk in chunks:
+        # Flush each chunk, so streamed rows reach the client as they are produced
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware:
+    """Like django.middleware.gzip.GZipMiddleware, but with brotli and only for API_COMPRESSION_PATHS."""
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not request.path.startswith(tuple(settings.API_COMPRESSION_PATHS)):
+            return response
+        if response.has_header("Content-Encoding"):
+            return response
+        if not response.streaming and len(response.content) < settings.API_COMPRESSION_MIN_BYTES:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = choose_encoding(request.headers.get("Accept-Encoding", ""))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = _compress_stream(response.streaming_content, encoding)
+            del response["Content-Length"]
+        else:
+            with stage("compress"):
+                compressed = compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response["Content-Length"] = str(len(compressed))
+
+        # Compressing changes the representation, so a strong ETag would no longer match
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = encoding
+        return response
@@ -0,0 +1,116 @@
+"""
+Decides how a chat question becomes the standalone question used for retrieval.
+
+A remote LLM rephrasing call roughly doubles the latency of a follow-up, so it
+is only made when the question depends on the conversation and cannot be
+resolved locally:
+
+  first_turn      no history, the question is used as is
+  self_contained  names an IPC section, or names its own subject and has no
+                  follow-up words
+  local_rewrite   a follow-up about the section discussed in the last turn
+  llm             anything else (RAG_CONDENSE_STRATEGY='local' falls back to
+                  prefixing the previous question instead)
+"""
+import re
+import threading
+from collections import Counter
+
+from .instrumentation import register_collector
+
+PATHS = ("first_turn", "self_contained", "local_rewrite", "llm")
+
+SECTION_REFERENCE = re.compile(r'\b(?:section|sec\.?|s\.|u/s|ipc)\s*(\d+[a-z]?)\b', re.IGNORECASE)
+
+# Words that usually point back at something said earlier in the conversation.
+FOLLOW_UP_WORDS = {
+    "it", "its", "this", "that", "these", "those", "they", "them", "their",
+    "he", "she", "him", "her", "his", "same", "above", "previous", "former",
+    "latter", "also", "such", "else", "more", "another",
+}
+_WORDS = re.compile(r"[a-z']+")
+
+# Words that ask about a subject without naming it ("what is the punishment",
+# "which court tries it"). A question made only of these and stop words needs
+# the conversation to say what it is about.
+GENERIC_WORDS = {
+    "what", "what's", "whats", "which", "who", "whom", "how", "when", "where", "why",
+    "is", "are", "was", "were", "be", "been", "do", "does", "did", "can", "could",
+    "would", "should", "will", "shall", "may", "might", "must", "has", "have", "had",
+    "the", "a", "an", "of", "for", "to", "in", "on", "at", "by", "with", "under",
+    "from", "and", "or", "if", "not", "no", "so", "then", "i", "me", "my", "we",
+    "you", "your", "please", "tell", "explain", "give", "get", "show", "about",
+    "there", "any", "much", "many", "long", "mean", "means", "meaning",
+    "happen", "happens", "apply", "applies", "punishment", "punishable", "penalty",
+    "sentence", "jail", "imprisonment", "fine", "maximum", "minimum", "years",
+    "bail", "bailable", "nonbailable", "non", "court", "courts", "triable", "tried",
+    "jurisdiction", "offence", "offense", "section", "law", "legal", "charge", "case",
+}
+
+# A question this short rarely stands on its own ("and the fine?").
+MIN_SELF_CONTAINED_WORDS = 4
+
+CONDENSE_PROMPT = (
+    "Given the following conversation and a follow up question, rephrase the "
+    "follow up question to be a standalone question, in its original language.\n\n"
+    "Chat History:\n{chat_history}\nFollow Up Input: {question}\nStandalone question:"
+)
+
+_path_counts = Counter(dict.fromkeys(PATHS, 0))
+_counts_lock = threading.Lock()
+
+
+def format_chat_history(chat_history):
+    """Renders (question, answer) pairs the way the prompts expect them."""
+    return "".join(f"\nHuman: {question}\nAssistant: {answer}" for question, answer in chat_history)
+
+
+def choose_path(question, chat_history):
+    """Returns (path, standalone question or None if the LLM must condense it)."""
+    if not chat_history:
+        return "first_turn", question
+
+    if SECTION_REFERENCE.search(question):
+        return "self_contained", question
+    words = _WORDS.findall(question.lower())
+    names_subject = not GENERIC_WORDS.issuperset(words)
+    if names_subject and len(words) >= MIN_SELF_CONTAINED_WORDS and not FOLLOW_UP_WORDS.intersection(words):
+        return "self_contained", question
+
+    previous_question = chat_history[-1][0]
+    section = SECTION_REFERENCE.search(previous_question)
+    if section:
+        return "local_rewrite", f"{question} (IPC section {section.group(1).upper()})"
+    return "llm", None
+
+
+def condense_question(question, chat_history, strategy, llm):
+    """
+    Returns (path, standalone question). `strategy` is 'auto' (use the LLM
+    only when needed), 'llm' (always, when there is history) or 'local'
+    (never call the LLM).
+    """
+    if strategy == "llm" and chat_history:
+        path, standalone = "llm", None
+    else:
+        path, standalone = choose_path(question, chat_history)
+
+    if standalone is None:
+        if strategy == "local":
+            path, standalone = "local_rewrite", f"{chat_history[-1][0]} {question}"
+        else:
+            prompt = CONDENSE_PROMPT.format(chat_history=format_chat_history(chat_history), question=question)
+            standalone = llm.invoke(prompt).content.strip() or question
+
+    with _counts_lock:
+        _path_counts[path] += 1
+    return path, standalone
+
+
+@register_collector
+def _path_metrics():
+    name = "legalsift_condense_path_total"
+    lines = [f"# HELP {name} How chat questions were turned into standalone questions.", f"# TYPE {name} counter"]
+    with _counts_lock:
+        lines += [f'{name}{{path="{path}"}} {count}' for path, count in _path_counts.items()]
+    return lines
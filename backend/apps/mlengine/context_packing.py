@@ -0,0 +1,135 @@
+"""
+Fits the retrieved chunks and the chat history into a token budget.
+
+rag_generate splits the corpus with a 200-character overlap, so neighbouring
+chunks of the same document often come back together and repeat each other.
+pack_context drops duplicates, stitches overlapping chunks of the same source
+back into one passage, and then keeps passages in relevance order until
+RAG_CONTEXT_TOKEN_BUDGET is spent. pack_history keeps the most recent turns
+that fit RAG_HISTORY_TOKEN_BUDGET.
+"""
+import json
+import threading
+
+from .instrumentation import Histogram
+
+TOKEN_ENCODING = "cl100k_base"
+
+# The splitter's chunk_overlap is 200; matches shorter than this are coincidence.
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 400
+
+prompt_tokens = Histogram(
+    "legalsift_prompt_tokens", "Tokens in each part of the RAG answer prompt.", "part",
+    buckets=(64, 128, 256, 512, 768, 1024, 1536, 2048, 3072, 4096, 8192),
+)
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """The tiktoken encoding, or False if tiktoken (or its data file) is unavailable."""
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+            except Exception as e:
+                print(f"⚠️ tiktoken unavailable, estimating token counts: {e}")
+                _encoding = False
+    return _encoding
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    # About four characters per token for English text
+    return (len(text) + 3) // 4
+
+
+def truncate_tokens(text, max_tokens):
+    encoding = _get_encoding()
+    if encoding:
+        return encoding.decode(encoding.encode(text)[:max_tokens])
+    return text[:max_tokens * 4]
+
+
+def _source_key(doc):
+    return json.dumps(doc.metadata, sort_keys=True, default=str)
+
+
+def _overlap(first, second):
+    """Length of the longest suffix of `first` that is a prefix of `second`."""
+    for size in range(min(len(first), len(second), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return size
+    return 0
+
+
+def _merge(passages):
+    """
+    Merges passages of the same source that contain or overlap each other.
+    Each passage is [rank, source key, metadata, text]; a merged passage keeps
+    the better (lower) rank.
+    """
+    merged = True
+    while merged:
+        merged = False
+        for i, first in enumerate(passages):
+            for j, second in enumerate(passages):
+                if i == j or first[1] != second[1]:
+                    continue
+                if second[3] in first[3]:
+                    text = first[3]
+                else:
+                    size = _overlap(first[3], second[3])
+                    if not size:
+                        continue
+                    text = first[3] + second[3][size:]
+                first[0] = min(first[0], second[0])
+                first[3] = text
+                del passages[j]
+                merged = True
+                break
+            if merged:
+                break
+    return passages
+
+
+def pack_context(documents, token_budget):
+    """
+    Returns (passages, token count): the deduplicated, merged chunks that
+    fit the budget as (metadata, text) pairs, most relevant first.
+    """
+    passages = _merge([
+        [rank, _source_key(doc), doc.metadata, doc.page_content.strip()]
+        for rank, doc in enumerate(documents)
+    ])
+    passages.sort(key=lambda passage: passage[0])
+
+    packed, used = [], 0
+    for _, _, metadata, text in passages:
+        tokens = count_tokens(text)
+        if used + tokens > token_budget:
+            if packed:
+                continue
+            # Always give the LLM the most relevant passage, cut to the budget
+            text, tokens = truncate_tokens(text, token_budget), token_budget
+        packed.append((metadata, text))
+        used += tokens
+    return packed, used
+
+
+def pack_history(chat_history, token_budget, format_history):
+    """Returns (recent turns that fit the budget, token count of the formatted turns)."""
+    kept, used = [], 0
+    for turn in reversed(chat_history):
+        tokens = count_tokens(format_history([turn]))
+        if used + tokens > token_budget:
+            break
+        kept.insert(0, turn)
+        used += tokens
+    return kept, used
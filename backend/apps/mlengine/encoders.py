@@ -0,0 +1,107 @@
+import threading
+
+from django.conf import settings
+
+from .paths import ONNX_ENCODER_DIR
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+MAX_SEQ_LENGTH = 256  # all-MiniLM-L6-v2's max_seq_length
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_INT8_MODEL_FILE = "model.int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+
+class SentenceTransformerEncoder:
+    """The original PyTorch encoder."""
+    backend = "sentence_transformers"
+
+    def __init__(self, model_name=MODEL_NAME):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts):
+        """Encodes a list of texts into a (n, dim) float32 array."""
+        return self.model.encode(list(texts), convert_to_numpy=True).astype('float32')
+
+
+class OnnxEncoder:
+    """
+    The same MiniLM model exported to ONNX and run with onnxruntime and a fast
+    tokenizer. It reproduces SentenceTransformer's mean pooling and L2
+    normalization, so its vectors are compatible with the existing FAISS indexes.
+    """
+    def __init__(self, model_dir=ONNX_ENCODER_DIR, quantized=False):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.backend = "onnx_int8" if quantized else "onnx"
+        self.tokenizer = Tokenizer.from_file(str(model_dir / TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        model_file = ONNX_INT8_MODEL_FILE if quantized else ONNX_MODEL_FILE
+        self.session = ort.InferenceSession(
+            str(model_dir / model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def encode(self, texts):
+        """Encodes a list of texts into a (n, dim) float32 array."""
+        import numpy as np
+
+        encodings = self.tokenizer.encode_batch(list(texts))
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        token_embeddings = self.session.run(
+            None, {name: value for name, value in feeds.items() if name in self.input_names}
+        )[0]
+
+        # Mean pooling over real tokens, then L2 normalization
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return (pooled / norms).astype(np.float32)
+
+
+# --- LAZY LOADING SETUP ---
+# One encoder per process, chosen by settings.ML_ENCODER_BACKEND.
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def build_encoder(backend):
+    if backend == "sentence_transformers":
+        return SentenceTransformerEncoder()
+    if backend == "onnx":
+        return OnnxEncoder()
+    if backend == "onnx_int8":
+        return OnnxEncoder(quantized=True)
+    raise ValueError(f"Unknown ML_ENCODER_BACKEND: {backend!r}")
+
+
+def get_encoder():
+    """Returns the shared query encoder, loading it on first use."""
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            _encoder = build_encoder(settings.ML_ENCODER_BACKEND)
+    return _encoder
+
+
+def min_cosine_similarity(reference, candidate, texts):
+    """Smallest cosine similarity between two encoders' vectors for the same texts."""
+    import numpy as np
+
+    a = reference.encode(texts)
+    b = candidate.encode(texts)
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return float((a * b).sum(axis=1).min())
@@ -0,0 +1,202 @@
+"""
+Per-stage timing for ML requests.
+
+`stage(name)` times a block of code. Every timing is added to an in-process
+Prometheus histogram (served by the /metrics view) and to the timings of the
+current request, which ServerTimingMiddleware returns as a Server-Timing
+header. Metrics are per process; with several workers, scrape each of them.
+
+ServerTimingMiddleware can also run a sampling profiler for a single request
+(see ML_PROFILER_ENABLED).
+"""
+import hmac
+import contextvars
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+# Upper bounds (seconds) of the histogram buckets; ML stages range from
+# sub-millisecond FAISS searches to multi-second LLM calls.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+# Every Histogram created, in the order /metrics lists them.
+_histograms = []
+
+
+class Histogram:
+    """A thread-safe Prometheus histogram with one label, listed on /metrics."""
+    def __init__(self, name, help_text, label, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = defaultdict(lambda: {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+        _histograms.append(self)
+
+    def observe(self, label_value, value):
+        with self._lock:
+            series = self._series[label_value]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_value, series in sorted(self._series.items()):
+                label = f'{self.label}="{label_value}"'
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series["count"]}')
+                lines.append(f'{self.name}_sum{{{label}}} {series["sum"]}')
+                lines.append(f'{self.name}_count{{{label}}} {series["count"]}')
+        return lines
+
+
+stage_seconds = Histogram("legalsift_stage_seconds", "Time spent in each ML pipeline stage.", "stage")
+request_seconds = Histogram("legalsift_request_seconds", "Time spent handling each API view.", "view")
+
+# Timings of the request being handled, as [(stage, seconds)]; None outside a request.
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+# Extra metric sources (e.g. the micro-batcher), each returning Prometheus text lines.
+_collectors = []
+
+
+def register_collector(collect):
+    """Adds a function returning extra Prometheus text lines to /metrics."""
+    _collectors.append(collect)
+    return collect
+
+
+def record_stage(name, seconds):
+    """Records one timing of pipeline stage `name`."""
+    stage_seconds.observe(name, seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextmanager
+def stage(name):
+    """Times the enclosed block as pipeline stage `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for histogram in _histograms:
+        lines.extend(histogram.render())
+    for collect in _collectors:
+        lines.extend(collect())
+    return "\n".join(lines) + "\n"
+
+
+def server_timing_header(timings, total):
+    """Formats stage timings (summed per stage) as a Server-Timing header value."""
+    durations = defaultdict(float)
+    for name, seconds in timings:
+        durations[name] += seconds
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in durations.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread every `interval` seconds from a
+    background thread, and writes the counts as collapsed stacks (the input
+    format of flamegraph.pl and speedscope).
+    """
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                stack = traceback.extract_stack(frame)
+                self.samples[";".join(f"{entry.name} ({entry.filename}:{entry.lineno})" for entry in stack)] += 1
+
+    def write(self, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in self.samples.most_common()))
+
+
+def _wants_profile(request):
+    """Whether the request asked to be profiled with the shared ML_PROFILER_TOKEN."""
+    if not settings.ML_PROFILER_ENABLED or not settings.ML_PROFILER_TOKEN:
+        return False
+    return hmac.compare_digest(request.headers.get("X-Profile", ""), settings.ML_PROFILER_TOKEN)
+
+
+def _prune_profiles(profile_dir, keep):
+    """Deletes all but the `keep` newest profiles."""
+    profiles = sorted(profile_dir.glob("*.folded"), key=lambda path: path.stat().st_mtime, reverse=True)
+    for path in profiles[keep:]:
+        path.unlink(missing_ok=True)
+
+
+class ServerTimingMiddleware:
+    """
+    Collects the stage timings of each request into a Server-Timing header and
+    the request duration histogram. With ML_PROFILER_ENABLED, a request sent
+    with an `X-Profile: <ML_PROFILER_TOKEN>` header is also profiled into
+    ML_PROFILE_DIR, which keeps the ML_PROFILE_MAX_FILES newest profiles.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = []
+        token = _request_timings.set(timings)
+        profiler = None
+        if _wants_profile(request):
+            profiler = SamplingProfiler(threading.get_ident(), settings.ML_PROFILER_INTERVAL_MS / 1000)
+            profiler.start()
+
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            total = time.perf_counter() - start
+            _request_timings.reset(token)
+            if profiler is not None:
+                profiler.stop()
+
+        match = request.resolver_match
+        request_seconds.observe(match.view_name if match else "unresolved", total)
+        response["Server-Timing"] = server_timing_header(timings, total)
+
+        if profiler is not None:
+            file_name = f"{datetime.now(timezone.utc):%Y%m%d-%H%M%S-%f}.folded"
+            profiler.write(settings.ML_PROFILE_DIR / file_name)
+            _prune_profiles(settings.ML_PROFILE_DIR, settings.ML_PROFILE_MAX_FILES)
+            response["X-Profile-File"] = file_name
+        return response
@@ -0,0 +1,13 @@
+from langchain_core.embeddings import Embeddings
+
+
+class EncoderEmbeddings(Embeddings):
+    """Exposes the shared encoders.get_encoder() backend to LangChain."""
+    def __init__(self, encoder):
+        self.encoder = encoder
+
+    def embed_documents(self, texts):
+        return self.encoder.encode(texts).tolist()
+
+    def embed_query(self, text):
+        return self.encoder.encode([text])[0].tolist()
@@ -0,0 +1,55 @@
+from typing import Any
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from .chunk_store import ChunkIndex
+from .instrumentation import stage
+
+
+class CachedFAISSRetriever(BaseRetriever):
+    """
+    A k-nearest-neighbour retriever over a chunk-store release (ChunkIndex)
+    or a LangChain FAISS store, that looks queries up in a RetrievalCache (if
+    given) before encoding and searching.
+    """
+    vectordb: Any
+    embeddings: Any
+    cache: Any = None
+    version: str
+    k: int = 5
+
+    def _search(self, embedding):
+        """Doc ids of the k nearest chunks: index positions for a ChunkIndex, docstore ids otherwise."""
+        chunk_index = isinstance(self.vectordb, ChunkIndex)
+        normalize = self.vectordb.normalize_L2 if chunk_index else self.vectordb._normalize_L2
+        vector = np.asarray([embedding], dtype="float32")
+        if normalize:
+            vector /= np.linalg.norm(vector, axis=1, keepdims=True)
+        _, indices = self.vectordb.index.search(vector, self.k)
+        positions = [int(i) for i in indices[0] if i != -1]
+        if chunk_index:
+            return positions
+        return [self.vectordb.index_to_docstore_id[i] for i in positions]
+
+    def _documents(self, doc_ids):
+        if isinstance(self.vectordb, ChunkIndex):
+            with stage("chunk_fetch"):
+                chunks = self.vectordb.chunks.get(doc_ids)
+            return [Document(page_content=page_content, metadata=metadata) for page_content, metadata in chunks]
+        return [self.vectordb.docstore.search(doc_id) for doc_id in doc_ids]
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        doc_ids = None if self.cache is None else self.cache.get(self.version, query)
+        if doc_ids is None:
+            with stage("encode"):
+                embedding = self.embeddings.embed_query(query)
+            if self.cache is not None:
+                doc_ids = self.cache.get_similar(self.version, embedding)
+            if doc_ids is None:
+                with stage("faiss_search"):
+                    doc_ids = self._search(embedding)
+                if self.cache is not None:
+                    self.cache.put(self.version, query, doc_ids, embedding)
+        return self._documents(doc_ids)
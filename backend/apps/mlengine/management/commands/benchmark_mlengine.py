@@ -0,0 +1,64 @@
+import json
+import subprocess
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.mlengine.benchmarks import benchmark_analyzer, benchmark_rag, benchmark_serialization, peak_rss_mb
+from apps.mlengine.paths import BACKEND_DIR
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks latency, throughput and quality of the complaint analyzer and the RAG retriever, and API response serialization, and writes the results as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suite', choices=['all', 'analyzer', 'rag', 'serialization'], default='all')
+        parser.add_argument('--samples', type=int, default=500, help='Number of synthetic complaints to replay (0 for all).')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8], help='Concurrency levels to measure.')
+        parser.add_argument('--k', type=int, default=5, help='k for the retriever recall@k.')
+        parser.add_argument('--history-size', type=int, default=200, help='Complaints in the history payload of the serialization benchmark.')
+        parser.add_argument('--output', help='File to write the JSON report to (stdout if omitted).')
+
+    def handle(self, *args, **options):
+        report = {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git_commit': _git_commit(),
+            'settings': {
+                'ML_BATCHING_ENABLED': settings.ML_BATCHING_ENABLED,
+                'ML_BATCH_MAX_SIZE': settings.ML_BATCH_MAX_SIZE,
+                'ML_BATCH_MAX_LATENCY_MS': settings.ML_BATCH_MAX_LATENCY_MS,
+                'ML_ENCODER_BACKEND': settings.ML_ENCODER_BACKEND,
+            },
+        }
+
+        try:
+            if options['suite'] in ('all', 'analyzer'):
+                self.stderr.write('⏱️  Benchmarking the complaint analyzer...')
+                report['analyzer'] = benchmark_analyzer(options['samples'], options['concurrency'])
+            if options['suite'] in ('all', 'rag'):
+                self.stderr.write('⏱️  Benchmarking the RAG retriever...')
+                report['rag'] = benchmark_rag(options['concurrency'], k=options['k'])
+            if options['suite'] in ('all', 'serialization'):
+                self.stderr.write('⏱️  Benchmarking API response serialization...')
+                report['serialization'] = benchmark_serialization(options['history_size'])
+        except (ImportError, RuntimeError) as e:
+            raise CommandError(f"Benchmark failed: {e}")
+        report['peak_rss_mb'] = peak_rss_mb()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"✅ Benchmark report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,29 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from apps.mlengine.artifact_build import build_stages, create_release
+from apps.mlengine.artifact_registry import complaint_registry
+
+
+class Command(BaseCommand):
+    help = 'Builds the complaint analysis models and FAISS index into a versioned release directory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=3, help='Number of stages to run in parallel.')
+        parser.add_argument('--force', action='store_true', help='Ignore cached stage outputs and rebuild everything.')
+        parser.add_argument('--activate', action='store_true', help='Make the new release the one workers serve.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('🏗️  Building ML artifacts...'))
+        stage_outputs = build_stages(max_workers=options['jobs'], force=options['force'], log=self.stdout.write)
+
+        version = create_release(stage_outputs)
+        manifest = complaint_registry.manifest(version)
+        self.stdout.write(self.style.SUCCESS(f"📦 Release {version} written to {complaint_registry.path(version)}"))
+        for stage, metrics in manifest['metrics'].items():
+            self.stdout.write(f"   - {stage}: {json.dumps(metrics)}")
+
+        if options['activate']:
+            complaint_registry.activate(version)
+            self.stdout.write(self.style.SUCCESS(f"✅ Activated release {version}"))
@@ -0,0 +1,44 @@
+import shutil
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.mlengine.artifact_registry import ArtifactError, rag_registry
+from apps.mlengine.chunk_store import is_chunk_store, write_from_langchain
+
+
+class Command(BaseCommand):
+    help = 'Converts a pickled LangChain RAG index release into a chunk-store release, published as a new version.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--version', dest='source_version', help='Release to convert (default: the active one, or the legacy EMBED_DIR index).')
+        parser.add_argument('--activate', action='store_true', help='Activate the converted release.')
+
+    def handle(self, *args, **options):
+        from langchain_community.vectorstores import FAISS
+
+        source_version = options['source_version'] or rag_registry.current_version()
+        source_dir = rag_registry.path(source_version)
+        try:
+            rag_registry.verify(source_version)
+        except ArtifactError as e:
+            raise CommandError(str(e))
+        if is_chunk_store(source_dir):
+            raise CommandError(f"RAG release {source_version} already uses the chunk store")
+        if not (source_dir / 'index.pkl').exists():
+            raise CommandError(f"No pickled LangChain index found in {source_dir}")
+
+        self.stdout.write(f'📦 Converting RAG release {source_version}...')
+        # Only the stored vectors and documents are needed, not the embedding model
+        vectordb = FAISS.load_local(str(source_dir), embeddings=None, allow_dangerous_deserialization=True)
+        release_dir = rag_registry.new_release_dir()
+        try:
+            count = write_from_langchain(release_dir, vectordb)
+            version = rag_registry.publish(release_dir, chunks=count, converted_from=source_version)
+        except Exception:
+            shutil.rmtree(release_dir, ignore_errors=True)
+            raise
+        self.stdout.write(self.style.SUCCESS(f'✅ Wrote {count} chunks as RAG release {version}'))
+
+        if options['activate']:
+            rag_registry.activate(version)
+            self.stdout.write(self.style.SUCCESS(f'✅ Activated RAG release {version}'))
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+
+from apps.mlengine.encoders import (
+    MODEL_NAME, ONNX_INT8_MODEL_FILE, ONNX_MODEL_FILE,
+    OnnxEncoder, SentenceTransformerEncoder, min_cosine_similarity,
+)
+from apps.mlengine.paths import ONNX_ENCODER_DIR
+
+SAMPLE_TEXTS = [
+    "someone snatched my gold chain while i was walking near the market",
+    "i was tricked into installing a fake payment app and lost money from my bank account",
+    "my neighbour keeps sending me threatening messages and follows me home",
+    "punishment for murder",
+]
+
+
+class Command(BaseCommand):
+    help = 'Exports the MiniLM query encoder to ONNX (optionally int8-quantized) for the onnxruntime backend.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quantize', action='store_true', help='Also write a dynamically int8-quantized model.')
+
+    def handle(self, *args, **options):
+        # Export-time only dependencies; serving needs just onnxruntime and tokenizers.
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        ONNX_ENCODER_DIR.mkdir(parents=True, exist_ok=True)
+
+        self.stdout.write(self.style.SUCCESS(f'Exporting {MODEL_NAME} to {ONNX_ENCODER_DIR}...'))
+        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+        tokenizer.save_pretrained(ONNX_ENCODER_DIR)  # writes the fast tokenizer.json
+
+        class TokenEmbeddings(torch.nn.Module):
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, input_ids, attention_mask, token_type_ids):
+                return self.model(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids)[0]
+
+        model = TokenEmbeddings(AutoModel.from_pretrained(MODEL_NAME)).eval()
+        sample = tokenizer(SAMPLE_TEXTS, padding=True, return_tensors='pt')
+        input_names = ['input_ids', 'attention_mask', 'token_type_ids']
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            str(ONNX_ENCODER_DIR / ONNX_MODEL_FILE),
+            input_names=input_names,
+            output_names=['token_embeddings'],
+            dynamic_axes={name: {0: 'batch', 1: 'sequence'} for name in input_names + ['token_embeddings']},
+            opset_version=17,
+        )
+
+        if options['quantize']:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(
+                str(ONNX_ENCODER_DIR / ONNX_MODEL_FILE),
+                str(ONNX_ENCODER_DIR / ONNX_INT8_MODEL_FILE),
+                weight_type=QuantType.QInt8,
+            )
+
+        # Check the exported models against the PyTorch encoder
+        reference = SentenceTransformerEncoder()
+        candidates = [OnnxEncoder()] + ([OnnxEncoder(quantized=True)] if options['quantize'] else [])
+        for candidate in candidates:
+            similarity = min_cosine_similarity(reference, candidate, SAMPLE_TEXTS)
+            self.stdout.write(self.style.SUCCESS(f'{candidate.backend}: min cosine similarity {similarity:.5f}'))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.mlengine.artifact_registry import ArtifactError, complaint_registry, rag_registry
+
+REGISTRIES = {
+    'complaint': complaint_registry,
+    'rag': rag_registry,
+}
+
+
+class Command(BaseCommand):
+    help = 'Lists, activates or rolls back versioned ML artifact releases. Workers pick up the change without a restart.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=REGISTRIES, default='complaint', help='Which artifact registry to manage.')
+        subparsers = parser.add_subparsers(dest='action', required=True)
+        subparsers.add_parser('list', help='List releases and show the active one.')
+        activate = subparsers.add_parser('activate', help='Verify a release and make it active.')
+        activate.add_argument('version')
+        rollback = subparsers.add_parser('rollback', help='Re-activate the previously active release.')
+        rollback.add_argument('--to', dest='to_version', help='Roll back to this version instead.')
+
+    def handle(self, *args, **options):
+        registry = REGISTRIES[options['kind']]
+        try:
+            if options['action'] == 'list':
+                current = registry.current_version()
+                for version in registry.versions():
+                    marker = '*' if version == current else ' '
+                    metrics = registry.manifest(version).get('metrics', {})
+                    self.stdout.write(f"{marker} {version} {metrics or ''}")
+                self.stdout.write(self.style.SUCCESS(f"Active {registry.name} release: {current}"))
+
+            elif options['action'] == 'activate':
+                registry.activate(options['version'])
+                self.stdout.write(self.style.SUCCESS(f"✅ Activated {registry.name} release {options['version']}"))
+
+            elif options['action'] == 'rollback':
+                version = registry.rollback(options['to_version'])
+                self.stdout.write(self.style.SUCCESS(f"⏪ Rolled {registry.name} back to release {version}"))
+        except ArtifactError as e:
+            raise CommandError(str(e))
@@ -10,3 +10,7 @@ EMBED_DIR   = RAG_DIR / "embeddings"
 
 # Ensure embeddings folder exists
 EMBED_DIR.mkdir(parents=True, exist_ok=True)
+
+# Serving model artifacts
+MODELS_DIR       = Path(__file__).resolve().parent / "saved_models"
+ONNX_ENCODER_DIR = MODELS_DIR / "onnx_encoder"
@@ -1,32 +1,108 @@
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_openai import ChatOpenAI
-from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
-from langchain.prompts import PromptTemplate
-from .paths import EMBED_DIR
+import threading
+from django.conf import settings
+from .artifact_registry import HotReloader, rag_registry
+from .encoders import MODEL_NAME, get_encoder
+from .condense import condense_question, format_chat_history
+from .context_packing import count_tokens, pack_context, pack_history, prompt_tokens
+from .instrumentation import register_collector, stage
+from .retrieval_cache import RetrievalCache
+from .section_lookup import answer_section_lookup
+
+# langchain, FAISS and the embedding models are imported inside the functions
+# below, so importing this module (e.g. from the URLconf) stays cheap.
+
+
+def _load_embedding_model():
+    """Uses HuggingFaceEmbeddings for the PyTorch backend, the shared encoder otherwise."""
+    if settings.ML_ENCODER_BACKEND == "sentence_transformers":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=MODEL_NAME)
+
+    from .lc_embeddings import EncoderEmbeddings
+    return EncoderEmbeddings(get_encoder())
 
 # --- LAZY LOADING SETUP ---
 # We will load the models only when they are first needed.
 rag_components = {
     "llm": None,
-    "retriever": None,
+    "embedding_model": None,
     "memory": None
 }
 
+def _load_vectordb(index_dir):
+    """
+    Loads the vector database of one RAG index release: a ChunkIndex, or for
+    releases not yet converted with `manage.py convert_rag_index`, the
+    pickled LangChain FAISS store.
+    """
+    from .chunk_store import ChunkIndex, is_chunk_store
+
+    if is_chunk_store(index_dir):
+        return ChunkIndex.load(index_dir)
+
+    from langchain_community.vectorstores import FAISS
+
+    print(f"⚠️ {index_dir} keeps every chunk in memory; convert it with `manage.py convert_rag_index`.")
+    return FAISS.load_local(
+        str(index_dir),
+        embeddings=rag_components["embedding_model"],
+        allow_dangerous_deserialization=True,
+    )
+
+# The active index release is hot-swapped when `manage.py ml_artifacts --kind rag` changes it.
+vectordb_reloader = HotReloader(rag_registry, _load_vectordb)
+
+# Retrieved doc ids per normalized question, emptied whenever the index version changes.
+retrieval_cache = RetrievalCache(
+    max_entries=settings.RAG_RETRIEVAL_CACHE_SIZE,
+    epsilon=settings.RAG_RETRIEVAL_CACHE_EPSILON,
+)
+
+_route_counts = {"section_lookup": 0, "rag": 0}
+_route_counts_lock = threading.Lock()
+
+def _count_route(route):
+    with _route_counts_lock:
+        _route_counts[route] += 1
+
+@register_collector
+def _route_metrics():
+    name = "legalsift_chat_route_total"
+    lines = [f"# HELP {name} Chat questions by how they were answered.", f"# TYPE {name} counter"]
+    lines += [f'{name}{{route="{route}"}} {count}' for route, count in _route_counts.items()]
+    return lines
+
+@register_collector
+def _retrieval_cache_metrics():
+    name = "legalsift_retrieval_cache_lookups_total"
+    lines = [f"# HELP {name} RAG retrieval cache lookups by result.", f"# TYPE {name} counter"]
+    lines += [f'{name}{{result="{result}"}} {count}' for result, count in retrieval_cache.hits.items()]
+    return lines
+
+def get_retriever():
+    """Returns (index version, retriever) for the active index release."""
+    index_version, vectordb = vectordb_reloader.get()
+
+    from .lc_retriever import CachedFAISSRetriever
+    return index_version, CachedFAISSRetriever(
+        vectordb=vectordb,
+        embeddings=rag_components["embedding_model"],
+        cache=retrieval_cache if settings.RAG_RETRIEVAL_CACHE_SIZE else None,
+        version=index_version,
+        k=5,
+    )
+
 def _initialize_rag():
     """Loads and initializes all RAG components."""
     global rag_components
+    from langchain_openai import ChatOpenAI
+    from langchain.memory import ConversationBufferMemory
+
     print("🧠 Initializing RAG Chatbot Engine for the first time...")
     
     # 1. Load the Embedding Model and Vector Database
-    embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    vectordb = FAISS.load_local(
-        str(EMBED_DIR),
-        embeddings=embedding_model,
-        allow_dangerous_deserialization=True,
-    )
-    rag_components["retriever"] = vectordb.as_retriever(search_kwargs={"k": 5})
+    rag_components["embedding_model"] = _load_embedding_model()
+    vectordb_reloader.get()
 
     # 2. Initialize the Language Model (LLM)
     rag_components["llm"] = ChatOpenAI(
@@ -49,19 +125,23 @@ def ask_with_memory(query: str, chat_history: list = []):
     """
     Answers a query using the RAG model, considering the chat history.
     """
+    # Direct section lookups are answered from the database, without an LLM call
+    if settings.RAG_SECTION_LOOKUP_ENABLED:
+        with stage("section_lookup"):
+            lookup = answer_section_lookup(query)
+        if lookup is not None:
+            _count_route("section_lookup")
+            return {**lookup, "model_version": None, "route": "section_lookup"}
+    _count_route("rag")
+
+    from langchain.prompts import PromptTemplate
+
     # Initialize the RAG components if they haven't been already
     if not rag_components["llm"]:
-        _initialize_rag()
-
-    # Create a new memory instance for each request, seeded with the provided history
-    memory = ConversationBufferMemory(
-        memory_key="chat_history",
-        return_messages=True,
-        output_key='answer'
-    )
-    for user_msg, ai_msg in chat_history:
-        memory.chat_memory.add_user_message(user_msg)
-        memory.chat_memory.add_ai_message(ai_msg)
+        with stage("rag_init"):
+            _initialize_rag()
+    with stage("model_load"):
+        index_version, retriever = get_retriever()
 
     # Define the improved prompt for the LLM
     prompt = PromptTemplate.from_template(
@@ -83,22 +163,44 @@ def ask_with_memory(query: str, chat_history: list = []):
         """
     )
     
-    # Create the conversational chain
-    qa_chain = ConversationalRetrievalChain.from_llm(
-        llm=rag_components["llm"],
-        retriever=rag_components["retriever"],
-        memory=memory,
-        return_source_documents=True,
-        combine_docs_chain_kwargs={"prompt": prompt}
+    # Only the most recent turns that fit the history budget are sent to the LLM
+    chat_history, history_tokens = pack_history(
+        chat_history, settings.RAG_HISTORY_TOKEN_BUDGET, format_chat_history
     )
 
-    # Get the answer
-    result = qa_chain({"question": query})
+    # 1. Turn a follow-up into a standalone question, calling the LLM only when needed
+    with stage("condense"):
+        _, standalone_question = condense_question(
+            query, chat_history, settings.RAG_CONDENSE_STRATEGY, rag_components["llm"]
+        )
+
+    # 2. Retrieve the relevant chunks
+    with stage("retrieve"):
+        source_documents = retriever.invoke(standalone_question)
+
+    # 3. Deduplicate and merge the chunks, and trim them to the context budget
+    with stage("pack_context"):
+        passages, context_tokens = pack_context(source_documents, settings.RAG_CONTEXT_TOKEN_BUDGET)
+        final_prompt = prompt.format(
+            context="\n\n".join(text for _, text in passages),
+            chat_history=format_chat_history(chat_history),
+            question=standalone_question,
+        )
+        prompt_size = {"context": context_tokens, "history": history_tokens, "total": count_tokens(final_prompt)}
+    for part, tokens in prompt_size.items():
+        prompt_tokens.observe(part, tokens)
+
+    # 4. Get the answer
+    with stage("llm"):
+        answer = rag_components["llm"].invoke(final_prompt).content
     
     # Format the response
     response = {
-        "answer": result["answer"],
-        "source_documents": [doc.metadata for doc in result["source_documents"]]
+        "answer": answer,
+        "source_documents": [metadata for metadata, _ in passages],
+        "model_version": index_version,
+        "prompt_tokens": prompt_size,
+        "route": "rag"
     }
     
     return response
\ No newline at end of file
@@ -4,7 +4,9 @@ from langchain_community.document_loaders import PyPDFLoader, DataFrameLoader, T
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
 from langchain_community.embeddings import HuggingFaceEmbeddings
-from .paths import CORPUS_DIR, EMBED_DIR
+from .artifact_registry import rag_registry
+from .chunk_store import write_from_langchain
+from .paths import CORPUS_DIR
 
 # ==============================================================================
 # PART 1: LOAD DATA FROM ALL SOURCES IN THE CORPUS DIRECTORY
@@ -36,6 +38,16 @@ for filename in os.listdir(CORPUS_DIR):
             all_docs.extend(docs)
             print(f"     - Loaded {len(docs)} documents.")
 
+        elif filename.endswith('.txt'):
+            print(f"  📄 Loading text: {filename}")
+            loader = TextLoader(file_path, encoding="utf-8")
+            docs = loader.load()
+            all_docs.extend(docs)
+            print(f"     - Loaded {len(docs)} documents.")
+
+        else:
+            print(f"  - Skipping {filename}: only {', '.join(supported_files)} files are loaded.")
+
     except Exception as e:
         print(f"  - ❌ Error loading {filename}: {e}")
 
@@ -60,5 +72,12 @@ embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-
 # --- Build and Save FAISS Index ---
 print("🧠 Building new, combined FAISS index...")
 vectordb = FAISS.from_documents(chunks, embeddings)
-vectordb.save_local(str(EMBED_DIR))
-print(f"✅✅✅ Perfect RAG knowledge base saved to {EMBED_DIR}")
+
+# --- Publish as a new release and activate it ---
+# Running workers pick the new index up without a restart.
+# Chunk text goes to an on-disk store, so workers only load the vectors.
+release_dir = rag_registry.new_release_dir()
+write_from_langchain(release_dir, vectordb)
+version = rag_registry.publish(release_dir, chunks=len(chunks))
+rag_registry.activate(version)
+print(f"✅✅✅ Perfect RAG knowledge base saved as release {version} in {rag_registry.releases_dir}")
@@ -0,0 +1,32 @@
+"""
+O(1) lookups in the related-sections graph precomputed by the artifact build.
+
+The graph is a small JSON file in the complaint analysis release, loaded on
+its own so the IPC explorer does not have to load the analysis models.
+Releases built before the graph existed have no related sections.
+"""
+import json
+
+from .artifact_registry import HotReloader, complaint_registry
+
+RELATED_SECTIONS_FILE = "related_sections.json"
+
+
+def load_related_sections(model_dir):
+    """{section number: [{"section_number", "title", "similarity"}]} of one release."""
+    try:
+        return json.loads((model_dir / RELATED_SECTIONS_FILE).read_text())
+    except FileNotFoundError:
+        return {}
+
+
+graph_reloader = HotReloader(complaint_registry, load_related_sections)
+
+
+def get_related_sections(section_number):
+    try:
+        _, graph = graph_reloader.get()
+    except Exception as e:
+        print(f"❌ Error loading the related sections graph: {e}")
+        return []
+    return graph.get(str(section_number), [])
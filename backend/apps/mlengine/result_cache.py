@@ -0,0 +1,102 @@
+"""
+Content-addressed cache of complaint analysis results.
+
+Results are keyed by sha256 of the case- and whitespace-folded complaint and
+the model release version, so resubmitting the same complaint is answered
+without running the models, and a new release never serves stale results.
+The key does not use clean_text, which drops all non-ASCII text and would
+give every Hindi complaint the same key. The in-process LRU can be backed by
+a shared Django cache (ML_RESULT_CACHE_ALIAS) so all workers benefit.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .instrumentation import register_collector
+from .text_normalization import fold_text
+
+
+def result_key(complaint_text, model_version):
+    """The cache key of a complaint, or None if it has no text to key on."""
+    if not isinstance(complaint_text, str):
+        return None
+    folded = fold_text(complaint_text)
+    if not folded:
+        return None
+    digest = hashlib.sha256(f"{model_version}\0{folded}".encode()).hexdigest()
+    return f"analysis:{digest}"
+
+
+class ResultCache:
+    def __init__(self, max_entries, cache_alias=None, ttl=None):
+        self.max_entries = max_entries
+        self.cache_alias = cache_alias
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.lookups = {"memory": 0, "shared": 0, "miss": 0}
+
+    def _count(self, result):
+        with self._lock:
+            self.lookups[result] += 1
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """Returns a copy of the cached result, or None (always for a None key)."""
+        if key is None:
+            self._count("miss")
+            return None
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.lookups["memory"] += 1
+                # Callers may pop keys (e.g. the embedding) from what they get
+                return dict(result)
+
+        if self.cache_alias:
+            result = caches[self.cache_alias].get(key)
+            if result is not None:
+                self._count("shared")
+                self._remember(key, result)
+                return dict(result)
+
+        self._count("miss")
+        return None
+
+    def clear(self):
+        """Empties the in-process tier (the shared tier expires on its own)."""
+        with self._lock:
+            self._entries.clear()
+
+    def put(self, key, result):
+        if key is None:
+            return
+        result = dict(result)
+        self._remember(key, result)
+        if self.cache_alias:
+            caches[self.cache_alias].set(key, result, self.ttl)
+
+
+result_cache = ResultCache(
+    max_entries=settings.ML_RESULT_CACHE_SIZE,
+    cache_alias=settings.ML_RESULT_CACHE_ALIAS or None,
+    ttl=settings.ML_RESULT_CACHE_TTL,
+)
+
+
+@register_collector
+def _result_cache_metrics():
+    name = "legalsift_analysis_cache_lookups_total"
+    lines = [f"# HELP {name} Complaint analysis result cache lookups by outcome.", f"# TYPE {name} counter"]
+    lines += [f'{name}{{result="{result}"}} {count}' for result, count in result_cache.lookups.items()]
+    return lines
@@ -0,0 +1,102 @@
+"""
+LRU cache of RAG retrieval results.
+
+Maps lightly normalized query text (NFKC, case-folded, whitespace collapsed)
+to the docstore ids the retriever returned for it, so a repeated question
+skips both the query encode and the FAISS search. A query whose embedding is
+within `epsilon` cosine distance of a cached one reuses that result too
+(skipping only the search). Entries belong to one index version; the cache
+empties itself when a new index release is served.
+"""
+import threading
+from collections import OrderedDict
+
+from .text_normalization import fold_text
+
+
+class RetrievalCache:
+    def __init__(self, max_entries=1024, epsilon=0.0):
+        self.max_entries = max_entries
+        self.epsilon = epsilon
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # normalized query -> (unit embedding or None, doc ids)
+        self._version = None
+        self._matrix = None  # stacked embeddings of _entries, rebuilt lazily
+        self.hits = {"exact": 0, "semantic": 0, "miss": 0}
+
+    @staticmethod
+    def normalize(query):
+        """
+        The cache key of a query. Unlike clean_text this keeps non-ASCII text,
+        so questions in other scripts do not all collapse to the same key.
+        """
+        return fold_text(query)
+
+    def _check_version(self, version):
+        if version != self._version:
+            self._entries.clear()
+            self._matrix = None
+            self._version = version
+
+    def get(self, version, query):
+        """Doc ids cached for exactly this (normalized) query, or None."""
+        with self._lock:
+            self._check_version(version)
+            key = self.normalize(query)
+            entry = self._entries.get(key) if key else None
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits["exact"] += 1
+            return entry[1]
+
+    def get_similar(self, version, embedding):
+        """Doc ids of the closest cached query within epsilon, or None."""
+        import numpy as np
+
+        with self._lock:
+            self._check_version(version)
+            if self.epsilon <= 0 or not self._entries:
+                self.hits["miss"] += 1
+                return None
+            if self._matrix is None:
+                keys = [key for key, (vector, _) in self._entries.items() if vector is not None]
+                self._matrix = (keys, np.stack([self._entries[key][0] for key in keys]) if keys else None)
+            keys, matrix = self._matrix
+            if matrix is None:
+                self.hits["miss"] += 1
+                return None
+
+            similarities = matrix @ _unit(embedding)
+            best = int(similarities.argmax())
+            if 1 - similarities[best] > self.epsilon:
+                self.hits["miss"] += 1
+                return None
+            self._entries.move_to_end(keys[best])
+            self.hits["semantic"] += 1
+            return self._entries[keys[best]][1]
+
+    def put(self, version, query, doc_ids, embedding=None):
+        with self._lock:
+            self._check_version(version)
+            key = self.normalize(query)
+            if not key:
+                return
+            self._entries[key] = (None if embedding is None else _unit(embedding), list(doc_ids))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+
+def _unit(embedding):
+    import numpy as np
+
+    vector = np.asarray(embedding, dtype="float32")
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,81 @@
+"""
+Answers direct section lookups ("what is section 302", "punishment for
+section 379") from IPCSectionDB, without retrieval or an LLM call.
+
+A question is only treated as a lookup when it names exactly one section and
+every other word comes from LOOKUP_WORDS; anything more specific goes to RAG.
+"""
+import re
+
+from .condense import SECTION_REFERENCE
+from .models import IPCSectionDB
+
+# The fields of a section returned as a source document, matching the
+# metadata the RAG index keeps for rows of IPC_Sections_Explore.csv.
+SOURCE_FIELDS = [
+    "id", "section_number", "title", "short_description", "mapped_category",
+    "punishment", "bailability_status", "court_jurisdiction",
+]
+
+# What the question asks about, by the words that signal it.
+ASPECT_WORDS = {
+    "punishment": {"punishment", "punishable", "penalty", "sentence", "jail", "imprisonment", "fine"},
+    "bailability": {"bail", "bailable", "nonbailable"},
+    "jurisdiction": {"court", "courts", "triable", "try", "tries", "tried", "jurisdiction"},
+}
+
+LOOKUP_WORDS = set().union(*ASPECT_WORDS.values()) | {
+    "what", "whats", "is", "are", "the", "a", "an", "of", "for", "under", "in", "on",
+    "section", "sec", "s", "ipc", "indian", "penal", "code", "us", "u",
+    "tell", "me", "about", "explain", "describe", "define", "definition", "meaning",
+    "mean", "means", "does", "say", "says", "title", "details", "which", "who",
+    "by", "can", "i", "get", "it", "give", "show", "please", "offence", "offense",
+    "non", "and", "or", "there", "any", "how", "much", "long", "given",
+}
+
+_WORDS = re.compile(r"[a-z]+")
+
+
+def parse_lookup(question):
+    """Returns (section number, aspects asked about) for a direct lookup, else None."""
+    sections = {match.group(1).upper() for match in SECTION_REFERENCE.finditer(question)}
+    if len(sections) != 1:
+        return None
+    remainder = SECTION_REFERENCE.sub(" ", question.lower())
+    words = _WORDS.findall(remainder)
+    if not set(words) <= LOOKUP_WORDS:
+        return None
+    aspects = [aspect for aspect, signals in ASPECT_WORDS.items() if signals.intersection(words)]
+    return sections.pop(), aspects
+
+
+def format_answer(section, aspects):
+    lines = [f"IPC Section {section.section_number}: {section.title}."]
+    if not aspects:
+        lines.append(section.short_description)
+        aspects = list(ASPECT_WORDS)
+    if "punishment" in aspects:
+        lines.append(f"Punishment: {section.punishment}")
+    if "bailability" in aspects:
+        lines.append(f"Bailability: {section.bailability_status}")
+    if "jurisdiction" in aspects:
+        lines.append(f"Triable by: {section.court_jurisdiction}")
+    return "\n".join(lines)
+
+
+def answer_section_lookup(question):
+    """
+    Returns {"answer", "source_documents"} for a direct section lookup, or
+    None if the question is not one or the section is unknown.
+    """
+    lookup = parse_lookup(question)
+    if lookup is None:
+        return None
+    section_number, aspects = lookup
+    section = IPCSectionDB.objects.filter(section_number__iexact=section_number).first()
+    if section is None:
+        return None
+    return {
+        "answer": format_answer(section, aspects),
+        "source_documents": [{field: getattr(section, field) for field in SOURCE_FIELDS}],
+    }
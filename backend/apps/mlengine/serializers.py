@@ -1,10 +1,16 @@
 from rest_framework import serializers
 from .models import IPCSectionDB
+from .related_sections import get_related_sections
 
 class IPCSectionSerializer(serializers.ModelSerializer):
     """
     Serializer for the IPCSectionDB model to convert it to JSON format.
     """
+    related_sections = serializers.SerializerMethodField()
+
     class Meta:
         model = IPCSectionDB
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+    def get_related_sections(self, obj):
+        return get_related_sections(obj.section_number)
@@ -1,3 +1,827 @@
-from django.test import TestCase
+import importlib.util
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from collections import namedtuple
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from . import chat_store, complaint_analysis, context_packing
+from .artifact_registry import LEGACY_VERSION, ArtifactError, ArtifactRegistry, HotReloader
+from .batching import MicroBatcher
+from .benchmarks import percentiles, run_load
+from .compression import CompressionMiddleware, brotli, choose_encoding
+from .condense import choose_path, condense_question
+from .encoders import ONNX_INT8_MODEL_FILE, ONNX_MODEL_FILE
+from .instrumentation import Histogram, _prune_profiles, _wants_profile, server_timing_header
+from .models import IPCSectionDB
+from .paths import BACKEND_DIR, ONNX_ENCODER_DIR
+from .renderers import ORJSONRenderer, dumps
+from .result_cache import ResultCache, result_key
+from .retrieval_cache import RetrievalCache
+from .section_lookup import parse_lookup
+from .text_normalization import clean_text, clean_text_series
+
+SAMPLE_COMPLAINTS = [
+    "someone snatched my gold chain while i was walking near the central market",
+    "i was tricked into installing a fake payment app and they withdrew money from my account",
+    "a person from my old office keeps sending me threatening messages on social media",
+    "my neighbours play loud music at 2 am every night and it is a major disturbance",
+]
+
+HAS_ONNX_ENCODER = (
+    importlib.util.find_spec("onnxruntime") is not None
+    and importlib.util.find_spec("sentence_transformers") is not None
+    and (ONNX_ENCODER_DIR / ONNX_MODEL_FILE).exists()
+)
+
+
+@unittest.skipUnless(HAS_ONNX_ENCODER, "run `manage.py export_onnx_encoder --quantize` first")
+class OnnxEncoderParityTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from .encoders import SentenceTransformerEncoder
+        cls.reference = SentenceTransformerEncoder()
+
+    def assertCompatible(self, candidate, min_similarity):
+        import faiss
+        from .encoders import min_cosine_similarity
+        from .paths import MODELS_DIR
+
+        self.assertGreaterEqual(min_cosine_similarity(self.reference, candidate, SAMPLE_COMPLAINTS), min_similarity)
+
+        # The nearest IPC sections in the existing index must not change
+        index = faiss.read_index(str(MODELS_DIR / "faiss_index.index"))
+        _, expected = index.search(self.reference.encode(SAMPLE_COMPLAINTS), 1)
+        _, actual = index.search(candidate.encode(SAMPLE_COMPLAINTS), 1)
+        self.assertEqual(expected.tolist(), actual.tolist())
+
+    def test_onnx_matches_sentence_transformers(self):
+        from .encoders import OnnxEncoder
+        self.assertCompatible(OnnxEncoder(), 0.999)
+
+    @unittest.skipUnless((ONNX_ENCODER_DIR / ONNX_INT8_MODEL_FILE).exists(), "no quantized model exported")
+    def test_int8_onnx_stays_within_tolerance(self):
+        from .encoders import OnnxEncoder
+        self.assertCompatible(OnnxEncoder(quantized=True), 0.98)
+
+
+# Top-level packages that must only be imported when a model is first used.
+ML_STACK = {
+    "faiss", "joblib", "langchain", "langchain_community", "langchain_core",
+    "langchain_huggingface", "langchain_openai", "numpy", "onnxruntime", "pandas",
+    "sentence_transformers", "sklearn", "tokenizers", "torch", "transformers",
+}
+
+
+class ImportTimeBudgetTests(SimpleTestCase):
+    def test_url_loading_does_not_import_ml_stack(self):
+        code = (
+            "import django; django.setup(); "
+            "from django.urls import get_resolver; get_resolver().url_patterns"
+        )
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "backend.settings")}
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+
+        # Lines look like: "import time:  self [us] | cumulative | imported package"
+        imported = {
+            line.rsplit("|", 1)[1].strip().split(".")[0]
+            for line in result.stderr.splitlines()
+            if line.startswith("import time:") and "|" in line
+        }
+        self.assertEqual(imported & ML_STACK, set())
+
+
+def legacy_clean_text(text):
+    """The original complaint_analysis.clean_text, kept verbatim as the reference."""
+    if not isinstance(text, str):
+        return ""
+    text = text.replace('\\n', ' ').replace('\r', ' ')
+    text = re.sub(r'[^a-zA-Z0-9\s]', '', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text.lower()
+
+
+class TextNormalizationParityTests(SimpleTestCase):
+    samples = [
+        "Someone snatched my GOLD chain!! near the market.",
+        "Section 302:\\nPunishment for murder.\r\n",
+        "  tabs\tand\vform\ffeeds\x1c\x85and\u3000ideographic spaces  ",
+        "Ünïcödé ñ accents — and “quotes” are dropped",
+        "", "   ", None, 42, float("nan"),
+    ]
+
+    def test_clean_text_matches_legacy(self):
+        for text in self.samples:
+            with self.subTest(text=text):
+                self.assertEqual(clean_text(text), legacy_clean_text(text))
+
+    @unittest.skipUnless(importlib.util.find_spec("pandas"), "pandas is not installed")
+    def test_series_path_matches_legacy_on_training_data(self):
+        import pandas as pd
+
+        csv_dir = BACKEND_DIR.parent / "ml_workspace"
+        texts = pd.concat([
+            pd.Series(self.samples, dtype=object),
+            pd.read_csv(csv_dir / "IPC_Sections_Final.csv")["full_legal_text"],
+            pd.read_csv(csv_dir / "synthetic_complaints.csv")["complaint_text"],
+        ], ignore_index=True)
+
+        self.assertEqual(clean_text_series(texts).tolist(), [legacy_clean_text(text) for text in texts])
+
+
+class RetrievalCacheKeyTests(SimpleTestCase):
+    def test_non_ascii_questions_do_not_share_an_entry(self):
+        cache = RetrievalCache(max_entries=10)
+        cache.put("v1", "मेरा फोन चोरी हो गया", ["stolen-phone"])
+        self.assertIsNone(cache.get("v1", "चोरी की सजा"))
+        self.assertEqual(cache.get("v1", "मेरा  फोन चोरी हो गया "), ["stolen-phone"])
+
+    def test_questions_without_a_key_are_not_cached(self):
+        cache = RetrievalCache(max_entries=10)
+        cache.put("v1", "   ", ["anything"])
+        self.assertIsNone(cache.get("v1", "   "))
+
+    def test_case_and_whitespace_are_folded(self):
+        cache = RetrievalCache(max_entries=10)
+        cache.put("v1", "What is Section 302?", ["302"])
+        self.assertEqual(cache.get("v1", "  what is   section 302? "), ["302"])
+
+
+class ResultCacheKeyTests(SimpleTestCase):
+    def test_non_ascii_complaints_do_not_share_a_result(self):
+        cache = ResultCache(max_entries=10)
+        cache.put(result_key("मेरा फोन चोरी हो गया", "v1"), {"predicted_category": "Theft"})
+        self.assertIsNone(cache.get(result_key("पड़ोसी मुझे धमकी दे रहा है", "v1")))
+        self.assertEqual(cache.get(result_key("मेरा फोन  चोरी हो गया", "v1")), {"predicted_category": "Theft"})
+
+    def test_complaints_without_text_are_not_cached(self):
+        self.assertIsNone(result_key("  ", "v1"))
+        self.assertIsNone(result_key(None, "v1"))
+
+    def test_key_depends_on_the_model_version(self):
+        self.assertNotEqual(result_key("my phone was stolen", "v1"), result_key("my phone was stolen", "v2"))
+        self.assertEqual(result_key("My phone  was stolen", "v1"), result_key("my phone was stolen", "v1"))
+
+
+def _fake_classifier(output_file):
+    def run(inputs, out_dir):
+        (out_dir / output_file).write_bytes(b"model")
+        (out_dir / "metrics.json").write_text('{"test_accuracy": 1.0}')
+    return run
+
+
+def _fake_embed(inputs, out_dir):
+    import numpy as np
+    import pandas as pd
+
+    rows = len(pd.read_pickle(inputs["clean"] / "cleaned.pkl"))
+    np.save(out_dir / "embeddings.npy", np.random.default_rng(0).random((rows, 8), dtype="float32"))
+
+
+@unittest.skipUnless(
+    all(importlib.util.find_spec(name) for name in ("faiss", "numpy", "pandas")),
+    "faiss, numpy and pandas are required",
+)
+class ArtifactBuildTests(SimpleTestCase):
+    """Builds small releases, with the classifier and embedding stages replaced by fakes."""
+    def setUp(self):
+        import pandas as pd
+        from . import artifact_build
+        from .artifact_registry import ArtifactRegistry
+
+        self.work_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.work_dir, ignore_errors=True)
+        self.sections = pd.read_csv(BACKEND_DIR.parent / "ml_workspace" / "IPC_Sections_Final.csv").head(40)
+        self.training_csv = self.work_dir / "sections.csv"
+        self.sections.to_csv(self.training_csv, index=False)
+        self.registry = ArtifactRegistry("complaint", self.work_dir / "releases", self.work_dir)
+
+        self.runs = []
+        stages = {
+            "urgency_classifier": _fake_classifier("urgency_classifier.joblib"),
+            "category_classifier": _fake_classifier("category_classifier.joblib"),
+            "embeddings": _fake_embed,
+        }
+        for name in artifact_build.STAGES:
+            run = stages.get(name, artifact_build.STAGES[name]["run"])
+            patcher = mock.patch.dict(artifact_build.STAGES[name], run=self._recording(name, run))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for patcher in (
+            mock.patch.dict(artifact_build.STAGES["clean"], files={"training_csv": self.training_csv}),
+            mock.patch.object(artifact_build, "BUILD_CACHE_DIR", self.work_dir / "build_cache"),
+            mock.patch.object(artifact_build, "complaint_registry", self.registry),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _recording(self, name, run):
+        def recorded(inputs, out_dir):
+            self.runs.append(name)
+            run(inputs, out_dir)
+        return recorded
+
+    def build(self):
+        from .artifact_build import build_stages
+        return build_stages(max_workers=3, log=lambda message: None)
+
+    def test_release_keeps_every_lookup_column(self):
+        import pandas as pd
+        from .artifact_build import create_release
+
+        version = create_release(self.build())
+        self.registry.verify(version)
+
+        lookup = pd.read_pickle(self.registry.path(version) / "ipc_data_for_index.pkl")
+        self.assertEqual(lookup.columns.tolist(), self.sections.columns.tolist())
+        self.assertEqual(len(lookup), len(self.sections))
+        self.assertEqual(lookup["full_legal_text"].tolist(), self.sections["full_legal_text"].tolist())
+        self.assertEqual(self.registry.manifest(version)["metrics"]["urgency_classifier"], {"test_accuracy": 1.0})
+
+    def test_related_sections_graph(self):
+        import json
+        from .artifact_build import RELATED_SECTIONS_K, create_release
+        from .related_sections import RELATED_SECTIONS_FILE
+
+        version = create_release(self.build())
+        graph = json.loads((self.registry.path(version) / RELATED_SECTIONS_FILE).read_text())
+        sections = self.sections["section_number"].astype(str).tolist()
+        self.assertEqual(sorted(graph), sorted(sections))
+        for section, neighbours in graph.items():
+            self.assertEqual(len(neighbours), RELATED_SECTIONS_K)
+            self.assertNotIn(section, [neighbour["section_number"] for neighbour in neighbours])
+            similarities = [neighbour["similarity"] for neighbour in neighbours]
+            self.assertEqual(similarities, sorted(similarities, reverse=True))
+
+    def test_stages_run_after_their_dependencies(self):
+        from .artifact_build import STAGES
+
+        self.build()
+        self.assertCountEqual(self.runs, STAGES)
+        for name, stage in STAGES.items():
+            for dep in stage["deps"]:
+                self.assertLess(self.runs.index(dep), self.runs.index(name))
+
+    def test_unchanged_stages_are_reused(self):
+        first = self.build()
+        self.runs.clear()
+        self.assertEqual(self.build(), first)
+        self.assertEqual(self.runs, [])
+
+        # A changed input file rebuilds its stage and everything downstream of it
+        self.sections.head(30).to_csv(self.training_csv, index=False)
+        second = self.build()
+        self.assertCountEqual(self.runs, first)
+        for name in first:
+            self.assertNotEqual(second[name][0], first[name][0])
+
+
+class CondensePathTests(SimpleTestCase):
+    section_history = [("what is section 302", "Section 302 is punishment for murder.")]
+    topic_history = [("what happens if someone steals my phone", "That is theft.")]
+
+    def test_first_turn_is_used_as_is(self):
+        self.assertEqual(choose_path("what is the punishment", []), ("first_turn", "what is the punishment"))
+
+    def test_questions_naming_a_section_or_subject_stand_alone(self):
+        for question in ("and section 304?", "how do I report cyber stalking to the police"):
+            with self.subTest(question=question):
+                self.assertEqual(choose_path(question, self.section_history), ("self_contained", question))
+
+    def test_follow_ups_about_the_previous_section_are_rewritten_locally(self):
+        for question in ("what is the punishment", "is it bailable in Delhi", "and the fine?"):
+            with self.subTest(question=question):
+                self.assertEqual(
+                    choose_path(question, self.section_history),
+                    ("local_rewrite", f"{question} (IPC section 302)"),
+                )
+
+    def test_follow_ups_about_a_topic_go_to_the_llm(self):
+        for question in ("what is the punishment", "is it bailable in Delhi"):
+            with self.subTest(question=question):
+                self.assertEqual(choose_path(question, self.topic_history), ("llm", None))
+
+    def test_strategies(self):
+        llm = mock.Mock()
+        llm.invoke.return_value.content = "what is the punishment for theft"
+        self.assertEqual(
+            condense_question("what is the punishment", self.topic_history, "auto", llm),
+            ("llm", "what is the punishment for theft"),
+        )
+        self.assertEqual(
+            condense_question("what is the punishment", self.topic_history, "local", llm),
+            ("local_rewrite", "what happens if someone steals my phone what is the punishment"),
+        )
+        llm.invoke.reset_mock()
+        condense_question("and section 304?", self.section_history, "llm", llm)
+        llm.invoke.assert_called_once()
+
+
+class AnonymousConversationTests(SimpleTestCase):
+    def request(self, cookies=None):
+        request = RequestFactory().post("/api/ml/chat/")
+        request.COOKIES.update(cookies or {})
+        request.user = AnonymousUser()
+        return request
+
+    def test_signed_cookie_identifies_the_conversation(self):
+        key, conversation_id = chat_store.conversation_key(self.request())
+        self.assertIsNotNone(conversation_id)
+
+        response = HttpResponse()
+        chat_store.set_conversation_cookie(response, conversation_id)
+        cookie = response.cookies[settings.CHAT_COOKIE_NAME]
+        self.assertTrue(cookie["httponly"])
+        self.assertEqual(chat_store.conversation_key(self.request({cookie.key: cookie.value})), (key, None))
+
+    def test_tampered_cookie_starts_a_new_conversation(self):
+        key, conversation_id = chat_store.conversation_key(self.request({settings.CHAT_COOKIE_NAME: "guessed"}))
+        self.assertIsNotNone(conversation_id)
+        self.assertNotIn("guessed", key)
+
+
+class _InlineThread:
+    """Stands in for threading.Thread, running the target when started."""
+    def __init__(self, target, args=(), **kwargs):
+        self.target, self.args = target, args
+
+    def start(self):
+        self.target(*self.args)
+
+
+class ArtifactRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.work_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.work_dir, ignore_errors=True)
+        (self.work_dir / "model.bin").write_text("legacy")
+        self.registry = ArtifactRegistry("test", self.work_dir / "releases", self.work_dir)
+
+    def release(self, content):
+        release_dir = self.registry.new_release_dir()
+        (release_dir / "model.bin").write_text(content)
+        return self.registry.publish(release_dir, note=content)
+
+    def test_legacy_directory_is_served_without_a_release(self):
+        self.assertEqual(self.registry.current_version(), LEGACY_VERSION)
+        self.assertEqual(self.registry.path(LEGACY_VERSION), self.work_dir)
+        self.registry.verify(LEGACY_VERSION)
+
+    def test_publish_and_activate(self):
+        version = self.release("v1")
+        self.assertEqual(self.registry.versions(), [version])
+        self.assertEqual(self.registry.manifest(version)["note"], "v1")
+        self.registry.activate(version)
+        self.assertEqual(self.registry.current_version(), version)
+
+    def test_corrupted_release_is_rejected(self):
+        version = self.release("v1")
+        (self.registry.path(version) / "model.bin").write_text("tampered")
+        with self.assertRaises(ArtifactError):
+            self.registry.activate(version)
+        self.assertEqual(self.registry.current_version(), LEGACY_VERSION)
+
+    def test_rollback_and_discard(self):
+        first = self.release("v1")
+        self.registry.activate(first)
+        second = self.release("v2")
+        self.registry.activate(second)
+
+        self.assertEqual(self.registry.rollback(), first)
+        self.assertEqual(self.registry.current_version(), first)
+        with self.assertRaises(ArtifactError):
+            self.registry.discard(first)
+        self.registry.discard(second)
+        self.assertEqual(self.registry.versions(), [first])
+
+    @override_settings(ML_ARTIFACT_CHECK_INTERVAL=0)
+    def test_reloader_swaps_in_only_verified_releases(self):
+        reloader = HotReloader(self.registry, lambda path: (path / "model.bin").read_text())
+        self.assertEqual(reloader.get(), (LEGACY_VERSION, "legacy"))
+
+        with mock.patch("apps.mlengine.artifact_registry.threading.Thread", _InlineThread):
+            corrupted = self.release("broken")
+            self.registry.activate(corrupted)
+            (self.registry.path(corrupted) / "model.bin").write_text("tampered")
+            reloader.get()
+            self.assertEqual(reloader.get(), (LEGACY_VERSION, "legacy"))
+
+            good = self.release("v2")
+            self.registry.activate(good)
+            reloader.get()
+            self.assertEqual(reloader.get(), (good, "v2"))
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def test_concurrent_items_share_a_batch(self):
+        batches = []
+
+        def process(items):
+            batches.append(items)
+            return [item * 2 for item in items]
+
+        batcher = MicroBatcher(process, max_batch_size=3, max_latency_ms=200)
+        futures = [batcher.submit(item) for item in (1, 2, 3)]
+        self.assertEqual([future.result(timeout=5) for future in futures], [2, 4, 6])
+        self.assertEqual(batches, [[1, 2, 3]])
+        self.assertEqual(batcher.stats(), {"batches": 1, "items": 3, "batch_sizes": {3: 1}})
+
+    def test_a_failed_batch_fails_every_item(self):
+        batcher = MicroBatcher(mock.Mock(side_effect=RuntimeError("model crashed")), max_latency_ms=50)
+        futures = [batcher.submit(item) for item in (1, 2)]
+        for future in futures:
+            with self.assertRaisesMessage(RuntimeError, "model crashed"):
+                future.result(timeout=5)
+
+
+@override_settings(ML_RESULT_CACHE_SIZE=0)
+class AnalyzeComplaintBatchingTests(SimpleTestCase):
+    result = {"predicted_urgency": "Low", "predicted_category": "Theft", "recommended_sections": []}
+
+    @override_settings(ML_BATCHING_ENABLED=False)
+    def test_switched_off_runs_the_models_in_the_request(self):
+        with mock.patch.object(complaint_analysis, "_run_models", return_value=[self.result]) as run_models, \
+                mock.patch.object(complaint_analysis, "get_complaint_batcher") as get_batcher:
+            self.assertEqual(complaint_analysis.analyze_complaint("my phone was stolen"), self.result)
+        run_models.assert_called_once_with(["my phone was stolen"])
+        get_batcher.assert_not_called()
+
+    @override_settings(ML_BATCHING_ENABLED=True, ML_BATCH_RESULT_TIMEOUT=0.01)
+    def test_waiting_gives_up_after_the_timeout(self):
+        from concurrent.futures import Future
+
+        future = Future()
+        with mock.patch.object(complaint_analysis, "get_complaint_batcher") as get_batcher:
+            get_batcher.return_value.submit.return_value = future
+            with self.assertRaises(complaint_analysis.AnalysisTimeout):
+                complaint_analysis.analyze_complaint("my phone was stolen")
+        # The batcher skips it if it has not started it yet
+        self.assertTrue(future.cancelled())
+
+
+class BenchmarkHelperTests(SimpleTestCase):
+    def test_percentiles_use_nearest_rank(self):
+        latencies = [i / 1000 for i in range(100, 0, -1)]  # 1..100 ms, unordered
+        report = percentiles(latencies)
+        for name, expected in (("p50_ms", 50), ("p95_ms", 95), ("p99_ms", 99), ("mean_ms", 50.5)):
+            self.assertAlmostEqual(report[name], expected)
+        self.assertEqual(percentiles([]), {})
+
+    def test_run_load_keeps_the_input_order(self):
+        outputs, latencies, elapsed = run_load(lambda item: item * 2, list(range(20)), concurrency=4)
+        self.assertEqual(outputs, [item * 2 for item in range(20)])
+        self.assertEqual(len(latencies), 20)
+        self.assertGreaterEqual(elapsed, 0)
+
+
+class InstrumentationTests(SimpleTestCase):
+    def test_histogram_counts_cumulative_buckets(self):
+        from .instrumentation import _histograms
+
+        histogram = Histogram("test_seconds", "Test.", "stage", buckets=(0.1, 1))
+        self.addCleanup(_histograms.remove, histogram)
+        histogram.observe("encode", 0.05)
+        histogram.observe("encode", 0.5)
+        lines = histogram.render()
+        self.assertIn('test_seconds_bucket{stage="encode",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{stage="encode",le="1"} 2', lines)
+        self.assertIn('test_seconds_count{stage="encode"} 2', lines)
+
+    def test_server_timing_sums_repeated_stages(self):
+        self.assertEqual(
+            server_timing_header([("encode", 0.01), ("search", 0.002), ("encode", 0.01)], 0.05),
+            "encode;dur=20.0, search;dur=2.0, total;dur=50.0",
+        )
+
+    def test_profiling_needs_the_shared_token(self):
+        request = RequestFactory().get("/api/ml/chat/", HTTP_X_PROFILE="1")
+        with override_settings(ML_PROFILER_ENABLED=True, ML_PROFILER_TOKEN=""):
+            self.assertFalse(_wants_profile(request))
+        with override_settings(ML_PROFILER_ENABLED=True, ML_PROFILER_TOKEN="s3cret"):
+            self.assertFalse(_wants_profile(request))
+            self.assertTrue(_wants_profile(RequestFactory().get("/", HTTP_X_PROFILE="s3cret")))
+        with override_settings(ML_PROFILER_ENABLED=False, ML_PROFILER_TOKEN="s3cret"):
+            self.assertFalse(_wants_profile(RequestFactory().get("/", HTTP_X_PROFILE="s3cret")))
+
+    def test_only_the_newest_profiles_are_kept(self):
+        profile_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, profile_dir, ignore_errors=True)
+        for age in range(4):
+            path = profile_dir / f"{age}.folded"
+            path.write_text("main 1")
+            os.utime(path, (1000 - age, 1000 - age))
+        _prune_profiles(profile_dir, keep=2)
+        self.assertEqual(sorted(path.name for path in profile_dir.iterdir()), ["0.folded", "1.folded"])
+
+
+@override_settings(METRICS_ALLOWED_IPS=["127.0.0.1"], METRICS_TOKEN="scrape-token")
+class MetricsAccessTests(SimpleTestCase):
+    def test_allowed_ips_may_scrape(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("legalsift_stage_seconds", response.content.decode())
+
+    def test_other_clients_need_the_token(self):
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="203.0.113.7").status_code, 403)
+        self.assertEqual(
+            self.client.get("/metrics", REMOTE_ADDR="203.0.113.7", HTTP_AUTHORIZATION="Bearer wrong").status_code, 403,
+        )
+        self.assertEqual(
+            self.client.get("/metrics", REMOTE_ADDR="203.0.113.7", HTTP_AUTHORIZATION="Bearer scrape-token").status_code, 200,
+        )
+
+
+Doc = namedtuple("Doc", "page_content metadata")
+
+
+# Token counts fall back to four characters per token
+@mock.patch.object(context_packing, "_get_encoding", return_value=False)
+class ContextPackingTests(SimpleTestCase):
+    opening = "Whoever commits murder shall be punished with death, "
+    closing = "or imprisonment for life, and shall also be liable to fine."
+
+    def test_duplicates_are_dropped(self, encoding):
+        doc = Doc(self.opening, {"source": "ipc.pdf", "page": 1})
+        passages, _ = context_packing.pack_context([doc, doc], token_budget=1000)
+        self.assertEqual(passages, [(doc.metadata, self.opening.strip())])
+
+    def test_overlapping_chunks_of_a_source_are_stitched(self, encoding):
+        overlap = "punished with death, "
+        first = Doc(self.opening, {"source": "ipc.pdf"})
+        second = Doc(overlap + self.closing, {"source": "ipc.pdf"})
+        other = Doc(overlap + self.closing, {"source": "crpc.pdf"})
+        passages, _ = context_packing.pack_context([other, second, first], token_budget=1000)
+        self.assertEqual(passages, [
+            ({"source": "crpc.pdf"}, (overlap + self.closing).strip()),
+            ({"source": "ipc.pdf"}, self.opening + self.closing),
+        ])
+
+    def test_passages_are_kept_by_relevance_within_the_budget(self, encoding):
+        docs = [Doc("a" * 40, {"id": 1}), Doc("b" * 80, {"id": 2}), Doc("c" * 20, {"id": 3})]
+        passages, used = context_packing.pack_context(docs, token_budget=16)
+        self.assertEqual([metadata["id"] for metadata, _ in passages], [1, 3])
+        self.assertEqual(used, 15)
+
+    def test_the_most_relevant_passage_is_cut_to_fit(self, encoding):
+        passages, used = context_packing.pack_context([Doc("a" * 100, {})], token_budget=10)
+        self.assertEqual(passages, [({}, "a" * 40)])
+        self.assertEqual(used, 10)
+
+    def test_history_keeps_the_most_recent_turns(self, encoding):
+        history = [("q1", "a" * 40), ("q2", "b" * 40), ("q3", "c" * 40)]
+        kept, _ = context_packing.pack_history(history, 30, lambda turns: "".join(q + a for q, a in turns))
+        self.assertEqual(kept, history[1:])
+
+
+class SectionLookupTests(TestCase):
+    def test_direct_lookups_are_recognised(self):
+        cases = {
+            "What is Section 302?": ("302", []),
+            "punishment for sec 379": ("379", ["punishment"]),
+            "is IPC 304B bailable and which court tries it": ("304B", ["bailability", "jurisdiction"]),
+        }
+        for question, expected in cases.items():
+            with self.subTest(question=question):
+                self.assertEqual(parse_lookup(question), expected)
+
+    def test_other_questions_go_to_rag(self):
+        for question in (
+            "what is the punishment for theft",
+            "compare section 302 and section 304",
+            "is section 302 applicable if my neighbour attacked me with a knife",
+        ):
+            with self.subTest(question=question):
+                self.assertIsNone(parse_lookup(question))
+
+    @override_settings(RAG_SECTION_LOOKUP_ENABLED=True)
+    def test_lookups_are_answered_from_the_database(self):
+        from .rag_engine import ask_with_memory
+
+        IPCSectionDB.objects.create(
+            section_number="302", title="Punishment for murder", short_description="Murder.",
+            mapped_category="Murder", punishment="Death or imprisonment for life", bailability_status="Non-Bailable",
+            court_jurisdiction="Court of Session", full_legal_text="Whoever commits murder shall be punished.",
+        )
+        result = ask_with_memory("punishment for section 302")
+        self.assertEqual(result["route"], "section_lookup")
+        self.assertEqual(result["answer"], "IPC Section 302: Punishment for murder.\nPunishment: Death or imprisonment for life")
+        self.assertEqual(result["source_documents"][0]["section_number"], "302")
+
+
+class _FakeCategoryPipeline:
+    def __init__(self, probabilities):
+        import numpy as np
+
+        self.classes_ = np.array(["Fraud", "Theft", "Trespass"])
+        self.probabilities = np.array(probabilities)
+
+    def predict_proba(self, texts):
+        return self.probabilities
+
+
+@unittest.skipUnless(importlib.util.find_spec("faiss") and importlib.util.find_spec("numpy"), "faiss is not installed")
+@override_settings(ML_CATEGORY_PARTITIONED_SEARCH=True, ML_CATEGORY_CONFIDENCE_THRESHOLD=0.5)
+class CategoryPartitionedSearchTests(SimpleTestCase):
+    def setUp(self):
+        import faiss
+        import numpy as np
+
+        self.vectors = np.eye(6, dtype="float32")
+        index = faiss.IndexFlatL2(6)
+        index.add(self.vectors)
+        self.models = {
+            "faiss_index": index,
+            "partitions": {"Theft": np.array([0, 1, 2], dtype="int64"), "Fraud": np.array([3, 4, 5], dtype="int64")},
+            "selectors": {},
+        }
+
+    def test_runner_up_is_added_when_the_classifier_is_unsure(self):
+        pipeline = _FakeCategoryPipeline([[0.1, 0.8, 0.1], [0.4, 0.45, 0.15]])
+        predicted, category_sets = complaint_analysis._category_sets(pipeline, ["a", "b"])
+        self.assertEqual(predicted.tolist(), ["Theft", "Theft"])
+        self.assertEqual(category_sets, [("Theft",), ("Fraud", "Theft")])
+
+    def test_search_stays_within_the_categories(self):
+        # The query is nearest to section 3, which is not a Theft section
+        _, indices = complaint_analysis._search(self.models, self.vectors[[3]], [("Theft",)], k=3)
+        self.assertCountEqual(indices[0].tolist(), [0, 1, 2])
+        _, indices = complaint_analysis._search(self.models, self.vectors[[3]], [("Fraud", "Theft")], k=1)
+        self.assertEqual(indices[0].tolist(), [3])
+
+    def test_unknown_categories_and_old_releases_search_everything(self):
+        _, indices = complaint_analysis._search(self.models, self.vectors[[3]], [("Trespass",)], k=1)
+        self.assertEqual(indices[0].tolist(), [3])
+        _, indices = complaint_analysis._search({**self.models, "partitions": None}, self.vectors[[3]], [("Theft",)], k=1)
+        self.assertEqual(indices[0].tolist(), [3])
+
+
+class RelatedSectionsTests(SimpleTestCase):
+    graph = {
+        "379": [
+            {"section_number": "380", "title": "Theft in dwelling house", "similarity": 0.9},
+            {"section_number": "411", "title": "Receiving stolen property", "similarity": 0.7},
+        ],
+        "380": [
+            {"section_number": "379", "title": "Punishment for theft", "similarity": 0.9},
+            {"section_number": "382", "title": "Theft after preparation", "similarity": 0.8},
+        ],
+    }
+
+    def test_related_sections_exclude_recommended_ones(self):
+        related = complaint_analysis._related_to(self.graph, [{"section_number": 379}, {"section_number": "380"}])
+        self.assertEqual([section["section_number"] for section in related], ["382", "411"])
+        self.assertEqual(complaint_analysis._related_to(self.graph, [{"section_number": "379"}], limit=1)[0]["section_number"], "380")
+
+    def test_releases_without_a_graph_have_no_related_sections(self):
+        from .related_sections import load_related_sections
+
+        with tempfile.TemporaryDirectory() as model_dir:
+            self.assertEqual(load_related_sections(Path(model_dir)), {})
+
+
+class RendererTests(SimpleTestCase):
+    def test_decimals_and_datetimes_render_like_drf(self):
+        import datetime
+        import decimal
+
+        data = {"amount": decimal.Decimal("1.10"), "at": datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc), 1: "key"}
+        self.assertEqual(dumps(data), b'{"amount":"1.10","at":"2025-01-01T00:00:00Z","1":"key"}')
+
+    @unittest.skipUnless(importlib.util.find_spec("numpy"), "numpy is not installed")
+    def test_numpy_values_from_pandas_records_render(self):
+        import numpy as np
+
+        data = {"section_number": np.int64(302), "score": np.float16(0.5), "rows": np.array([1, 2])}
+        self.assertEqual(ORJSONRenderer().render(data), b'{"section_number":302,"score":0.5,"rows":[1,2]}')
+        self.assertIn(b'\n  "section_number"', ORJSONRenderer().render(data, "application/json; indent=4"))
+
+
+@override_settings(API_COMPRESSION_PATHS=["/api/complaints/"], API_COMPRESSION_MIN_BYTES=100)
+class CompressionMiddlewareTests(SimpleTestCase):
+    body = b'{"recommended_sections": "' + b"Whoever commits murder shall be punished. " * 50 + b'"}'
+
+    def respond(self, path, response, accept_encoding="gzip"):
+        request = RequestFactory().get(path, HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_accept_encoding_is_parsed(self):
+        self.assertEqual(choose_encoding("gzip;q=0.5, deflate"), "gzip")
+        self.assertIsNone(choose_encoding("gzip;q=0, identity"))
+        self.assertIsNone(choose_encoding(""))
+        if brotli is not None:
+            self.assertEqual(choose_encoding("gzip, br;q=0.8"), "br")
+            self.assertEqual(choose_encoding("br;q=0, gzip"), "gzip")
+
+    def test_api_responses_are_compressed(self):
+        import gzip
+
+        original = HttpResponse(self.body, content_type="application/json")
+        original["ETag"] = '"abc"'
+        response = self.respond("/api/complaints/history/", original)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(response["ETag"], 'W/"abc"')
+        self.assertEqual(int(response["Content-Length"]), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_other_paths_small_and_encoded_bodies_are_left_alone(self):
+        untouched = [
+            ("/api/users/token/", HttpResponse(self.body)),
+            ("/api/complaints/history/", HttpResponse(b'{"ok": true}')),
+        ]
+        encoded = HttpResponse(self.body)
+        encoded["Content-Encoding"] = "identity"
+        untouched.append(("/api/complaints/history/", encoded))
+        for path, original in untouched:
+            with self.subTest(path=path, length=len(original.content)):
+                response = self.respond(path, original)
+                self.assertEqual(response.content, original.content)
+                self.assertNotEqual(response.get("Content-Encoding"), "gzip")
+
+    def test_clients_without_a_supported_encoding_get_identity(self):
+        response = self.respond("/api/complaints/history/", HttpResponse(self.body), accept_encoding="deflate")
+        self.assertEqual(response.content, self.body)
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+
+    @unittest.skipIf(brotli is None, "brotli is not installed")
+    def test_streamed_bodies_are_compressed_chunk_by_chunk(self):
+        chunks = [b"row %d\n" % i * 20 for i in range(5)]
+        response = self.respond(
+            "/api/complaints/export/", StreamingHttpResponse(iter(chunks)), accept_encoding="br",
+        )
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertFalse(response.has_header("Content-Length"))
+        self.assertEqual(brotli.decompress(b"".join(response.streaming_content)), b"".join(chunks))
+
+
+@unittest.skipUnless(importlib.util.find_spec("faiss") and importlib.util.find_spec("numpy"), "faiss is not installed")
+class ChunkStoreTests(SimpleTestCase):
+    def setUp(self):
+        import faiss
+        import numpy as np
+
+        self.index_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.index_dir, ignore_errors=True)
+        self.vectors = np.eye(3, dtype="float32")
+        self.index = faiss.IndexFlatL2(3)
+        self.index.add(self.vectors)
+        self.documents = [
+            Doc(f"chunk {i}", {"source": "ipc.pdf", "page": i}) for i in range(3)
+        ]
+
+    def test_round_trip(self):
+        from .chunk_store import ChunkIndex, is_chunk_store, write_chunk_store
+
+        write_chunk_store(self.index_dir, self.index, self.documents, normalize_L2=True)
+        self.assertTrue(is_chunk_store(self.index_dir))
+
+        loaded = ChunkIndex.load(self.index_dir)
+        self.assertEqual(loaded.index.ntotal, 3)
+        self.assertTrue(loaded.normalize_L2)
+        _, positions = loaded.index.search(self.vectors[[2]], 1)
+        self.assertEqual(positions[0].tolist(), [2])
+        # Chunks come back in the order asked for; unknown positions are skipped
+        self.assertEqual(loaded.chunks.get([2, 7, 0]), [
+            ("chunk 2", {"source": "ipc.pdf", "page": 2}),
+            ("chunk 0", {"source": "ipc.pdf", "page": 0}),
+        ])
+        self.assertEqual(loaded.chunks.get([]), [])
+
+    def test_every_vector_needs_a_document(self):
+        from .chunk_store import write_chunk_store
+
+        with self.assertRaises(ValueError):
+            write_chunk_store(self.index_dir, self.index, self.documents[:2])
+
+    @unittest.skipUnless(importlib.util.find_spec("langchain_core"), "langchain_core is not installed")
+    def test_retriever_reads_chunks_from_the_store(self):
+        from .chunk_store import ChunkIndex, write_chunk_store
+        from .lc_retriever import CachedFAISSRetriever
+
+        write_chunk_store(self.index_dir, self.index, self.documents)
+        embeddings = mock.Mock()
+        embeddings.embed_query.return_value = self.vectors[1].tolist()
+        retriever = CachedFAISSRetriever(
+            vectordb=ChunkIndex.load(self.index_dir), embeddings=embeddings,
+            cache=RetrievalCache(max_entries=10), version="v1", k=1,
+        )
+        for _ in range(2):
+            documents = retriever.invoke("what is theft")
+            self.assertEqual([(doc.page_content, doc.metadata["page"]) for doc in documents], [("chunk 1", 1)])
+        # The second lookup was served from the cache
+        embeddings.embed_query.assert_called_once()
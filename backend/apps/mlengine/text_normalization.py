@@ -0,0 +1,53 @@
+"""
+The single text normalization used for training and serving.
+
+It has no Django dependency, so the training pipeline can import it directly.
+Its output must stay identical to the original complaint_analysis.clean_text
+(see the parity tests); any change here changes what the models see.
+"""
+import re
+import unicodedata
+
+# Anything that is not an ASCII letter, digit or whitespace is dropped.
+_DISALLOWED_CHARS = re.compile(r'[^a-zA-Z0-9\s]')
+_WHITESPACE_RUNS = re.compile(r'\s+')
+
+# The CSVs contain literal backslash-n sequences (two characters), not newlines.
+_LITERAL_NEWLINE = '\\n'
+
+
+def clean_text(text):
+    """A robust function to clean raw text for semantic analysis."""
+    if not isinstance(text, str):
+        return ""
+    text = _DISALLOWED_CHARS.sub('', text.replace(_LITERAL_NEWLINE, ' ').replace('\r', ' '))
+    # str.split() splits on the same whitespace as \s and drops the ends,
+    # which collapses runs and strips in one pass.
+    return ' '.join(text.split()).lower()
+
+
+def fold_text(text):
+    """
+    Case- and whitespace-insensitive form of a text, for cache keys. Unlike
+    clean_text it keeps every script, so distinct non-ASCII texts stay
+    distinct. Not used for model input.
+    """
+    return ' '.join(unicodedata.normalize('NFKC', text).casefold().split())
+
+
+def clean_text_series(series):
+    """
+    Vectorized clean_text for a pandas Series, for bulk preprocessing.
+    Non-string values become "" exactly like clean_text.
+    """
+    is_text = series.map(lambda value: isinstance(value, str))
+    # Force object dtype so the stdlib `re` engine (not pyarrow's) is used.
+    text = series.astype(object).where(is_text, '')
+    return (
+        text.str.replace(_LITERAL_NEWLINE, ' ', regex=False)
+        .str.replace('\r', ' ', regex=False)
+        .str.replace(_DISALLOWED_CHARS, '', regex=True)
+        .str.replace(_WHITESPACE_RUNS, ' ', regex=True)
+        .str.strip()
+        .str.lower()
+    )
@@ -45,6 +45,10 @@
 
 #         return queryset
 
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -56,6 +60,8 @@ from .models import IPCSectionDB
 
 # Import the new, memory-enabled RAG function
 from .rag_engine import ask_with_memory
+from . import chat_store
+from .instrumentation import render_metrics, stage
 
 # ==============================================================================
 # UPDATED: RAG Chatbot API View with Memory
@@ -63,7 +69,8 @@ from .rag_engine import ask_with_memory
 class RAGChatbotView(APIView):
     """
     An API endpoint for the conversational RAG chatbot.
-    It uses the user's session to maintain chat history.
+    Chat history is kept in the cache-backed chat_store, keyed by user or by a
+    signed cookie for anonymous users.
     """
     def post(self, request, *args, **kwargs):
         query = request.data.get('query', None)
@@ -74,19 +81,22 @@ class RAGChatbotView(APIView):
             )
         
         try:
-            # 1. Get the chat history from the user's session, or start a new one
-            chat_history = request.session.get('rag_chat_history', [])
+            # 1. Get the chat history for this conversation, or start a new one
+            with stage("history_load"):
+                conversation, new_conversation_id = chat_store.conversation_key(request)
+                chat_history = chat_store.get_history(conversation)
 
             # 2. Call the new RAG function with the query and history
             result = ask_with_memory(query, chat_history)
             
-            # 3. Update the chat history with the new question and answer
-            chat_history.append((query, result["answer"]))
-            
-            # 4. Save the updated history back to the session
-            request.session['rag_chat_history'] = chat_history
-            
-            return Response(result, status=status.HTTP_200_OK)
+            # 3. Save the new question and answer to the chat history
+            with stage("history_save"):
+                chat_store.append_turn(conversation, query, result["answer"])
+
+            response = Response(result, status=status.HTTP_200_OK)
+            if new_conversation_id:
+                chat_store.set_conversation_cookie(response, new_conversation_id)
+            return response
         
         except Exception as e:
             # Add more detailed error logging for debugging
@@ -124,4 +134,22 @@ class IPCSectionListView(ListAPIView):
                 Q(mapped_category__icontains=search_term)
             )
 
-        return queryset
\ No newline at end of file
+        return queryset
+
+# ==============================================================================
+# Prometheus metrics
+# ==============================================================================
+def _may_scrape(request):
+    """Scrapers must come from METRICS_ALLOWED_IPS or present METRICS_TOKEN."""
+    if settings.METRICS_TOKEN:
+        authorization = request.headers.get("Authorization", "")
+        if hmac.compare_digest(authorization, f"Bearer {settings.METRICS_TOKEN}"):
+            return True
+    return request.META.get("REMOTE_ADDR") in settings.METRICS_ALLOWED_IPS
+
+
+def metrics_view(request):
+    """Per-stage timing histograms of this process, for Prometheus to scrape."""
+    if not _may_scrape(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4")
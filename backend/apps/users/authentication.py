@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+User = get_user_model()
+
+# --- TOKEN CLAIMS ---
+# Copied onto every refresh token (and from there onto its access tokens),
+# so the stateless authentication below never needs the user row.
+USER_CLAIMS = ('email', 'is_staff', 'is_superuser')
+
+
+def add_user_claims(token, user):
+    """Copies the lightweight user fields onto a token's payload."""
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+def get_tokens_for_user(user):
+    """Issues a refresh/access token pair carrying the lightweight user claims."""
+    refresh = add_user_claims(RefreshToken.for_user(user), user)
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+    }
+
+
+# --- IN-PROCESS USER STATUS CACHE ---
+# Maps user id -> (UserStatus, expires_at), least recently used first, and
+# holds at most USER_STATUS_CACHE_SIZE users. A missing user is cached as
+# inactive, so deleted or deactivated accounts are treated as revoked.
+UserStatus = namedtuple('UserStatus', ['is_active', 'is_staff', 'is_superuser'])
+INACTIVE = UserStatus(False, False, False)
+
+_user_status = OrderedDict()
+_user_status_lock = threading.Lock()
+
+
+def get_user_status(user_id):
+    """
+    Returns the (cached) active and staff flags of a user id. They are read
+    from the users table rather than the token, so revoking them takes effect
+    within USER_STATUS_CACHE_TTL seconds.
+    """
+    now = time.monotonic()
+    with _user_status_lock:
+        cached = _user_status.get(user_id)
+        if cached is not None and cached[1] > now:
+            _user_status.move_to_end(user_id)
+            return cached[0]
+
+    row = User.objects.filter(pk=user_id).values_list('is_active', 'is_staff', 'is_superuser').first()
+    status = INACTIVE if row is None else UserStatus(*map(bool, row))
+    with _user_status_lock:
+        _user_status[user_id] = (status, now + settings.USER_STATUS_CACHE_TTL)
+        _user_status.move_to_end(user_id)
+        while len(_user_status) > settings.USER_STATUS_CACHE_SIZE:
+            _user_status.popitem(last=False)
+    return status
+
+
+def is_user_active(user_id):
+    """Returns the (cached) active status for a user id."""
+    return get_user_status(user_id).is_active
+
+
+def clear_user_status_cache():
+    with _user_status_lock:
+        _user_status.clear()
+
+
+class LightweightUser(TokenUser):
+    """
+    A user built from token claims and the cached user status. It exposes
+    `id`, `email` and the staff flags, which is all the complaint views need.
+    """
+    def __init__(self, token, status):
+        super().__init__(token)
+        self.status = status
+
+    @property
+    def email(self):
+        return self.token.get('email', '')
+
+    @property
+    def is_staff(self):
+        return self.status.is_staff
+
+    @property
+    def is_superuser(self):
+        return self.status.is_superuser
+
+    def __str__(self):
+        return self.email or f"TokenUser {self.id}"
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    A drop-in replacement for JWTAuthentication that skips loading the
+    CustomUser row. The active and staff flags are checked through a
+    short-lived in-process cache (USER_STATUS_CACHE_TTL seconds).
+    """
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise AuthenticationFailed(_("Token contained no recognizable user identification"))
+
+        status = get_user_status(user_id)
+        if not status.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return LightweightUser(validated_token, status)
@@ -0,0 +1,139 @@
+import queue
+import smtplib
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+
+# --- DELIVERY STATUSES ---
+QUEUED = 'queued'
+SENT = 'sent'
+FAILED = 'failed'
+
+STATUS_TTL = 60 * 60
+
+# --- BACKGROUND WORKER SETUP ---
+# A single daemon thread drains the outbox. It keeps one SMTP connection open
+# while mail keeps arriving and closes it after EMAIL_CONNECTION_IDLE_TIMEOUT.
+_outbox = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _status_key(delivery_id):
+    return f"mail:status:{delivery_id}"
+
+
+def _set_status(delivery_id, delivery_status):
+    cache.set(_status_key(delivery_id), delivery_status, timeout=STATUS_TTL)
+
+
+def get_status(delivery_id):
+    """Returns 'queued', 'sent', 'failed' or None for an unknown handle."""
+    return cache.get(_status_key(delivery_id))
+
+
+def send_mail_async(subject, message, recipient_list, from_email=None):
+    """
+    Queues an email for background delivery and returns a delivery id that
+    can be polled with get_status(). With EMAIL_ASYNC_DELIVERY off, the mail
+    is sent inline instead.
+    """
+    delivery_id = uuid.uuid4().hex
+    email = EmailMessage(subject, message, from_email or settings.DEFAULT_FROM_EMAIL, recipient_list)
+    _set_status(delivery_id, QUEUED)
+
+    if not settings.EMAIL_ASYNC_DELIVERY:
+        _deliver([(delivery_id, email)], get_connection())
+        return delivery_id
+
+    _ensure_worker()
+    _outbox.put((delivery_id, email))
+    return delivery_id
+
+
+def flush():
+    """Blocks until every queued email has been handled (used by tests)."""
+    _outbox.join()
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name='mail-queue', daemon=True)
+            _worker.start()
+
+
+def _run():
+    connection = None
+    while True:
+        try:
+            batch = [_outbox.get(timeout=settings.EMAIL_CONNECTION_IDLE_TIMEOUT)]
+        except queue.Empty:
+            if connection is not None:
+                _close_quietly(connection)
+                connection = None
+            continue
+
+        # Collect whatever else is already waiting, up to one batch.
+        while len(batch) < settings.EMAIL_BATCH_SIZE:
+            try:
+                batch.append(_outbox.get_nowait())
+            except queue.Empty:
+                break
+
+        # Nothing may escape this block: if the worker died, later mail
+        # would sit in the queue with no one to send it.
+        try:
+            if connection is None:
+                connection = get_connection()
+            _deliver(batch, connection)
+        except Exception as e:
+            print(f"Email batch failed: {e}")
+            _mark_failed(batch)
+            if connection is not None:
+                _close_quietly(connection)
+                connection = None
+        finally:
+            for _ in batch:
+                _outbox.task_done()
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception as e:
+        print(f"Closing the email connection failed: {e}")
+
+
+def _mark_failed(batch):
+    """Best-effort FAILED status for a batch (the cache itself may be down)."""
+    for delivery_id, _ in batch:
+        try:
+            _set_status(delivery_id, FAILED)
+        except Exception as e:
+            print(f"Could not record the failed delivery {delivery_id}: {e}")
+
+
+def _deliver(batch, connection):
+    """Sends a batch of (delivery_id, EmailMessage) over one connection."""
+    for delivery_id, email in batch:
+        for attempt in range(2):
+            try:
+                connection.open()
+                connection.send_messages([email])
+                _set_status(delivery_id, SENT)
+                break
+            except smtplib.SMTPServerDisconnected:
+                # The pooled connection went stale; reconnect and retry once.
+                connection.close()
+                if attempt:
+                    _set_status(delivery_id, FAILED)
+            except Exception as e:
+                print(f"Email sending failed: {e}")
+                _set_status(delivery_id, FAILED)
+                connection.close()
+                break
@@ -0,0 +1,45 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from apps.users.authentication import (
+    StatelessJWTAuthentication, clear_user_status_cache, get_tokens_for_user,
+)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compares requests/s of JWTAuthentication and StatelessJWTAuthentication.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email of an existing user to issue the token for.')
+        parser.add_argument('--requests', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {options['email']}")
+
+        access = get_tokens_for_user(user)['access']
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        clear_user_status_cache()
+
+        for auth_class in (JWTAuthentication, StatelessJWTAuthentication):
+            authenticator = auth_class()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                for _ in range(options['requests']):
+                    authenticator.authenticate(request)
+                elapsed = time.perf_counter() - start
+
+            self.stdout.write(self.style.SUCCESS(
+                f"{auth_class.__name__}: {options['requests'] / elapsed:,.0f} req/s, "
+                f"{len(queries)} queries for {options['requests']} requests"
+            ))
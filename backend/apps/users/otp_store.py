@@ -0,0 +1,90 @@
+import secrets
+from hmac import compare_digest
+
+from django.conf import settings
+from django.core.cache import caches
+
+# --- VERIFICATION RESULTS ---
+OTP_OK = 'ok'
+OTP_EXPIRED = 'expired'
+OTP_INVALID = 'invalid'
+OTP_LOCKED = 'locked'
+
+
+def _cache():
+    return caches[settings.OTP_CACHE_ALIAS]
+
+
+def is_valid_email(email):
+    """Whether a request value can be used as an email key (a non-empty string)."""
+    return isinstance(email, str) and bool(email.strip())
+
+
+def _normalize(email):
+    return email.strip().lower()
+
+
+def _key(kind, email):
+    return f"otp:{kind}:{_normalize(email)}"
+
+
+def _verified_key(token):
+    return f"otp:verified:{token}"
+
+
+def issue_otp(email):
+    """Generates a new OTP for an email, replacing any previous code."""
+    otp = str(secrets.randbelow(900000) + 100000)
+    cache = _cache()
+    cache.set_many({
+        _key('code', email): otp,
+        _key('attempts', email): 0,
+    }, timeout=settings.OTP_TTL)
+    return otp
+
+
+def check_otp(email, otp_entered):
+    """
+    Checks a submitted OTP and returns (result, verification token). Every
+    call counts as an attempt; once OTP_MAX_ATTEMPTS is exceeded the code is
+    discarded. On success the token proves, for OTP_VERIFIED_TTL seconds,
+    that whoever holds it verified this email.
+    """
+    cache = _cache()
+    stored_otp = cache.get(_key('code', email))
+    if stored_otp is None:
+        return OTP_EXPIRED, None
+
+    try:
+        attempts = cache.incr(_key('attempts', email))
+    except ValueError:
+        # The counter expired between the two reads.
+        return OTP_EXPIRED, None
+
+    if attempts > settings.OTP_MAX_ATTEMPTS:
+        cache.delete_many([_key('code', email), _key('attempts', email)])
+        return OTP_LOCKED, None
+
+    if not compare_digest(str(otp_entered), stored_otp):
+        return OTP_INVALID, None
+
+    cache.delete_many([_key('code', email), _key('attempts', email)])
+    token = secrets.token_urlsafe(32)
+    cache.set(_verified_key(token), _normalize(email), timeout=settings.OTP_VERIFIED_TTL)
+    return OTP_OK, token
+
+
+def is_verified(email, token):
+    """Whether `token` was issued by check_otp for this email and has not expired or been used."""
+    if not is_valid_email(email) or not isinstance(token, str) or not token:
+        return False
+    verified_email = _cache().get(_verified_key(token))
+    return verified_email is not None and compare_digest(verified_email, _normalize(email))
+
+
+def clear(email, token=None):
+    """Discards the pending OTP of an email and, if given, its verification token."""
+    keys = [_key(kind, email) for kind in ('code', 'attempts')]
+    if token:
+        keys.append(_verified_key(token))
+    _cache().delete_many(keys)
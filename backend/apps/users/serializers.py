@@ -3,6 +3,8 @@ from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.utils import timezone
 
+from .authentication import add_user_claims
+
 # Get the CustomUser model you defined in models.py
 User = get_user_model()
 
@@ -24,6 +26,10 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     """
     Customizes the JWT token response to include last login time.
     """
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
     def validate(self, attrs):
         # The parent class's validate method handles the authentication
         data = super().validate(attrs)
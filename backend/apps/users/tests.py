@@ -1,3 +1,93 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from . import mail_queue, otp_store
+from .authentication import (
+    StatelessJWTAuthentication, clear_user_status_cache, get_tokens_for_user, get_user_status,
+)
+from .models import CustomUser
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', EMAIL_ASYNC_DELIVERY=True)
+class OTPEmailQueueTests(TestCase):
+    def test_send_otp_returns_delivery_handle(self):
+        response = self.client.post(reverse('send-otp'), {'email': 'user@example.com'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        delivery_id = response.json()['delivery_id']
+
+        mail_queue.flush()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['user@example.com'])
+        status_response = self.client.get(reverse('otp-delivery-status', args=[delivery_id]))
+        self.assertEqual(status_response.json()['status'], mail_queue.SENT)
+
+    def test_worker_survives_a_failed_batch(self):
+        with mock.patch.object(mail_queue, '_deliver', side_effect=ConnectionError('cache down')):
+            failed_id = mail_queue.send_mail_async('Subject', 'Body', ['first@example.com'])
+            mail_queue.flush()
+        self.assertEqual(mail_queue.get_status(failed_id), mail_queue.FAILED)
+
+        sent_id = mail_queue.send_mail_async('Subject', 'Body', ['second@example.com'])
+        mail_queue.flush()
+        self.assertEqual(mail_queue.get_status(sent_id), mail_queue.SENT)
+        self.assertEqual([message.to for message in mail.outbox], [['second@example.com']])
+
+
+@override_settings(USER_STATUS_CACHE_SIZE=2)
+class StatelessJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        clear_user_status_cache()
+        self.user = CustomUser.objects.create_user(
+            email='staff@example.com', password='secret', phone_number='9000000001', is_staff=True,
+        )
+
+    def test_staff_flag_comes_from_the_database_not_the_token(self):
+        authentication = StatelessJWTAuthentication()
+        token = authentication.get_validated_token(get_tokens_for_user(self.user)['access'])
+        self.assertTrue(authentication.get_user(token).is_staff)
+
+        CustomUser.objects.filter(pk=self.user.pk).update(is_staff=False)
+        clear_user_status_cache()  # as if USER_STATUS_CACHE_TTL had passed
+        self.assertFalse(authentication.get_user(token).is_staff)
+
+    def test_status_cache_is_bounded(self):
+        from .authentication import _user_status
+
+        for user_id in (self.user.pk, 10001, 10002):
+            get_user_status(user_id)
+        self.assertEqual(list(_user_status), [10001, 10002])
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', EMAIL_ASYNC_DELIVERY=False)
+class PasswordResetTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='owner@example.com', password='old', phone_number='9000000002')
+
+    def _verify(self):
+        otp = otp_store.issue_otp(self.user.email)
+        response = self.client.post(reverse('verify-otp'), {'email': self.user.email, 'otp': otp}, content_type='application/json')
+        return response.json()['verification_token']
+
+    def _reset(self, **data):
+        return self.client.post(reverse('reset-password'), {'email': self.user.email, 'new_password': 'new', **data}, content_type='application/json')
+
+    def test_reset_requires_the_verification_token(self):
+        token = self._verify()
+        self.assertEqual(self._reset().status_code, 403)
+        self.assertEqual(self._reset(verification_token='guess').status_code, 403)
+
+        # Requesting a new OTP for the email does not revoke the verification
+        self.client.post(reverse('send-otp'), {'email': self.user.email}, content_type='application/json')
+        self.assertEqual(self._reset(verification_token=token).status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('new'))
+        # The token is single-use
+        self.assertEqual(self._reset(verification_token=token).status_code, 403)
+
+    def test_non_string_email_is_rejected(self):
+        response = self.client.post(reverse('send-otp'), {'email': ['a@example.com']}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
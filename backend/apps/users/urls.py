@@ -1,7 +1,7 @@
 # location: backend/apps/users/urls.py
 
 from django.urls import path
-from .views import (UserRegistrationView, UserLoginView, send_otp_email, verify_otp, reset_password,check_email_phone) 
+from .views import (UserRegistrationView, UserLoginView, send_otp_email, otp_delivery_status, verify_otp, reset_password,check_email_phone) 
 from rest_framework_simplejwt.views import TokenRefreshView
 
 # This list MUST be named 'urlpatterns'
@@ -14,6 +14,7 @@ urlpatterns = [
     # Utility and Password Reset Routes
     path('check-email-phone/', check_email_phone, name='check-email-phone'),
     path('send-otp/', send_otp_email, name='send-otp'),
+    path('send-otp/<str:delivery_id>/', otp_delivery_status, name='otp-delivery-status'),
     path('verify-otp/', verify_otp, name='verify-otp'),
     path('reset-password/', reset_password, name='reset-password'),
 ]
\ No newline at end of file
@@ -1,7 +1,5 @@
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
 from django.utils import timezone
-import random
 
 from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
@@ -9,7 +7,8 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from rest_framework_simplejwt.tokens import RefreshToken
+from . import mail_queue, otp_store
+from .authentication import get_tokens_for_user
 from .serializers import UserSerializer
 from django.conf import settings
 
@@ -28,9 +27,10 @@ class UserRegistrationView(generics.CreateAPIView):
     permission_classes = [AllowAny] # Anyone can access this view to register
 
     def create(self, request, *args, **kwargs):
-        # Check if OTP was verified for this email
+        # Check that this client verified the OTP for this email
         email = request.data.get('email')
-        if not request.session.get('otp_verified') or request.session.get('registration_email') != email:
+        verification_token = request.data.get('verification_token')
+        if not otp_store.is_verified(email, verification_token):
             return Response(
                 {"error": "Please verify your OTP before registration."}, 
                 status=status.HTTP_400_BAD_REQUEST
@@ -42,19 +42,15 @@ class UserRegistrationView(generics.CreateAPIView):
         user = serializer.save()
         
         # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        tokens = get_tokens_for_user(user)
         
-        # Clear OTP session data after successful registration
-        request.session.pop('otp_verified', None)
-        request.session.pop('registration_email', None)
-        request.session.pop('otp', None)
-        request.session.pop('otp_email', None)
-        request.session.pop('otp_time', None)
+        # Clear OTP data after successful registration
+        otp_store.clear(email, verification_token)
         
         # Return response with tokens and user data
         return Response({
-            'refresh': str(refresh),
-            'access': str(refresh.access_token),
+            'refresh': tokens['refresh'],
+            'access': tokens['access'],
             'user': {
                 'id': user.id,
                 'email': user.email,
@@ -89,14 +85,14 @@ class UserLoginView(APIView):
             user.save(update_fields=["last_login"])
 
             # Generate JWT tokens
-            refresh = RefreshToken.for_user(user)
+            tokens = get_tokens_for_user(user)
             
             # SIMPLIFIED: Every logged-in user is now considered a 'user'
             role = 'user'
             
             return Response({
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
+                'refresh': tokens['refresh'],
+                'access': tokens['access'],
                 'user': {
                     'id': user.id,
                     'email': user.email,
@@ -136,13 +132,10 @@ def check_email_phone(request):
 @permission_classes([AllowAny])
 def send_otp_email(request):
     email = request.data.get("email")
-    if not email:
+    if not otp_store.is_valid_email(email):
         return Response({"error": "Email is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-    otp = random.randint(100000, 999999)
-    request.session['otp'] = str(otp)
-    request.session['otp_email'] = email
-    request.session['otp_time'] = timezone.now().isoformat()
+    otp = otp_store.issue_otp(email)
 
     # --- UPDATED MESSAGE ---
     subject = f"Your Verification Code for LegalSift: {otp}"
@@ -161,18 +154,32 @@ Thank you,
 The LegalSift Team
 """
 
-    try:
-        send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [email])
-    except Exception as e:
-        print(f"Email sending failed: {e}")
+    # The email is delivered in the background; the client can poll its status
+    delivery_id = mail_queue.send_mail_async(subject, message, [email])
+    if mail_queue.get_status(delivery_id) == mail_queue.FAILED:
         return Response({"error": "Failed to send email due to a server error."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    response_data = {"message": "An OTP has been sent to your email address."}
+    response_data = {
+        "message": "An OTP has been sent to your email address.",
+        "delivery_id": delivery_id,
+    }
     if settings.DEBUG:
         response_data["dev_otp"] = otp
     return Response(response_data, status=status.HTTP_200_OK)
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def otp_delivery_status(request, delivery_id):
+    """
+    Reports whether a queued OTP email has been sent.
+    """
+    delivery_status = mail_queue.get_status(delivery_id)
+    if delivery_status is None:
+        return Response({"error": "Unknown delivery id."}, status=status.HTTP_404_NOT_FOUND)
+    return Response({"delivery_id": delivery_id, "status": delivery_status}, status=status.HTTP_200_OK)
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def verify_otp(request):
@@ -182,26 +189,23 @@ def verify_otp(request):
     email = request.data.get("email")
     otp_entered = request.data.get("otp")
 
-    stored_email = request.session.get('otp_email')
-    stored_otp = request.session.get('otp')
-    stored_otp_time = request.session.get('otp_time')
+    if not otp_store.is_valid_email(email) or not otp_entered:
+        return Response({"error": "Email and OTP are required."}, status=status.HTTP_400_BAD_REQUEST)
 
-    if not all([stored_email, stored_otp, stored_otp_time]):
-        return Response({"error": "Session expired or OTP not sent. Please request a new one."}, status=status.HTTP_400_BAD_REQUEST)
+    # The OTP expires natively in the cache after OTP_TTL seconds (10 minutes)
+    result, verification_token = otp_store.check_otp(email, otp_entered)
 
-    # Check OTP expiry (10 minutes)
-    otp_time = timezone.datetime.fromisoformat(stored_otp_time)
-    if (timezone.now() - otp_time).total_seconds() > 600:
-        request.session.flush()
-        return Response({"error": "OTP has expired. Please request a new one."}, status=status.HTTP_400_BAD_REQUEST)
+    if result == otp_store.OTP_EXPIRED:
+        return Response({"error": "OTP has expired or was not sent. Please request a new one."}, status=status.HTTP_400_BAD_REQUEST)
 
-    if email != stored_email or str(otp_entered) != str(stored_otp):
+    if result == otp_store.OTP_LOCKED:
+        return Response({"error": "Too many incorrect attempts. Please request a new OTP."}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+
+    if result == otp_store.OTP_INVALID:
         return Response({"error": "Invalid OTP."}, status=status.HTTP_400_BAD_REQUEST)
     
-    request.session['otp_verified'] = True
-    request.session['registration_email'] = email
-    
-    return Response({"message": "OTP verified successfully."})
+    # Registration and password reset must present this token
+    return Response({"message": "OTP verified successfully.", "verification_token": verification_token})
 
 
 @api_view(['POST'])
@@ -212,8 +216,9 @@ def reset_password(request):
     """
     email = request.data.get("email")
     new_password = request.data.get("new_password")
+    verification_token = request.data.get("verification_token")
     
-    if not request.session.get('otp_verified') or request.session.get('otp_email') != email:
+    if not otp_store.is_verified(email, verification_token):
         return Response({"error": "Please verify your OTP before resetting the password."}, status=status.HTTP_403_FORBIDDEN)
 
     if not new_password:
@@ -224,7 +229,7 @@ def reset_password(request):
         user.set_password(new_password)
         user.save()
         
-        request.session.flush()
+        otp_store.clear(email, verification_token)
         
         return Response({"message": "Password reset successful."}, status=status.HTTP_200_OK)
     except User.DoesNotExist:
@@ -13,8 +13,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from dotenv import load_dotenv
 import os
-from decouple import config
+from decouple import Csv, config
 import sys
+import warnings
 
 
 
@@ -43,15 +44,25 @@ AUTH_USER_MODEL = 'users.CustomUser'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+    ),
+    # orjson-based, and handles numpy values in analysis results
+    'DEFAULT_RENDERER_CLASSES': (
+        'apps.mlengine.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
+# How long (seconds) StatelessJWTAuthentication trusts a cached "is_active" and
+# staff flags before re-checking the users table, and how many users it caches.
+USER_STATUS_CACHE_TTL = config('USER_STATUS_CACHE_TTL', default=30, cast=int)
+USER_STATUS_CACHE_SIZE = config('USER_STATUS_CACHE_SIZE', default=10000, cast=int)
+
 # settings.py (Corrected for Gmail SMTP)
 
 # settings.py
 
 # --- Email Configuration (Using Gmail SMTP) ---
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -59,9 +70,171 @@ EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = config('EMAIL_HOST_USER')
 
-# --- Add Session Engine Configuration ---
-# This is required for your OTP views to store data between requests.
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# --- Outbound Email Queue ---
+# OTP emails are handed to a background worker (apps.users.mail_queue) which
+# reuses one SMTP connection across sends.
+EMAIL_ASYNC_DELIVERY = config('EMAIL_ASYNC_DELIVERY', default=True, cast=bool)
+EMAIL_BATCH_SIZE = 20
+EMAIL_CONNECTION_IDLE_TIMEOUT = 30  # seconds before an idle SMTP connection is closed
+
+# --- Cache Configuration ---
+# Local memory is enough for development and tests. In production set REDIS_URL
+# so OTP codes and chat history are shared between all workers.
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'legalsift',
+        }
+    }
+    if not DEBUG:
+        warnings.warn(
+            "REDIS_URL is not set: OTP codes, verification tokens and chat history "
+            "are kept per process and are not shared between workers.",
+            RuntimeWarning,
+        )
+
+# --- OTP Configuration ---
+# OTP codes live in the cache (not the session), so they expire natively.
+OTP_CACHE_ALIAS = 'default'
+OTP_TTL = 600               # seconds an OTP code stays valid
+OTP_VERIFIED_TTL = 900      # seconds a verified email may register / reset its password
+OTP_MAX_ATTEMPTS = 5        # wrong guesses allowed before the code is discarded
+
+# --- Chatbot History Configuration ---
+CHAT_CACHE_ALIAS = 'default'
+CHAT_HISTORY_TTL = 60 * 60 * 24
+CHAT_HISTORY_MAX_TURNS = 20
+CHAT_COOKIE_NAME = 'chat_id'  # signed id of an anonymous visitor's conversation
+
+# --- Background Complaint Analysis ---
+# With COMPLAINT_ANALYSIS_ASYNC on (or ?async=1 per request) the analysis view
+# queues an AnalysisJob and returns 202; worker threads drain it in micro-batches.
+# The workers run in `manage.py run_analysis_workers`; ANALYSIS_WORKERS_IN_WEB
+# starts them inside every web process instead (for single-process setups).
+COMPLAINT_ANALYSIS_ASYNC = config('COMPLAINT_ANALYSIS_ASYNC', default=False, cast=bool)
+ANALYSIS_WORKERS = config('ANALYSIS_WORKERS', default=2, cast=int)
+ANALYSIS_WORKERS_IN_WEB = config('ANALYSIS_WORKERS_IN_WEB', default=False, cast=bool)
+ANALYSIS_JOB_BATCH_SIZE = 16
+ANALYSIS_JOB_POLL_INTERVAL = 5  # seconds between queue checks when idle
+# A claimed job not finished within the lease (e.g. its worker was killed) is
+# claimed again; after ANALYSIS_JOB_MAX_ATTEMPTS claims it is marked failed.
+ANALYSIS_JOB_LEASE_SECONDS = config('ANALYSIS_JOB_LEASE_SECONDS', default=600, cast=int)
+ANALYSIS_JOB_MAX_ATTEMPTS = 3
+
+# --- Category-Partitioned Recommendations ---
+# Recommended sections are searched within the predicted category only, plus the
+# runner-up category when its probability is below ML_CATEGORY_CONFIDENCE_THRESHOLD.
+ML_CATEGORY_PARTITIONED_SEARCH = config('ML_CATEGORY_PARTITIONED_SEARCH', default=True, cast=bool)
+ML_CATEGORY_CONFIDENCE_THRESHOLD = config('ML_CATEGORY_CONFIDENCE_THRESHOLD', default=0.5, cast=float)
+
+# --- Similar Complaints Index ---
+# The HNSW index over complaint embeddings is compacted into COMPLAINT_INDEX_DIR
+# by `manage.py compact_complaint_index`; new complaints are appended in memory.
+COMPLAINT_INDEX_DIR = BASE_DIR / 'apps' / 'mlengine' / 'saved_models' / 'complaint_index'
+COMPLAINT_INDEX_EF_SEARCH = 64  # HNSW search breadth: higher is more accurate, slower
+COMPLAINT_INDEX_REFRESH_INTERVAL = 10  # seconds between background checks for new complaints
+COMPLAINT_SIMILAR_MAX_K = 50
+
+# --- Complaint Export ---
+# Rows fetched per database round trip, and written per output chunk, by the
+# streaming complaint export (ComplaintExportView, `manage.py export_complaints`).
+COMPLAINT_EXPORT_CHUNK_SIZE = config('COMPLAINT_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# --- Complaint Analysis Result Cache ---
+# Results of up to ML_RESULT_CACHE_SIZE distinct complaints (0 turns it off) are
+# kept per process, keyed by the cleaned text and model release. Set
+# ML_RESULT_CACHE_ALIAS (e.g. 'default' with Redis) to share them between workers.
+ML_RESULT_CACHE_SIZE = config('ML_RESULT_CACHE_SIZE', default=2048, cast=int)
+ML_RESULT_CACHE_ALIAS = config('ML_RESULT_CACHE_ALIAS', default='')
+ML_RESULT_CACHE_TTL = 60 * 60 * 24
+
+# --- Complaint Analysis Admission Control ---
+# At most ANALYSIS_MAX_CONCURRENT synchronous analyses run per process; up to
+# ANALYSIS_MAX_WAITING more wait (most urgent first) for up to
+# ANALYSIS_QUEUE_TIMEOUT seconds before the view answers 503 with Retry-After.
+ANALYSIS_MAX_CONCURRENT = config('ANALYSIS_MAX_CONCURRENT', default=4, cast=int)
+ANALYSIS_MAX_WAITING = config('ANALYSIS_MAX_WAITING', default=32, cast=int)
+ANALYSIS_QUEUE_TIMEOUT = config('ANALYSIS_QUEUE_TIMEOUT', default=10, cast=float)
+
+# --- ML Inference Micro-Batching ---
+# Concurrent analyze_complaint() calls wait up to ML_BATCH_MAX_LATENCY_MS to be
+# grouped into one batch of at most ML_BATCH_MAX_SIZE complaints. This raises
+# throughput under concurrent load, but adds that wait to every request and
+# runs the pipeline stages on the batcher thread, so Server-Timing only shows
+# `batch_wait`. Off by default; enable it for workers with many threads.
+# A request gives up on its batch after ML_BATCH_RESULT_TIMEOUT seconds (503).
+ML_BATCHING_ENABLED = config('ML_BATCHING_ENABLED', default=False, cast=bool)
+ML_BATCH_MAX_SIZE = config('ML_BATCH_MAX_SIZE', default=16, cast=int)
+ML_BATCH_MAX_LATENCY_MS = config('ML_BATCH_MAX_LATENCY_MS', default=5, cast=int)
+ML_BATCH_RESULT_TIMEOUT = config('ML_BATCH_RESULT_TIMEOUT', default=30, cast=int)
+
+# --- Query Encoder Backend ---
+# 'sentence_transformers' (PyTorch), 'onnx' or 'onnx_int8'. The ONNX backends
+# need `manage.py export_onnx_encoder` to have been run once.
+ML_ENCODER_BACKEND = config('ML_ENCODER_BACKEND', default='sentence_transformers')
+
+# --- Model Artifact Releases ---
+# Seconds between checks for a newly activated release (see `manage.py ml_artifacts`).
+ML_ARTIFACT_CHECK_INTERVAL = config('ML_ARTIFACT_CHECK_INTERVAL', default=10, cast=int)
+
+# --- RAG Retrieval Cache ---
+# Up to RAG_RETRIEVAL_CACHE_SIZE questions keep their retrieved chunks (0 turns
+# the cache off). A new question within RAG_RETRIEVAL_CACHE_EPSILON cosine
+# distance of a cached one reuses its chunks (0 allows exact repeats only).
+RAG_RETRIEVAL_CACHE_SIZE = config('RAG_RETRIEVAL_CACHE_SIZE', default=1024, cast=int)
+RAG_RETRIEVAL_CACHE_EPSILON = config('RAG_RETRIEVAL_CACHE_EPSILON', default=0.02, cast=float)
+
+# --- Chatbot Section Lookups ---
+# Questions like "what is section 302" are answered from the IPC table without an LLM call.
+RAG_SECTION_LOOKUP_ENABLED = config('RAG_SECTION_LOOKUP_ENABLED', default=True, cast=bool)
+
+# --- RAG Question Condensing ---
+# 'auto' calls the LLM to rephrase a follow-up only when no local rule applies,
+# 'llm' always does when there is history, 'local' never does.
+RAG_CONDENSE_STRATEGY = config('RAG_CONDENSE_STRATEGY', default='auto')
+
+# --- RAG Prompt Budget ---
+# Tokens (tiktoken cl100k_base) of retrieved context and of chat history sent
+# with each question; the most relevant chunks and most recent turns are kept.
+RAG_CONTEXT_TOKEN_BUDGET = config('RAG_CONTEXT_TOKEN_BUDGET', default=1200, cast=int)
+RAG_HISTORY_TOKEN_BUDGET = config('RAG_HISTORY_TOKEN_BUDGET', default=400, cast=int)
+
+# --- Request Instrumentation ---
+# Every response carries a Server-Timing header and /metrics serves per-stage
+# histograms to METRICS_ALLOWED_IPS, or to clients sending
+# `Authorization: Bearer <METRICS_TOKEN>`. With ML_PROFILER_ENABLED, requests
+# sent with `X-Profile: <ML_PROFILER_TOKEN>` are sampled every
+# ML_PROFILER_INTERVAL_MS and written to ML_PROFILE_DIR, which keeps the
+# ML_PROFILE_MAX_FILES newest profiles. Without a token nothing is profiled.
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='127.0.0.1,::1', cast=Csv())
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+ML_PROFILER_ENABLED = config('ML_PROFILER_ENABLED', default=False, cast=bool)
+ML_PROFILER_TOKEN = config('ML_PROFILER_TOKEN', default='')
+ML_PROFILER_INTERVAL_MS = 5
+ML_PROFILE_DIR = BASE_DIR / 'profiles'
+ML_PROFILE_MAX_FILES = 50
+
+# --- API Response Compression ---
+# Responses under these paths (analysis results, history, chatbot answers)
+# are sent brotli- or gzip-compressed when at least API_COMPRESSION_MIN_BYTES.
+# Endpoints returning tokens or other secrets must stay off this list.
+API_COMPRESSION_PATHS = ['/api/complaints/', '/api/ml/']
+API_COMPRESSION_MIN_BYTES = config('API_COMPRESSION_MIN_BYTES', default=1024, cast=int)
+API_COMPRESSION_BROTLI_QUALITY = config('API_COMPRESSION_BROTLI_QUALITY', default=5, cast=int)
+
+# --- Session Engine Configuration ---
+# Sessions are now only used by the admin (anonymous chatbot users get a signed
+# CHAT_COOKIE_NAME cookie instead), so reads are served from the cache.
+SESSION_ENGINE = config('SESSION_ENGINE', default='django.contrib.sessions.backends.cached_db')
 
 
 
@@ -86,6 +259,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.mlengine.instrumentation.ServerTimingMiddleware',
+    'apps.mlengine.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
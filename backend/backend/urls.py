@@ -1,10 +1,13 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from apps.mlengine.views import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/complaints/', include('apps.complaints.urls')),
     path("api/ml/", include("apps.mlengine.urls")),
     path('api/users/', include('apps.users.urls')),
+    path('metrics', metrics_view, name='metrics'),
 
 ]
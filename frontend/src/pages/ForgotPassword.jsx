@@ -25,6 +25,7 @@ const ForgotPassword = () => {
   const [errors, setErrors] = useState({});
   const [isLoading, setIsLoading] = useState(false);
   const [isVerifyingOTP, setIsVerifyingOTP] = useState(false);
+  const [verificationToken, setVerificationToken] = useState(null);
   
   const navigate = useNavigate();
 
@@ -97,6 +98,7 @@ const ForgotPassword = () => {
         const result = await verifyOTP(formData.email, formData.otp);
         if (result.success) {
           toast.success('OTP verified successfully!');
+          setVerificationToken(result.data.verification_token);
           setStep(3);
         } else {
           toast.error(result.error || 'Invalid OTP');
@@ -118,7 +120,7 @@ const ForgotPassword = () => {
     
     setIsLoading(true);
     try {
-      const result = await resetPassword(formData.email, formData.newPassword);
+      const result = await resetPassword(formData.email, formData.newPassword, verificationToken);
       
       if (result.success) {
         toast.success('Password reset successfully! You can now login with your new password.');
@@ -136,6 +136,7 @@ const Register = () => {
         email: formData.email,
         phone_number: formData.phone,
         password: formData.password,
+        verification_token: otpResult.data.verification_token,
       };
       
       const registerResult = await register(registrationData);
@@ -90,11 +90,12 @@ export const refreshToken = async (refreshToken) => {
 };
 
 // Reset password
-export const resetPassword = async (email, newPassword) => {
+export const resetPassword = async (email, newPassword, verificationToken) => {
   try {
     const response = await api.post('/users/reset-password/', {
       email,
-      new_password: newPassword
+      new_password: newPassword,
+      verification_token: verificationToken
     });
     return { success: true, data: response.data };
   } catch (error) {